@@ -0,0 +1,82 @@
+import argparse
+import filecmp
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from stub_server import StubConfig, start_stub_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CRAWLERS_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'crawlers')
+SUPPLEMENTS_FILE = os.path.join(os.path.dirname(BENCH_DIR), 'config', 'supplements.txt')
+
+# 爬虫模块名 -> (输出子目录, 需指向桩服务的URL常量, 桩服务上的路径)
+CRAWLERS = {
+    "clinical_trials_gov": ("clinical_trials", "CT_API", "/api/v2/studies"),
+    "pubmed_crawler": ("pubmed", "EUTILS_BASE", "/entrez/eutils/"),
+    "nih_dsld": ("nih_dsld", "DSLD_API", "/dsld/api"),
+}
+
+def make_workspace(supplements):
+    workspace = tempfile.mkdtemp(prefix="kg_bench_")
+    config_dir = os.path.join(workspace, 'knowledge_graph', 'config')
+    os.makedirs(config_dir)
+    with open(os.path.join(config_dir, 'supplements.txt'), 'w', encoding='utf-8') as f:
+        f.write("\n".join(supplements) + "\n")
+    return workspace
+
+def run_once(module, supplements, argv):
+    workspace = make_workspace(supplements)
+    os.environ['GITHUB_WORKSPACE'] = workspace
+    start = time.perf_counter()
+    module.main(argv)
+    importlib.import_module("http_client").close_sessions()  # 下一轮按新的并发上限重建连接池
+    return workspace, time.perf_counter() - start
+
+def compare_outputs(dir_a, dir_b):
+    files_a = sorted(os.listdir(dir_a)) if os.path.isdir(dir_a) else []
+    files_b = sorted(os.listdir(dir_b)) if os.path.isdir(dir_b) else []
+    if files_a != files_b:
+        return len(files_a), False
+    _, mismatch, errors = filecmp.cmpfiles(dir_a, dir_b, files_a, shallow=False)
+    return len(files_a), not mismatch and not errors
+
+def main():
+    parser = argparse.ArgumentParser(description="串行与并发爬取模式的加速比基准（本地桩服务）")
+    parser.add_argument("--supplements", type=int, default=12, help="参与基准的补剂数量")
+    parser.add_argument("--latency", type=float, default=0.2, help="桩服务每个请求的模拟延迟（秒）")
+    parser.add_argument("--rate", type=float, default=None, help="两种模式共用的限流速率（请求/秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发模式每个主机的在途请求上限")
+    parser.add_argument("--trial-hits", type=int, default=250, help="每个补剂的临床试验数（超过一页时走分页）")
+    args = parser.parse_args()
+
+    with open(SUPPLEMENTS_FILE, 'r', encoding='utf-8') as f:
+        supplements = [line.strip() for line in f if line.strip()][:args.supplements]
+
+    server, base_url = start_stub_server(StubConfig(latency=args.latency, trial_hits=args.trial_hits))
+    sys.path.insert(0, CRAWLERS_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="kg_bench_logs_"))
+    rate_args = ["--rate", str(args.rate)] if args.rate else []
+
+    print(f"{'crawler':<22}{'serial(s)':>12}{'async(s)':>12}{'speedup':>10}{'files':>7}  identical")
+    try:
+        for name, (subdir, attr, path) in CRAWLERS.items():
+            module = importlib.import_module(name)
+            setattr(module, attr, base_url + path)
+            serial_ws, serial_time = run_once(module, supplements, rate_args)
+            async_ws, async_time = run_once(module, supplements,
+                                            ["--async", "--concurrency", str(args.concurrency)] + rate_args)
+            out = os.path.join('knowledge_graph', 'data', 'raw', subdir)
+            files, identical = compare_outputs(os.path.join(serial_ws, out), os.path.join(async_ws, out))
+            print(f"{name:<22}{serial_time:>12.2f}{async_time:>12.2f}{serial_time / async_time:>9.1f}x"
+                  f"{files:>7}  {identical}")
+            shutil.rmtree(serial_ws, ignore_errors=True)
+            shutil.rmtree(async_ws, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+KG_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(KG_DIR, 'pipeline'))
+
+from data_cleaning import run_pipeline  # noqa: E402
+
+# 与工作流中相同的R调用；每步前后打印耗时，便于逐步对比
+R_SCRIPT = """
+source('data_cleaning.R')
+timed <- function(name, f) {
+  t <- proc.time()[['elapsed']]
+  ok <- tryCatch({ f(); TRUE }, error = function(e) { message(name, ' failed: ', conditionMessage(e)); FALSE })
+  cat('STEP', name, proc.time()[['elapsed']] - t, ok, '\\n')
+}
+timed('clean_clinical_trials', clean_clinical_trials)
+timed('clean_pubmed_data', clean_pubmed_data)
+timed('build_knowledge_graph', build_knowledge_graph)
+"""
+STATUSES = ["Completed", "Recruiting", "Active, not recruiting", "Terminated"]
+OUTPUTS = ["clinical_trials_clean.csv", "pubmed_clean.csv"]
+
+def write_raw_data(raw_root, supplements, rows):
+    # 合成原始CSV：每个补剂 rows 条，含重复ID、短标题/短摘要和重复的条件，覆盖全部清洗规则
+    trials_dir = os.path.join(raw_root, 'clinical_trials')
+    pubmed_dir = os.path.join(raw_root, 'pubmed')
+    os.makedirs(trials_dir)
+    os.makedirs(pubmed_dir)
+    for s in range(supplements):
+        name = f"Supplement {s:03d}"
+        with open(os.path.join(trials_dir, f"{name}.csv"), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["nct_id", "title", "status", "conditions", "interventions", "primary_outcomes"])
+            for i in range(rows):
+                writer.writerow([f"NCT{s * rows + i // 2:08d}", f"Trial {i} of {name}", STATUSES[i % 4],
+                                 "Insomnia, Fatigue, Insomnia" if i % 3 else "",
+                                 f"{name} (Dietary Supplement)", "Sleep quality"])
+        with open(os.path.join(pubmed_dir, f"{name}.csv"), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["pmid", "title", "abstract", "journal", "pub_date", "mesh_terms"])
+            for i in range(rows):
+                writer.writerow([30000000 + s * rows + i // 2,
+                                 "Short" if i % 7 == 0 else f"Synthetic study {i} of {name}",
+                                 "lorem ipsum " * (i % 10), f"Journal {i % 40}",
+                                 f"{2000 + i % 26}-Jan", "Dietary Supplements"])
+
+def run_r(workspace):
+    vis_dir = os.path.join(workspace, 'knowledge_graph', 'visualization')
+    os.makedirs(vis_dir)
+    shutil.copy(os.path.join(KG_DIR, 'visualization', 'data_cleaning.R'), vis_dir)
+    env = dict(os.environ, GITHUB_ACTIONS="true")  # 与CI一致，跳过neo4r
+    start = time.perf_counter()
+    result = subprocess.run(["Rscript", "-e", R_SCRIPT], cwd=vis_dir, env=env, capture_output=True, text=True)
+    total = time.perf_counter() - start
+    steps = {}
+    for line in result.stdout.splitlines():
+        if line.startswith("STEP"):
+            _, name, seconds, ok = line.split()
+            steps[name] = float(seconds) if ok == "TRUE" else None
+    return total, steps
+
+def normalize_frame(df):
+    # readr按数值写出ID列（如 3e7），纯数字列统一转成浮点再比较
+    for column in df.columns:
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except ValueError:
+            pass
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+def compare_outputs(dir_a, dir_b):
+    # 按内容比较（R与pandas的数值格式、引号可能不同），只看行集合是否一致
+    results = {}
+    for name in OUTPUTS:
+        paths = [os.path.join(d, name) for d in (dir_a, dir_b)]
+        if not all(os.path.exists(p) for p in paths):
+            results[name] = None
+            continue
+        a, b = (pd.read_csv(p, dtype=str, keep_default_na=False) for p in paths)
+        results[name] = list(a.columns) == list(b.columns) and normalize_frame(a).equals(normalize_frame(b))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="清洗/建图阶段基准：pandas实现 vs data_cleaning.R")
+    parser.add_argument("--supplements", type=int, default=80, help="补剂（文件）数量")
+    parser.add_argument("--rows", type=int, default=2000, help="每个文件的行数")
+    args = parser.parse_args()
+
+    workspace = tempfile.mkdtemp(prefix="kg_bench_clean_")
+    raw_root = os.path.join(workspace, 'knowledge_graph', 'data', 'raw')
+    write_raw_data(raw_root, args.supplements, args.rows)
+    print(f"数据规模: {args.supplements} 个文件 x {args.rows} 行 x 2 个数据源")
+    try:
+        py_out = os.path.join(workspace, 'python_processed')
+        start = time.perf_counter()
+        timings = run_pipeline(raw_root, py_out)
+        py_total = time.perf_counter() - start
+
+        r_total, r_steps = None, {}
+        if shutil.which("Rscript"):
+            os.makedirs(os.path.join(workspace, 'knowledge_graph', 'data', 'processed'))
+            r_total, r_steps = run_r(workspace)
+        else:
+            print("未找到Rscript，仅运行pandas实现")
+
+        print(f"{'step':<24}{'pandas(s)':>12}{'R(s)':>12}")
+        for step, seconds in timings.items():
+            r_seconds = r_steps.get(step)
+            r_text = f"{r_seconds:>12.2f}" if r_seconds is not None else f"{'-':>12}"
+            print(f"{step:<24}{seconds:>12.2f}{r_text}")
+        print(f"{'total (incl. startup)':<24}{py_total:>12.2f}" + (f"{r_total:>12.2f}" if r_total else f"{'-':>12}"))
+        if r_total:
+            r_out = os.path.join(workspace, 'knowledge_graph', 'data', 'processed')
+            for name, same in compare_outputs(py_out, r_out).items():
+                print(f"{name}: {'一致' if same else ('缺失' if same is None else '不一致')}")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import quote, urlparse
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+KG_DIR = os.path.dirname(BENCH_DIR)
+SERVICE_SCRIPT = os.path.join(KG_DIR, 'pipeline', 'evidence_service.py')
+
+# 证据查询服务压测：N个keep-alive客户端线程在固定时长内按比例混合请求各端点，统计持续吞吐与延迟分位数。
+# 默认在子进程中启动服务（与压测客户端不争用同一个GIL），也可以用 --url 压测已在运行的服务
+ENDPOINT_MIX = (("evidence", 0.4), ("related", 0.2), ("shared", 0.2), ("top_pmids", 0.1), ("supplements", 0.1))
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    return os.path.dirname(KG_DIR)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_json(base_url, path):
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+def spawn_service(processed_dir, cache_entries):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, SERVICE_SCRIPT, "--processed-dir", processed_dir, "--port", str(port),
+                                "--cache-entries", str(cache_entries), "--poll-interval", "0"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败:\n{process.stderr.read().decode('utf-8', 'replace')}")
+        try:
+            get_json(base_url, "/health")
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("等待服务启动超时")
+
+def request_paths(base_url, count, seed):
+    # 按 ENDPOINT_MIX 生成请求序列；补剂与年份取自服务当前快照，重复的路径正好反映缓存命中
+    _, supplements = get_json(base_url, "/supplements")
+    _, years = get_json(base_url, "/years")
+    names = [s["name"] for s in supplements]
+    if len(names) < 2:
+        raise RuntimeError("快照中的补剂少于2种，无法压测")
+    rng = random.Random(seed)
+    endpoints, weights = zip(*ENDPOINT_MIX)
+    paths = []
+    for endpoint in rng.choices(endpoints, weights, k=count):
+        if endpoint == "evidence":
+            paths.append(f"/supplements/{quote(rng.choice(names))}/evidence?limit={rng.choice([5, 20])}")
+        elif endpoint == "related":
+            paths.append(f"/supplements/{quote(rng.choice(names))}/related?top=10")
+        elif endpoint == "shared":
+            a, b = rng.sample(names, 2)
+            paths.append(f"/pairs/shared?a={quote(a)}&b={quote(b)}")
+        elif endpoint == "top_pmids" and years:
+            paths.append(f"/pmids/top?year={rng.choice(list(years))}&limit=10")
+        else:
+            paths.append("/supplements")
+    return paths
+
+def client(base_url, paths, deadline, latencies, statuses, offset):
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    i = offset
+    local_latencies, local_statuses = [], Counter()
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            local_statuses[response.status] += 1
+        except (OSError, http.client.HTTPException):
+            local_statuses["error"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+            continue
+        local_latencies.append(time.perf_counter() - start)
+    conn.close()
+    latencies.extend(local_latencies)
+    statuses.update(local_statuses)
+
+def run_load(base_url, threads, duration, paths):
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+    workers = [threading.Thread(target=client, args=(base_url, paths, deadline, latencies, statuses,
+                                                     i * len(paths) // threads))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000 if latencies else (0.0, 0.0, 0.0)
+    return {"requests": len(latencies), "seconds": round(elapsed, 2), "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(p50, 2), "p90_ms": round(p90, 2), "p99_ms": round(p99, 2),
+            "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)}}
+
+def main():
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="证据查询服务压测：持续请求/秒与延迟分位数")
+    parser.add_argument("--url", default=None, help="压测已运行的服务（如 http://127.0.0.1:8000），不指定时在子进程中启动")
+    parser.add_argument("--processed-dir", default=os.path.join(root, 'knowledge_graph', 'data', 'processed'),
+                        help="子进程服务加载的 data_cleaning.py 输出目录")
+    parser.add_argument("--cache-entries", default="4096",
+                        help="子进程服务的LRU缓存条目数，逗号分隔时依次对比，如 0,4096")
+    parser.add_argument("--threads", default="1,8,32", help="并发客户端线程数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=10.0, help="每轮持续秒数")
+    parser.add_argument("--distinct", type=int, default=2000, help="请求序列中的路径数（越少缓存命中率越高）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="结果JSON文件")
+    args = parser.parse_args()
+
+    targets = [(None, args.url)] if args.url else [(int(c), None) for c in args.cache_entries.split(",")]
+    results = []
+    print(f"{'cache':>7}{'threads':>9}{'requests':>10}{'req/s':>10}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}"
+          f"{'hit rate':>10}  status")
+    for cache_entries, url in targets:
+        process = None
+        if url is None:
+            process, url = spawn_service(args.processed_dir, cache_entries)
+        try:
+            paths = request_paths(url, args.distinct, args.seed)
+            for threads in (int(t) for t in args.threads.split(",")):
+                _, before = get_json(url, "/health")
+                result = run_load(url, threads, args.duration, paths)
+                _, after = get_json(url, "/health")
+                hits = after["cache"]["hits"] - before["cache"]["hits"]
+                misses = after["cache"]["misses"] - before["cache"]["misses"]
+                result.update(cache_entries=cache_entries, threads=threads, snapshot=after["snapshot"],
+                              hit_rate=round(hits / (hits + misses), 4) if hits + misses else 0.0)
+                results.append(result)
+                cache = "-" if cache_entries is None else cache_entries
+                print(f"{cache:>7}{threads:>9}{result['requests']:>10}{result['rps']:>10.0f}{result['p50_ms']:>10.2f}"
+                      f"{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['hit_rate']:>10.1%}  {result['statuses']}")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"结果已写入: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from stub_server import pubmed_article_xml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'crawlers'))
+
+from pubmed_crawler import iter_pubmed_articles
+
+def build_payload(n_articles):
+    articles = "".join(pubmed_article_xml(str(30000000 + i)) for i in range(n_articles))
+    return f"<?xml version=\"1.0\"?><PubmedArticleSet>{articles}</PubmedArticleSet>".encode('utf-8')
+
+def parse_with_soup(content):
+    # 改造前 fetch_pubmed 中的 BeautifulSoup DOM 解析路径，作为对照
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'xml')
+    articles = []
+    for article in soup.find_all('PubmedArticle'):
+        title_elem = article.find('ArticleTitle')
+        abstract_elem = article.find('AbstractText')
+        abstract = abstract_elem.text if abstract_elem else "无摘要"
+        if len(abstract) > 500:
+            abstract = abstract[:500] + "..."
+        journal_elem = article.find('Journal')
+        journal_title = "未知期刊"
+        if journal_elem:
+            journal_title_elem = journal_elem.find('Title')
+            journal_title = journal_title_elem.text if journal_title_elem else "未知期刊"
+        pub_date_elem = article.find('PubDate')
+        pub_date = "未知日期"
+        if pub_date_elem:
+            year_elem = pub_date_elem.find('Year')
+            month_elem = pub_date_elem.find('Month')
+            year = year_elem.text if year_elem else "年份未知"
+            month = month_elem.text if month_elem else ""
+            pub_date = f"{year}-{month}" if month else year
+        pmid_elem = article.find('PMID')
+        articles.append({
+            "pmid": pmid_elem.text if pmid_elem else "无PMID",
+            "title": title_elem.text if title_elem else "无标题",
+            "abstract": abstract,
+            "journal": journal_title,
+            "pub_date": pub_date
+        })
+    return len(articles)
+
+def parse_with_iterparse(content):
+    return sum(1 for _ in iter_pubmed_articles(content))
+
+PARSERS = {"soup": parse_with_soup, "iterparse": parse_with_iterparse}
+
+def measure(parser_name, payload_path):
+    # 在独立子进程中运行，峰值RSS互不干扰；负载预先写入文件，读入后作为基线
+    with open(payload_path, 'rb') as f:
+        content = f.read()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    parsed = PARSERS[parser_name](content)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "parser": parser_name,
+        "articles": parsed,
+        "payload_mb": round(len(content) / 2**20, 2),
+        "seconds": round(elapsed, 4),
+        "us_per_article": round(elapsed / max(parsed, 1) * 1e6, 1),
+        "peak_rss_delta_mb": round((peak - baseline) / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="PubMed efetch XML 解析基准：BeautifulSoup DOM vs lxml iterparse")
+    parser.add_argument("--sizes", default="100,1000,5000", help="每批文章数，逗号分隔")
+    parser.add_argument("--worker", nargs=2, metavar=("PARSER", "PAYLOAD"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(*args.worker)))
+        return
+    workdir = tempfile.mkdtemp(prefix="kg_parse_bench_")
+    print(f"{'parser':<11}{'articles':>9}{'payload(MB)':>13}{'time(s)':>10}{'us/article':>12}{'peak ΔRSS(MB)':>15}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        payload_path = os.path.join(workdir, f"efetch_{size}.xml")
+        with open(payload_path, 'wb') as f:
+            f.write(build_payload(size))
+        for name in PARSERS:
+            out = subprocess.run([sys.executable, __file__, "--worker", name, payload_path],
+                                 capture_output=True, text=True, check=True, cwd=workdir).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{r['parser']:<11}{r['articles']:>9}{r['payload_mb']:>13}{r['seconds']:>10}"
+                  f"{r['us_per_article']:>12}{r['peak_rss_delta_mb']:>15}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'pipeline'))
+
+from recommender import SupplementRecommender  # noqa: E402
+
+# 当前语料规模（约1000篇证据、7000个词项、80种补剂），按倍数放大；词表按 Heaps 定律随语料的平方根增长
+BASE_DOCS = 1000
+BASE_VOCABULARY = 7000
+SUPPLEMENTS = 80
+
+def synthetic_model(scale, doc_length, rng):
+    n_docs = BASE_DOCS * scale
+    n_terms = int(BASE_VOCABULARY * scale ** 0.5)
+    # 词频服从Zipf分布，与真实摘要的长尾词表相近
+    cols = (rng.zipf(1.3, size=n_docs * doc_length) - 1) % n_terms
+    rows = np.repeat(np.arange(n_docs), doc_length)
+    counts = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_docs, n_terms))
+    counts.sum_duplicates()
+    owners = rng.integers(0, SUPPLEMENTS, size=n_docs)
+    extra = rng.random(n_docs) < 0.1  # 约10%的文献被两种补剂检索到
+    member_rows = np.concatenate([owners, rng.integers(0, SUPPLEMENTS, size=int(extra.sum()))])
+    member_cols = np.concatenate([np.arange(n_docs), np.flatnonzero(extra)])
+    membership = sp.csr_matrix((np.ones(len(member_rows)), (member_rows, member_cols)),
+                               shape=(SUPPLEMENTS, n_docs))
+    membership.data[:] = 1
+    vocabulary = {f"t{i}": i for i in range(n_terms)}
+    doc_ids = [f"{30000000 + i}" for i in range(n_docs)]
+    return vocabulary, doc_ids, [f"Supplement {s:03d}" for s in range(SUPPLEMENTS)], counts, membership
+
+def synthetic_queries(n_queries, n_terms, rng):
+    # 1~3个词的症状查询，词项取自常见词（前2000名）
+    lengths = rng.integers(1, 4, size=n_queries)
+    terms = rng.integers(0, min(2000, n_terms), size=lengths.sum())
+    bounds = np.cumsum(lengths)
+    return [" ".join(f"t{t}" for t in terms[end - n:end]) for n, end in zip(lengths, bounds)]
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐打分基准：单次查询延迟与批量吞吐")
+    parser.add_argument("--scales", default="1,10,100", help="语料放大倍数，逗号分隔")
+    parser.add_argument("--doc-length", type=int, default=80, help="每篇文档的词数（摘要截断为500字符）")
+    parser.add_argument("--queries", type=int, default=5000, help="批量查询数")
+    parser.add_argument("--single", type=int, default=300, help="单次查询次数（统计p50/p99）")
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    print(f"{'scale':>6}{'docs':>10}{'terms':>9}{'build(s)':>10}{'p50(ms)':>10}{'p99(ms)':>10}"
+          f"{'batch q/s':>12}{'no-evid q/s':>13}")
+    for scale in (int(s) for s in args.scales.split(",")):
+        start = time.perf_counter()
+        model = SupplementRecommender(*synthetic_model(scale, args.doc_length, rng))
+        build = time.perf_counter() - start
+        n_terms = len(model.vocabulary)
+        latencies = []
+        for query in synthetic_queries(args.single, n_terms, rng):
+            start = time.perf_counter()
+            model.recommend(query)
+            latencies.append(time.perf_counter() - start)
+        queries = synthetic_queries(args.queries, n_terms, rng)
+        start = time.perf_counter()
+        model.recommend_batch(queries)
+        batch = len(queries) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        model.recommend_batch(queries, evidence=0)
+        scores_only = len(queries) / (time.perf_counter() - start)
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{scale:>6}{len(model.doc_ids):>10}{n_terms:>9}{build:>10.2f}{p50:>10.2f}{p99:>10.2f}"
+              f"{batch:>12.0f}{scores_only:>13.0f}")
+
+if __name__ == "__main__":
+    main()
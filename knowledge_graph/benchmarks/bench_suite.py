@@ -0,0 +1,257 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from stub_server import StubConfig, start_stub_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+KG_DIR = os.path.dirname(BENCH_DIR)
+SUPPLEMENTS_FILE = os.path.join(KG_DIR, 'config', 'supplements.txt')
+
+# 爬虫模块名 -> (需指向桩服务的URL常量, 桩服务上的路径)
+CRAWLERS = {
+    "clinical_trials_gov": ("CT_API", "/api/v2/studies"),
+    "pubmed_crawler": ("EUTILS_BASE", "/entrez/eutils/"),
+    "nih_dsld": ("DSLD_API", "/dsld/api"),
+}
+STAGES = list(CRAWLERS) + ["cleaning", "graph"]
+
+def instrument_requests(module):
+    # 包装模块内的 safe_api_request：记录每次逻辑请求（含重试与退避）的耗时和失败数
+    latencies, failures = [], [0]
+    original = module.safe_api_request
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = original(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+        if response is None:
+            failures[0] += 1
+        return response
+    module.safe_api_request = timed
+    return latencies, failures
+
+def parse_totals():
+    # 解析耗时与记录数取自爬虫自身的指标（parse区间 / records_parsed计数），
+    # 启用解析进程池时解析在子进程内执行，耗时由主进程在结果返回时记入同一个parse区间
+    from metrics import get_metrics
+    summary = get_metrics().summary()
+    seconds = sum(s["total_seconds"] for s in summary["spans"] if s["name"] == "parse")
+    records = sum(c["value"] for c in summary["counters"] if c["name"] == "records_parsed")
+    return seconds, records
+
+def run_crawler(name, workspace, base_url, argv):
+    os.environ['GITHUB_WORKSPACE'] = workspace
+    sys.path.insert(0, os.path.join(KG_DIR, 'crawlers'))
+    module = importlib.import_module(name)
+    attr, path = CRAWLERS[name]
+    setattr(module, attr, base_url + path)
+    latencies, failures = instrument_requests(module)
+    start = time.perf_counter()
+    module.main(argv)
+    elapsed = time.perf_counter() - start
+    parse_seconds, records = parse_totals()
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (0.0, 0.0)
+    return {
+        "seconds": elapsed,
+        "records": records,
+        "parse_seconds": parse_seconds,
+        "requests": len(latencies),
+        "failed_requests": failures[0],
+        "latency_p50_ms": round(float(p50), 2),
+        "latency_p99_ms": round(float(p99), 2),
+    }
+
+def run_cleaning(workspace):
+    sys.path.insert(0, os.path.join(KG_DIR, 'pipeline'))
+    import pandas as pd
+    from data_cleaning import run_pipeline
+    processed = os.path.join(workspace, 'knowledge_graph', 'data', 'processed')
+    start = time.perf_counter()
+    timings = run_pipeline(os.path.join(workspace, 'knowledge_graph', 'data', 'raw'), processed)
+    elapsed = time.perf_counter() - start
+    records = sum(len(pd.read_csv(os.path.join(processed, name), usecols=[0]))
+                  for name in ("clinical_trials_clean.csv", "pubmed_clean.csv")
+                  if os.path.exists(os.path.join(processed, name)))
+    return {"seconds": elapsed, "records": records, "parse_seconds": elapsed,
+            "steps": {step: round(seconds, 4) for step, seconds in timings.items()}}
+
+def run_graph(workspace):
+    sys.path.insert(0, os.path.join(KG_DIR, 'pipeline'))
+    from graph_engine import GraphEngine
+    processed = os.path.join(workspace, 'knowledge_graph', 'data', 'processed')
+    start = time.perf_counter()
+    engine = GraphEngine.from_csv(os.path.join(processed, "knowledge_graph_nodes.csv"),
+                                  os.path.join(processed, "knowledge_graph_edges.csv"))
+    engine.save(os.path.join(processed, 'graph_snapshot'))
+    elapsed = time.perf_counter() - start
+    records = sum(len(rel["out"][1]) for rel in engine.relations.values())
+    return {"seconds": elapsed, "records": records, "parse_seconds": elapsed}
+
+def worker(spec):
+    # 在独立子进程中运行一个阶段，峰值RSS互不干扰
+    os.chdir(os.path.join(spec["workspace"], 'logs'))
+    if spec["stage"] in CRAWLERS:
+        result = run_crawler(spec["stage"], spec["workspace"], spec["base_url"], spec["argv"])
+    elif spec["stage"] == "cleaning":
+        result = run_cleaning(spec["workspace"])
+    else:
+        result = run_graph(spec["workspace"])
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+def make_workspace(supplements):
+    # 不复制别名表：合成名称（原名称加编号）和原补剂都按原名称检索，规模只由名称个数决定
+    workspace = tempfile.mkdtemp(prefix="kg_bench_suite_")
+    config_dir = os.path.join(workspace, 'knowledge_graph', 'config')
+    os.makedirs(config_dir)
+    os.makedirs(os.path.join(workspace, 'logs'))
+    with open(os.path.join(config_dir, 'supplements.txt'), 'w', encoding='utf-8') as f:
+        f.write("\n".join(supplements) + "\n")
+    return workspace
+
+def scaled_supplements(base, scale):
+    # 1× 为当前配置的补剂；更大规模追加带编号的合成名称
+    return base + [f"{name} {r:03d}" for r in range(1, scale) for name in base]
+
+def run_stage(stage, workspace, base_url, argv):
+    spec = json.dumps({"stage": stage, "workspace": workspace, "base_url": base_url, "argv": argv})
+    with open(os.path.join(workspace, 'logs', f"{stage}.stderr"), 'w+', encoding='utf-8') as err:
+        result = subprocess.run([sys.executable, __file__, "--worker", spec], stdout=subprocess.PIPE,
+                                stderr=err, text=True, cwd=BENCH_DIR)
+        if result.returncode:
+            err.seek(0)
+            raise RuntimeError(f"{stage} 失败:\n{err.read()[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(scale, stage, supplements, result, throttled):
+    seconds, records = result.pop("seconds"), result["records"]
+    parse_seconds = result.pop("parse_seconds")
+    row = {"scale": scale, "stage": stage, "supplements": supplements, "seconds": round(seconds, 3),
+           "records_per_s": round(records / seconds, 1) if seconds else None,
+           "parse_us_per_record": round(parse_seconds / records * 1e6, 1) if records else None}
+    if "requests" in result:
+        row["requests_per_s"] = round(result["requests"] / seconds, 1) if seconds else None
+        row["throttled"] = throttled
+    row.update(result)
+    return row
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_row(row):
+    def cell(key, width, fmt="{}"):
+        value = row.get(key)
+        return f"{'-' if value is None else fmt.format(value):>{width}}"
+    print(f"{row['scale']:>6}  {row['stage']:<20}{row['records']:>9}{row['seconds']:>10.2f}"
+          f"{cell('records_per_s', 11, '{:.0f}')}{cell('requests_per_s', 9, '{:.0f}')}"
+          f"{cell('latency_p50_ms', 9, '{:.2f}')}{cell('latency_p99_ms', 9, '{:.2f}')}"
+          f"{cell('throttled', 7)}{cell('parse_us_per_record', 11, '{:.1f}')}{cell('peak_rss_mb', 9, '{:.0f}')}")
+
+def compare(results, baseline_path):
+    # 与之前的结果文件按 (scale, stage) 对比耗时与峰值内存
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\n对比 {baseline_path}:")
+    print(f"{'scale':>6}  {'stage':<20}{'seconds':>16}{'ratio':>8}{'peak RSS(MB)':>16}")
+    for row in results:
+        old = baseline.get((row["scale"], row["stage"]))
+        if old is None:
+            continue
+        ratio = row["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        print(f"{row['scale']:>6}  {row['stage']:<20}{old['seconds']:>7.2f} -> {row['seconds']:<6.2f}"
+              f"{ratio:>7.2f}x{old['peak_rss_mb']:>7.0f} -> {row['peak_rss_mb']:<6.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准套件：本地桩服务上运行各爬虫main()与清洗/建图阶段")
+    parser.add_argument("--scales", default="1,10",
+                        help="补剂规模倍数（1× = config/supplements.txt），逗号分隔，如 1,10,100")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"要运行的阶段，可选 {','.join(STAGES)}")
+    parser.add_argument("--mode", choices=["async", "serial"], default="async", help="爬虫运行模式")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发模式每个主机的在途请求上限")
+    parser.add_argument("--parse-workers", type=int, default=0, help="爬虫解析进程数（0为在抓取线程内解析）")
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务每个请求的模拟延迟（秒）")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="桩服务返回429的请求比例")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="429应答的Retry-After（秒）")
+    parser.add_argument("--pubmed-hits", type=int, default=20, help="每个补剂的PubMed文章数")
+    parser.add_argument("--trial-hits", type=int, default=15, help="每个补剂的临床试验数")
+    parser.add_argument("--dsld-hits", type=int, default=10, help="每个补剂的DSLD产品数")
+    parser.add_argument("--output", default="bench_results.json", help="结果JSON文件")
+    parser.add_argument("--compare", default=None, help="与之前的结果JSON对比")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录（含爬取数据与日志）")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(worker(json.loads(args.worker))))
+        return
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(sorted(unknown))}")
+    with open(SUPPLEMENTS_FILE, 'r', encoding='utf-8') as f:
+        base = [line.strip() for line in f if line.strip()]
+    config = StubConfig(latency=args.latency, pubmed_hits=args.pubmed_hits, trial_hits=args.trial_hits,
+                        dsld_hits=args.dsld_hits, throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    server, base_url = start_stub_server(config)
+    crawl_argv = ["--async", "--concurrency", str(args.concurrency)] if args.mode == "async" else []
+    if args.parse_workers:
+        crawl_argv += ["--parse-workers", str(args.parse_workers)]
+
+    print(f"{'scale':>6}  {'stage':<20}{'records':>9}{'time(s)':>10}{'records/s':>11}{'req/s':>9}"
+          f"{'p50(ms)':>9}{'p99(ms)':>9}{'429s':>7}{'parse(us)':>11}{'RSS(MB)':>9}")
+    results = []
+    try:
+        for scale in (int(s) for s in args.scales.split(",")):
+            supplements = scaled_supplements(base, scale)
+            workspace = make_workspace(supplements)
+            try:
+                for stage in stages:
+                    before = config.snapshot()["throttled"]
+                    result = run_stage(stage, workspace, base_url, crawl_argv)
+                    row = summarize(scale, stage, len(supplements), result, config.snapshot()["throttled"] - before)
+                    results.append(row)
+                    print_row(row)
+            finally:
+                if args.keep:
+                    print(f"工作目录: {workspace}")
+                else:
+                    shutil.rmtree(workspace, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("worker", "output", "compare", "keep")},
+        },
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\n结果已写入: {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+# 本地桩服务：模拟 E-utilities / ClinicalTrials.gov / DSLD 接口，返回确定性的合成数据
+
+def _seed(text):
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+
+def synthetic_pmids(term, count):
+    # 基数范围较小，不同补剂的检索结果会部分重叠，便于验证跨补剂去重
+    base = 30000000 + _seed(term) % 400
+    return [str(base + i * 3) for i in range(count)]
+
+def pubmed_article_xml(pmid):
+    seed = _seed(pmid)
+    year = 2000 + seed % 26
+    return (
+        "<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>"
+        "<Journal><Title>Journal {j}</Title><JournalIssue><PubDate><Year>{year}</Year>"
+        "<Month>Jan</Month></PubDate></JournalIssue></Journal>"
+        "<ArticleTitle>Synthetic study {pmid} on dietary supplementation outcomes</ArticleTitle>"
+        "<Abstract><AbstractText Label=\"BACKGROUND\">Background for article {pmid}. {filler}</AbstractText>"
+        "<AbstractText Label=\"RESULTS\">Results for article {pmid}.</AbstractText></Abstract>"
+        "</Article><MeshHeadingList><MeshHeading><DescriptorName>Dietary Supplements</DescriptorName>"
+        "</MeshHeading></MeshHeadingList></MedlineCitation></PubmedArticle>"
+    ).format(pmid=pmid, j=seed % 40, year=year, filler="lorem ipsum " * (seed % 60))
+
+def v2_study(nct_id, term):
+    return {"protocolSection": {
+        "identificationModule": {"nctId": nct_id, "officialTitle": f"Trial {nct_id} of {term}"},
+        "statusModule": {"overallStatus": "COMPLETED" if _seed(nct_id) % 3 else "RECRUITING",
+                         "completionDateStruct": {"date": f"{2010 + _seed(nct_id) % 16}-06", "type": "ACTUAL"}},
+        "conditionsModule": {"conditions": ["Insomnia", "Fatigue"]},
+        "armsInterventionsModule": {"interventions": [
+            {"name": term, "type": "DIETARY_SUPPLEMENT"},
+            {"name": "Placebo", "type": "OTHER"},
+        ]},
+        "outcomesModule": {"primaryOutcomes": [{"measure": "Sleep quality"}]},
+    }}
+
+# 合成标签的含量写法轮换使用，覆盖含量归一化的常见格式
+DSLD_AMOUNTS = ("{v} mg", "{v},000 mcg", "{v} IU", "0.{v} g", "{v} Billion CFU", "{v} mcg DFE")
+
+def dsld_products_xml(name, count, start=0, size=None):
+    # from/size 分页，total 为匹配的产品总数
+    end = count if size is None else min(start + size, count)
+    products = []
+    for i in range(start, end):
+        products.append(
+            "<product><name>{n} Product {i}</name><manufacturer>Maker {m}</manufacturer>"
+            "<ingredients><ingredient><name>{n}</name><amount>{a}</amount></ingredient>"
+            "<ingredient><name>Cellulose</name><amount>10 mg</amount></ingredient></ingredients>"
+            "<health_claims><health_claim>Supports wellness</health_claim></health_claims></product>"
+            .format(n=escape(name), i=i, m=_seed(name) % 17,
+                    a=DSLD_AMOUNTS[i % len(DSLD_AMOUNTS)].format(v=i + 1))
+        )
+    return '<products total="{}">{}</products>'.format(count, "".join(products))
+
+class StubConfig:
+    # throttle_rate: 按该比例随机返回429（带 Retry-After: retry_after 秒），seed固定时注入位置可复现
+    def __init__(self, latency=0.0, pubmed_hits=20, trial_hits=15, dsld_hits=10,
+                 throttle_rate=0.0, retry_after=0.1, seed=0):
+        self.latency = latency
+        self.pubmed_hits = pubmed_hits
+        self.trial_hits = trial_hits
+        self.dsld_hits = dsld_hits
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self.history = {}
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def should_throttle(self):
+        with self.lock:
+            self.requests += 1
+            if self.throttle_rate and self._random.random() < self.throttle_rate:
+                self.throttled += 1
+                return True
+            return False
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled}
+
+    def store_history(self, webenv, ids):
+        # 模拟E-utilities历史服务器：WebEnv -> [query_key对应的PMID列表]
+        with self.lock:
+            webenv = webenv or f"STUB_WEBENV_{len(self.history) + 1}"
+            sets = self.history.setdefault(webenv, [])
+            sets.append(ids)
+            return webenv, str(len(sets))
+
+    def load_history(self, webenv, query_key):
+        with self.lock:
+            return self.history.get(webenv, [])[int(query_key) - 1]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头部与正文分两次写出，不关闭Nagle时每个请求会多出约40ms的延迟确认等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _begin(self):
+        # 返回None表示本次请求已按429应答
+        config = self.server.config
+        if config.latency:
+            time.sleep(config.latency)
+        if config.should_throttle():
+            self._send("Too Many Requests", "text/plain", status=429,
+                       headers={"Retry-After": str(config.retry_after)})
+            return None
+        return config
+
+    def do_POST(self):
+        # 先读完请求体，429应答后连接仍可复用
+        length = int(self.headers.get("Content-Length", 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        config = self._begin()
+        if config is None:
+            return
+        if urlparse(self.path).path.endswith("/epost.fcgi"):
+            ids = [i for i in form.get("id", "").split(",") if i]
+            webenv, query_key = config.store_history(form.get("WebEnv"), ids)
+            body = f"<ePostResult><QueryKey>{query_key}</QueryKey><WebEnv>{webenv}</WebEnv></ePostResult>"
+            self._send(body, "text/xml")
+        else:
+            self._send("not found", "text/plain", status=404)
+
+    def do_GET(self):
+        config = self._begin()
+        if config is None:
+            return
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path.endswith("/esearch.fcgi"):
+            all_ids = synthetic_pmids(params.get("term", ""), config.pubmed_hits)
+            ids = all_ids[:int(params.get("retmax", 20))]
+            result = {"count": str(len(all_ids)), "idlist": ids}
+            if params.get("usehistory") == "y":
+                webenv, query_key = config.store_history(params.get("WebEnv"), all_ids)
+                result.update(webenv=webenv, querykey=query_key)
+            self._send(json.dumps({"esearchresult": result}), "application/json")
+        elif url.path.endswith("/efetch.fcgi"):
+            if "query_key" in params:
+                ids = config.load_history(params.get("WebEnv"), params["query_key"])
+                retstart = int(params.get("retstart", 0))
+                ids = ids[retstart:retstart + int(params.get("retmax", 20))]
+            else:
+                ids = [i for i in params.get("id", "").split(",") if i]
+            articles = "".join(pubmed_article_xml(i) for i in ids)
+            self._send(f"<?xml version=\"1.0\"?><PubmedArticleSet>{articles}</PubmedArticleSet>", "text/xml")
+        elif url.path.endswith("/api/v2/studies"):
+            # v2分页：pageToken 即下一页起始偏移；增量过滤条件不影响NCT编号
+            term = params.get("query.intr", "")
+            start = int(params.get("pageToken", 0))
+            end = min(start + int(params.get("pageSize", 10)), config.trial_hits)
+            body = {"studies": [v2_study(f"NCT{(_seed(term) + i) % 10**8:08d}", term) for i in range(start, end)]}
+            if end < config.trial_hits:
+                body["nextPageToken"] = str(end)
+            self._send(json.dumps(body), "application/json")
+        elif url.path.endswith("/dsld/api"):
+            size = int(params["size"]) if "size" in params else None
+            body = dsld_products_xml(params.get("name", ""), config.dsld_hits, int(params.get("from", 0)), size)
+            self._send(body, "application/xml")
+        else:
+            self._send("not found", "text/plain", status=404)
+
+    def _send(self, body, content_type, status=200, headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config or StubConfig()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    # 单独运行桩服务，便于手动把爬虫的API常量指向它调试
+    parser = argparse.ArgumentParser(description="E-utilities / ClinicalTrials.gov / DSLD 本地桩服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的请求比例")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="429应答的Retry-After（秒）")
+    args = parser.parse_args()
+    config = StubConfig(latency=args.latency, throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    server, base_url = start_stub_server(config, port=args.port)
+    print(f"桩服务已启动: {base_url}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(config.snapshot()))
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from crawl_state import state_dir, write_json_atomic
+from metrics import span
+from sharding import shard_name
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+# 断点只在同一轮内有效（远短于每周一次的定时运行周期）：超过该时长的一轮重新开始，
+# 否则一次偶发失败会让下一周只重试失败的补剂、其余补剂整整两周不刷新；
+# 连续失败达到次数上限的补剂不再阻止开始新一轮
+RESUME_MAX_AGE = timedelta(hours=12)
+MAX_ATTEMPTS = 3
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+class CheckpointJournal:
+    # 断点日志：记录每个补剂的状态（待处理/完成/失败）、错误信息与分页位置，每次变更都原子落盘
+    def __init__(self, path):
+        self.path = path
+        self.source = os.path.basename(path).split('.')[0]
+        self._lock = threading.Lock()
+        self._data = {"started_at": None, "supplements": {}}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+
+    @property
+    def entries(self):
+        return self._data["supplements"]
+
+    def _save(self):
+        with span("write", source=self.source, sink="journal"):
+            write_json_atomic(self.path, self._data)
+
+    def unfinished(self, supplements):
+        # 只看本次要爬的补剂；已达失败次数上限的不算未完成
+        return [s for s in supplements
+                if s in self.entries and self.entries[s]["status"] != COMPLETED
+                and self.entries[s].get("attempts", 0) < MAX_ATTEMPTS]
+
+    def _expired(self):
+        started_at = self._data.get("started_at")
+        if not started_at:
+            return True
+        return datetime.now(timezone.utc) - datetime.fromisoformat(started_at) > RESUME_MAX_AGE
+
+    def begin(self, supplements, resume=False):
+        # --resume 且本轮未过期、仍有未完成的补剂时，跳过已完成的，只重试失败和未处理的；否则开始新一轮
+        with self._lock:
+            if resume and not self._expired() and self.unfinished(supplements):
+                # 已不在补剂列表中的条目（如已合并为别名）直接丢弃
+                self._data["supplements"] = {s: self.entries.get(s, {"status": PENDING}) for s in supplements}
+                completed = {s for s, entry in self.entries.items() if entry["status"] == COMPLETED}
+                remaining = [s for s in supplements if s not in completed]
+                failed = sum(1 for s in remaining if self.entries[s]["status"] == FAILED)
+                logger.info(f"断点续爬: 跳过 {len(supplements) - len(remaining)} 个已完成，"
+                            f"重试 {failed} 个失败，{len(remaining) - failed} 个待处理")
+            else:
+                self._data = {
+                    "started_at": _now(),
+                    "supplements": {s: {"status": PENDING} for s in supplements}
+                }
+                remaining = list(supplements)
+            self._save()
+        return remaining
+
+    def cursor(self, supplement):
+        with self._lock:
+            return dict(self.entries.get(supplement, {}).get("cursor", {}))
+
+    def set_cursor(self, supplement, **cursor):
+        # 分页位置（如page token、retstart），中断后可从该位置继续
+        with self._lock:
+            self.entries.setdefault(supplement, {"status": PENDING})["cursor"] = cursor
+            self._save()
+
+    def mark_completed(self, supplement, records=0):
+        with self._lock:
+            self.entries[supplement] = {"status": COMPLETED, "records": records, "updated_at": _now()}
+            self._save()
+
+    def mark_failed(self, supplement, error):
+        with self._lock:
+            entry = self.entries.setdefault(supplement, {})
+            entry.update(status=FAILED, error=error, updated_at=_now(),
+                         attempts=entry.get("attempts", 0) + 1)
+            self._save()
+
+    def track(self, crawl_one):
+        # 包装单个补剂的爬取函数：返回None或抛出异常记为失败，否则记为完成
+        def tracked(supplement):
+            try:
+                result = crawl_one(supplement)
+            except Exception as e:
+                self.mark_failed(supplement, str(e))
+                raise
+            if result is None:
+                self.mark_failed(supplement, "请求失败")
+            else:
+                self.mark_completed(supplement, result)
+            return result
+        return tracked
+
+    def summary(self):
+        with self._lock:
+            counts = {PENDING: 0, COMPLETED: 0, FAILED: 0}
+            for entry in self.entries.values():
+                counts[entry["status"]] += 1
+            failed = {s: entry.get("error", "") for s, entry in self.entries.items() if entry["status"] == FAILED}
+        return counts, failed
+
+    def log_summary(self):
+        counts, failed = self.summary()
+        logger.info(f"断点日志 {self.path}: 完成 {counts[COMPLETED]}，失败 {counts[FAILED]}，待处理 {counts[PENDING]}")
+        for supplement, error in failed.items():
+            logger.warning(f"失败: {supplement} - {error}（使用 --resume 重试）")
+
+def load_journal(root, source, shard=None):
+    # 每个分片一份断点日志，并行的分片进程互不覆盖
+    name = f'{source}.{shard_name(shard)}' if shard else source
+    return CheckpointJournal(os.path.join(state_dir(root), 'checkpoints', f'{name}.json'))
@@ -1,9 +1,17 @@
-import requests
 import csv
+import json
 import os
-import time
 import logging
-from urllib.parse import quote
+from functools import partial
+from urllib.parse import urlparse
+from columnar_store import record_csv, record_rows
+from evidence_store import upsert_records
+from crawl_runner import build_arg_parser, configure_crawl, crawl_layout, instrumented_run, run_crawl
+from crawl_state import merge_rows_into_csv
+from http_client import safe_api_request
+from metrics import inc, span
+from parse_pool import get_writer, parse_payload, wait_writes
+from supplement_aliases import get_resolver, load_supplement_list
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,240 +30,202 @@ def get_project_root():
     return os.path.dirname(os.path.dirname(current_dir))
 
 def load_supplements():
-    root = get_project_root()
-    config_path = os.path.join(root, 'knowledge_graph', 'config', 'supplements.txt')
-    logger.info(f"加载补剂列表从: {config_path}")
-    if not os.path.exists(config_path):
-        logger.error(f"配置文件不存在: {config_path}")
-        return []
-    with open(config_path, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f.readlines() if line.strip()]
+    # 按别名表合并同义名称（如 铁 / 铁剂），每种补剂只检索一次
+    return load_supplement_list(get_project_root())
+
+CT_API = "https://clinicaltrials.gov/api/v2/studies"
+PAGE_SIZE = 100
+STUDY_FIELDS = ["nct_id", "title", "status", "conditions", "interventions", "primary_outcomes", "completion_date"]
 
-# 补剂中英文映射表（核心修改：解决名称不匹配问题）
-SUPPLEMENT_MAPPING = {
-    "复合B族": "B-complex",
-    "维生素C": "Vitamin C",
-    "锌": "Zinc",
-    "镁": "Magnesium",
-    "硒": "Selenium",
-    "碘": "Iodine",
-    "铁": "Iron",
-    "lutein": "Lutein",
-    "赖氨酸": "Lysine",
-    "PQQ": "PQQ",
-    "NAD+": "NAD+",
-    "NMN": "NMN",
-    "α-硫辛酸": "Alpha-lipoic acid",
-    "虾青素": "Astaxanthin",
-    "SOD": "SOD",
-    "端粒酶激活剂": "Telomerase activator",
-    "亚精胺": "Spermidine",
-    "白藜芦醇": "Resveratrol",
-    "NAC": "NAC",
-    "花青素": "Anthocyanin",
-    "肌肽": "Carnosine",
-    "astaxanthin": "Astaxanthin",
-    "苏糖酸镁": "Magnesium threonate",
-    "GABA": "GABA",
-    "L-茶氨酸": "L-theanine",
-    "5-HTP": "5-HTP",
-    "南非醉茄": "Ashwagandha",
-    "人参皂苷": "Ginsenoside",
-    "维生素D3": "Vitamin D3",
-    "维生素K2": "Vitamin K2",
-    "骨胶原蛋白肽": "Bone collagen peptide",
-    "透明质酸钠": "Sodium hyaluronate",
-    "软骨素": "Chondroitin",
-    "氨糖": "Glucosamine",
-    "甜菜碱": "Betaine",
-    "谷氨酰胺": "Glutamine",
-    "牛磺酸": "Taurine",
-    "电解质粉": "Electrolyte powder",
-    "一水肌酸": "Creatine monohydrate",
-    "瓜拉纳粉": "Guarana powder",
-    "谷胱甘肽": "Glutathione",
-    "水解胶原肽": "Hydrolyzed collagen peptide",
-    "角蛋白": "Keratin",
-    "L半胱胺酸": "L-cysteine",
-    "熊果苷": "Arbutin",
-    "富勒烯": "Fullerene",
-    "麦角硫因": "Ergothioneine",
-    "烟酰胺": "Niacinamide",
-    "西兰花粉": "Broccoli powder",
-    "光甘草定": "Glabridin",
-    "生物素": "Biotin",
-    "B12": "Vitamin B12",
-    "DHA": "DHA",
-    "L胆碱": "L-choline",
-    "胆碱": "Choline",
-    "磷脂酰丝氨酸": "Phosphatidylserine",
-    "银杏内酯": "Ginkgolide",
-    "银杏叶提取物": "Ginkgo biloba extract",
-    "长春西汀": "Vinpocetine",
-    "假马齿苋": "Bacopa monnieri",
-    "朝鲜蓟": "Artichoke",
-    "神经酸": "Nervonic acid",
-    "Acetyl-L-Carnitine": "Acetyl-L-Carnitine",
-    "迷迭香酸": "Rosmarinic acid",
-    "左旋肉碱": "L-carnitine",
-    "beta丙氨酸": "Beta-alanine",
-    "沙棘黄酮": "Seabuckthorn flavonoids",
-    "肌醇": "Inositol",
-    "灵芝孢子粉": "Ganoderma lucidum spore powder",
-    "姜黄素": "Curcumin",
-    "大蒜素": "Allicin",
-    "蔓越莓提取物": "Cranberry extract",
-    "Omega-3": "Omega-3",
-    "CoQ10": "CoQ10",
-    "红景天": "Rhodiola rosea",
-    "铁剂": "Iron supplement",
-    "西红花": "Saffron",
-    "弹性蛋白": "Elastin",
-    "曲克芦丁": "Troxerutin",
-    "水飞蓟宾": "Silybin"
+# v2 API返回枚举值，转换为旧版展示文本，保持CSV和下游清洗（R按 "Completed" 等过滤）不变
+STATUS_LABELS = {
+    "ACTIVE_NOT_RECRUITING": "Active, not recruiting",
+    "COMPLETED": "Completed",
+    "ENROLLING_BY_INVITATION": "Enrolling by invitation",
+    "NOT_YET_RECRUITING": "Not yet recruiting",
+    "RECRUITING": "Recruiting",
+    "SUSPENDED": "Suspended",
+    "TERMINATED": "Terminated",
+    "WITHDRAWN": "Withdrawn",
+    "AVAILABLE": "Available",
+    "NO_LONGER_AVAILABLE": "No longer available",
+    "TEMPORARILY_NOT_AVAILABLE": "Temporarily not available",
+    "APPROVED_FOR_MARKETING": "Approved for marketing",
+    "WITHHELD": "Withheld",
+    "UNKNOWN": "Unknown status",
 }
 
-def safe_api_request(url, params, retries=3, timeout=30):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'application/json'
-    }
-    for attempt in range(retries):
-        try:
-            response = requests.get(url, params=params, headers=headers, timeout=timeout)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.HTTPError as e:
-            status = e.response.status_code
-            if status == 404:
-                logger.error(f"404 未找到: {url}")
-                return None
-            elif status == 429:
-                wait = min(2 **attempt, 60)
-                logger.warning(f"请求过多，等待 {wait} 秒后重试...")
-                time.sleep(wait)
-            else:
-                logger.error(f"HTTP错误 {status}: {str(e)}")
-                wait = min(2** attempt, 30)
-                time.sleep(wait)
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
-            logger.error(f"网络错误: {str(e)}")
-            wait = min(2 **attempt, 30)
-            time.sleep(wait)
-        except Exception as e:
-            logger.error(f"未知错误: {str(e)}")
-            wait = min(2** attempt, 30)
-            time.sleep(wait)
-    logger.error(f"请求失败，重试 {retries} 次后放弃")
-    return None
+def enum_label(value):
+    # DIETARY_SUPPLEMENT -> Dietary Supplement
+    return value.replace("_", " ").title()
 
-def fetch_trials(supplement):
+def build_query(supplement, since=None):
     # 使用英文名称查询（核心修改）
-    supplement_en = SUPPLEMENT_MAPPING.get(supplement, supplement)
-    encoded_supplement = quote(supplement_en, encoding='utf-8')
-    # 修正查询表达式：使用正确的API字段（核心修改）
-    expr = f'"{encoded_supplement}"[Intervention] AND "dietary supplement"[InterventionType]'
-    url = "https://clinicaltrials.gov/api/query/full_studies"
-    params = {
-        "expr": expr,
-        "min_rnk": 1,
-        "max_rnk": 100,
-        "fmt": "json"
+    supplement_en = get_resolver().search_name(supplement)
+    advanced = "AREA[InterventionType]DIETARY_SUPPLEMENT"
+    if since:
+        # 增量模式：只取水位线之后有更新的研究
+        advanced += f" AND AREA[LastUpdatePostDate]RANGE[{since.isoformat()},MAX]"
+    return {
+        "query.intr": supplement_en,
+        "filter.advanced": advanced,
+        "pageSize": PAGE_SIZE,
+        "format": "json"
     }
-    logger.info(f"查询ClinicalTrials: {url}?expr={expr}")  # 新增日志：输出查询URL
-    response = safe_api_request(url, params, timeout=45)
-    if not response:
-        logger.warning(f"无法获取 {supplement} 的数据")
-        return supplement, None
-    try:
-        data = response.json()
-        n_studies = data.get("FullStudiesResponse", {}).get("NStudiesFound", 0)
-        if n_studies == 0:
-            logger.info(f"{supplement}（{supplement_en}）无相关研究")
-            return supplement, None
-        studies = data.get("FullStudiesResponse", {}).get("FullStudies", [])
-        return supplement, studies
-    except Exception as e:
-        logger.error(f"解析 {supplement} 数据失败: {str(e)}")
-        return supplement, None
+
+def iter_trial_pages(supplement, since=None, page_token=None):
+    # 沿 nextPageToken 逐页拉取，每页解析后立即产出 (研究列表, 下一页token)；请求失败时产出None并结束
+    params = build_query(supplement, since)
+    logger.info(f"查询ClinicalTrials: {CT_API}?query.intr={params['query.intr']}&filter.advanced={params['filter.advanced']}")
+    while True:
+        page_params = dict(params, pageToken=page_token) if page_token else params
+        response = safe_api_request(CT_API, page_params, timeout=45)
+        if not response:
+            logger.warning(f"无法获取 {supplement} 的数据")
+            yield None
+            return
+        try:
+            studies, page_token = parse_payload(parse_page, response.content, source="clinical_trials")
+        except ValueError as e:
+            logger.error(f"解析 {supplement} 数据失败: {str(e)}")
+            yield None
+            return
+        inc("records_parsed", len(studies), source="clinical_trials")
+        yield studies, page_token
+        if not page_token:
+            return
+
+def parse_page(content):
+    # 可在解析进程中执行：原始响应体 -> (研究列表, 下一页token)
+    data = json.loads(content)
+    return [parsed for parsed in map(parse_study, data.get("studies", [])) if parsed], data.get("nextPageToken")
 
 def parse_study(study):
     try:
-        protocol = study["ProtocolSection"]
-        id_module = protocol["IdentificationModule"]
-        status_module = protocol["StatusModule"]
-        conditions_module = protocol.get("ConditionsModule", {})
-        conditions = conditions_module.get("ConditionList", {}).get("Condition", [])
+        protocol = study["protocolSection"]
+        id_module = protocol["identificationModule"]
+        status_module = protocol.get("statusModule", {})
+        conditions = protocol.get("conditionsModule", {}).get("conditions", [])
         interventions = []
-        arms_module = protocol.get("ArmsInterventionsModule", {})
-        intervention_list = arms_module.get("InterventionList", {}).get("Intervention", [])
-        for i in intervention_list:
-            name = i.get("InterventionName", "未命名干预")
-            itype = i.get("InterventionType", "未知类型")
+        for i in protocol.get("armsInterventionsModule", {}).get("interventions", []):
+            name = i.get("name", "未命名干预")
+            itype = enum_label(i["type"]) if i.get("type") else "未知类型"
             interventions.append(f"{name} ({itype})")
         primary_outcome = "未指定"
-        outcomes_module = protocol.get("OutcomesModule", {})
-        if outcomes_module:
-            primary_outcome_list = outcomes_module.get("PrimaryOutcomeList", {}).get("PrimaryOutcome", [])
-            if primary_outcome_list:
-                primary_outcome = primary_outcome_list[0].get("PrimaryOutcomeMeasure", "未指定")
+        primary_outcome_list = protocol.get("outcomesModule", {}).get("primaryOutcomes", [])
+        if primary_outcome_list:
+            primary_outcome = primary_outcome_list[0].get("measure", "未指定")
+        status = status_module.get("overallStatus")
         return {
-            "nct_id": id_module.get("NCTId", "无ID"),
-            "title": id_module.get("OfficialTitle", "无标题"),
-            "status": status_module.get("OverallStatus", "状态未知"),
+            "nct_id": id_module.get("nctId", "无ID"),
+            "title": id_module.get("officialTitle", "无标题"),
+            "status": STATUS_LABELS.get(status, status) if status else "状态未知",
             "conditions": "; ".join(conditions),
             "interventions": "; ".join(interventions),
-            "primary_outcomes": primary_outcome
+            "primary_outcomes": primary_outcome,
+            "completion_date": status_module.get("completionDateStruct", {}).get("date", "")
         }
     except Exception as e:
         logger.error(f"解析研究失败: {str(e)}")
         return None
 
-def process_supplement(supplement):
-    logger.info(f"开始处理: {supplement}")
-    supp, studies = fetch_trials(supplement)
+def read_nct_ids(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return [row["nct_id"] for row in csv.DictReader(f)]
+
+def merge_supplement(supplement, output_path, state, since):
+    # 增量结果只含水位线之后更新的研究，数量很少，收集后按nct_id合并进已有CSV
+    studies = []
+    for page in iter_trial_pages(supplement, since):
+        if page is None:
+            return None
+        studies.extend(page[0])
     if not studies:
-        logger.warning(f"{supplement} 无有效研究")
-        return None
-    valid_studies = []
-    for s in studies:
-        study_data = s.get("Study")
-        if study_data:
-            parsed = parse_study(study_data)
-            if parsed:
-                valid_studies.append(parsed)
-    if not valid_studies:
-        logger.warning(f"{supplement} 无有效研究数据")
+        state.record(supplement, [])
+        logger.info(f"{supplement} 无更新的研究")
+        return 0
+    with span("write", source="clinical_trials", sink="csv"):
+        added, updated = merge_rows_into_csv(output_path, studies, "nct_id")
+    # 写入成功后才推进水位线
+    state.record(supplement, [study["nct_id"] for study in studies])
+    inc("rows_written", len(studies), source="clinical_trials", sink="csv")
+    record_rows('clinical_trials', supplement, studies)
+    upsert_records('clinical_trials', supplement, studies)
+    logger.info(f"合并 {supplement}: 新增 {added} 项，更新 {updated} 项")
+    return len(studies)
+
+def page_written(supplement, journal, studies, next_token, written):
+    upsert_records('clinical_trials', supplement, studies)
+    if next_token:
+        journal.set_cursor(supplement, page_token=next_token, rows=written)
+
+def crawl_supplement(supplement, output_dir, state, journal, incremental=False):
+    logger.info(f"开始处理: {supplement}")
+    output_path = os.path.join(output_dir, f"{supplement}.csv")
+    if incremental:
+        return merge_supplement(supplement, output_path, state, state.last_success(supplement))
+    # 全量模式：每页解析后立即写入 .part 文件，完成后再替换正式CSV；
+    # 每页的 nextPageToken 记入断点日志，--resume 时从中断的页继续
+    part_path = f"{output_path}.part"
+    cursor = journal.cursor(supplement)
+    page_token = cursor.get("page_token") if os.path.exists(part_path) else None
+    written = cursor.get("rows", 0) if page_token else 0
+    if page_token:
+        logger.info(f"{supplement} 从断点继续（已写入 {written} 项）")
+    fetched_pages = 0
+    # 行由写入阶段追加到 .part 文件，flush之后才upsert并记录断点，中断时断点不会超前于文件内容
+    writer = get_writer()
+    writes = [writer.append(part_path, STUDY_FIELDS, [], truncate=not page_token, source="clinical_trials")]
+    for page in iter_trial_pages(supplement, page_token=page_token):
+        if page is None:
+            writes.append(writer.close(part_path))
+            if wait_writes(writes) is None and page_token and not fetched_pages:
+                # 断点token本身请求失败（可能已过期），下次从头开始
+                journal.set_cursor(supplement)
+            return None
+        studies, next_token = page
+        fetched_pages += 1
+        written += len(studies)
+        writes.append(writer.append(part_path, STUDY_FIELDS, studies, source="clinical_trials",
+                                    callback=partial(page_written, supplement, journal, studies, next_token, written)))
+    writes.append(writer.close(part_path))
+    error = wait_writes(writes)
+    if error is not None:
+        # 有一页没有写入 .part 文件，断点不再可信，下次从头开始
+        journal.set_cursor(supplement)
+        logger.error(f"写入 {supplement} 失败: {str(error)}")
         return None
-    return {
-        "supplement": supplement,
-        "studies": valid_studies
-    }
+    if not written:
+        os.remove(part_path)
+        state.record(supplement, [])
+        logger.warning(f"{supplement} 无有效研究")
+        return 0
+    os.replace(part_path, output_path)
+    state.record(supplement, read_nct_ids(output_path))
+    record_csv('clinical_trials', supplement, output_path)
+    logger.info(f"保存 {written} 项研究: {supplement}（{fetched_pages} 页）")
+    return written
 
-def main():
+def main(argv=None):
+    parser = build_arg_parser("ClinicalTrials.gov 临床试验数据爬虫")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量模式：只拉取水位线之后更新的研究并合并进已有CSV")
+    args = parser.parse_args(argv)
     supplements = load_supplements()
     if not supplements:
         logger.error("未加载任何补剂，程序终止")
         return
     root = get_project_root()
-    output_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', 'clinical_trials')
-    os.makedirs(output_dir, exist_ok=True)
+    supplements, output_dir, state, journal = crawl_layout(args, root, 'clinical_trials', supplements)
     logger.info(f"输出目录: {output_dir}")
     logger.info(f"开始爬取 {len(supplements)} 种补剂的临床试验数据")
-    for supplement in supplements:
-        try:
-            result = process_supplement(supplement)
-            if not result:
-                continue
-            output_path = os.path.join(output_dir, f"{result['supplement']}.csv")
-            with open(output_path, "w", newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=result['studies'][0].keys())
-                writer.writeheader()
-                writer.writerows(result['studies'])
-            logger.info(f"保存 {len(result['studies'])} 项研究: {result['supplement']}")
-            time.sleep(5)
-        except Exception as e:
-            logger.error(f"处理 {supplement} 时出错: {str(e)}")
+    host = urlparse(CT_API).hostname
+    configure_crawl(args, host, root)
+    crawl_one = partial(crawl_supplement, output_dir=output_dir, state=state, journal=journal,
+                        incremental=args.incremental)
+    with instrumented_run(args, root, 'clinical_trials'):
+        run_crawl(supplements, crawl_one, host, args, journal)
+        state.save()
     logger.info("临床试验数据爬取完成")
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+import argparse
+import csv
+import glob
+import logging
+import os
+import time
+import uuid
+from datetime import date
+from urllib.parse import quote
+
+from metrics import inc, span
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pa_fs
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow为可选依赖，只有启用列式存储时才需要
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 列式数据集布局（hive分区，每次写入追加一个新文件）：
+#   data/columnar/source=<数据源>/supplement=<补剂>/crawl_date=<YYYY-MM-DD>/part-<时间>-<uuid>.parquet
+# 取值重复度高的字符串列使用字典编码
+DICTIONARY_COLUMNS = {
+    "clinical_trials": ["status", "conditions", "primary_outcomes"],
+    "pubmed": ["journal", "pub_date"],
+    "nih_dsld": ["manufacturer"],
+}
+# 每个数据源的记录主键（与evidence_store的自然键一致）：同一补剂同一主键以最新的crawl_date为准
+RECORD_KEYS = {"clinical_trials": ["nct_id"], "pubmed": ["pmid"], "nih_dsld": ["product_name", "manufacturer"]}
+PARTITION_SCHEMA = [("supplement", "string"), ("crawl_date", "string")]
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("列式存储需要pyarrow，请运行：pip install pyarrow")
+
+def default_columnar_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'columnar')
+
+def encode_table(source, table):
+    # 所有列统一为字符串，低基数列转为字典编码；补剂名由分区目录提供，不重复存储
+    if "supplement" in table.column_names:
+        table = table.drop_columns(["supplement"])
+    dictionary_columns = DICTIONARY_COLUMNS.get(source, [])
+    for i, name in enumerate(table.column_names):
+        column = table.column(i)
+        if not pa.types.is_string(column.type):
+            column = column.cast(pa.string())
+        if name in dictionary_columns:
+            column = pc.dictionary_encode(column)
+        table = table.set_column(i, name, column)
+    return table
+
+class ColumnarStore:
+    def __init__(self, directory):
+        require_pyarrow()
+        self.directory = directory
+        self.files_written = 0
+        self.rows_written = 0
+
+    def source_dir(self, source):
+        return os.path.join(self.directory, f"source={source}")
+
+    def _partition_path(self, source, supplement, crawl_date):
+        partition = os.path.join(self.source_dir(source), f"supplement={quote(supplement, safe='')}",
+                                 f"crawl_date={crawl_date.isoformat()}")
+        os.makedirs(partition, exist_ok=True)
+        # 文件名按写入时间排序，读取时同一天内后写入的记录覆盖先写入的
+        return os.path.join(partition, f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet")
+
+    def _write(self, path, batches, schema):
+        tmp_path = f"{path}.tmp"
+        rows = 0
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for batch in batches:
+                writer.write_table(batch)
+                rows += batch.num_rows
+        os.replace(tmp_path, path)
+        self.files_written += 1
+        self.rows_written += rows
+        return rows
+
+    def append(self, source, supplement, rows, crawl_date=None):
+        if not rows:
+            return 0
+        table = encode_table(source, pa.Table.from_pylist(rows))
+        path = self._partition_path(source, supplement, crawl_date or date.today())
+        return self._write(path, [table], table.schema)
+
+    def append_csv(self, source, supplement, csv_path, crawl_date=None, block_size=1 << 20):
+        # 流式转换：按块读取CSV并写成Parquet行组，不把整个文件读入内存
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f), None)
+        if not header:
+            return 0
+        reader = pa_csv.open_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(block_size=block_size),
+            convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                                  strings_can_be_null=True),
+        )
+        try:
+            first = encode_table(source, pa.Table.from_batches([reader.read_next_batch()]))
+        except StopIteration:
+            return 0
+        def batches():
+            yield first
+            for batch in reader:
+                yield encode_table(source, pa.Table.from_batches([batch])).cast(first.schema)
+        path = self._partition_path(source, supplement, crawl_date or date.today())
+        return self._write(path, batches(), first.schema)
+
+    def dataset(self, source):
+        base = self.source_dir(source)
+        paths = sorted(glob.glob(os.path.join(base, "*", "*", "*.parquet")))
+        if not paths:
+            return None
+        # 只读文件尾部元数据来合并各文件的schema（数据源后来新增的列在旧文件中为空）
+        schema = pa.unify_schemas([pq.read_schema(path) for path in paths])
+        partitioning = ds.partitioning(pa.schema(PARTITION_SCHEMA), flavor="hive")
+        for name, type_name in PARTITION_SCHEMA:
+            if name not in schema.names:
+                schema = schema.append(pa.field(name, type_name))
+        return ds.dataset(paths, schema=schema, format="parquet", partitioning=partitioning,
+                          partition_base_dir=base, filesystem=pa_fs.LocalFileSystem(use_mmap=True))
+
+    def read_table(self, source, columns=None, supplements=None, since=None):
+        # 列投影 + 分区裁剪：只解码需要的列，只打开匹配的补剂/日期分区
+        dataset = self.dataset(source)
+        if dataset is None:
+            return None
+        expression = None
+        if supplements:
+            expression = ds.field("supplement").isin(list(supplements))
+        if since:
+            date_filter = ds.field("crawl_date") >= since.isoformat()
+            expression = date_filter if expression is None else expression & date_filter
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def read_frame(self, source, columns=None, supplements=None, since=None, latest=True):
+        table = self.read_table(source, columns, supplements, since)
+        if table is None:
+            return None
+        frame = table.to_pandas()
+        keys = RECORD_KEYS.get(source, [])
+        if latest and keys and set(keys + ["supplement"]) <= set(frame.columns):
+            # 追加写入会留下同一记录的多个版本，保留最新一次爬取的版本
+            frame = frame.iloc[::-1].drop_duplicates(subset=["supplement", *keys]).iloc[::-1]
+        return frame
+
+_store = None
+
+def configure_store(store):
+    global _store
+    _store = store
+
+def get_store():
+    return _store
+
+def record_rows(source, supplement, rows):
+    # 未启用列式存储时不做任何事，爬虫可以无条件调用
+    if _store is not None and rows:
+        with span("write", source=source, sink="columnar"):
+            _store.append(source, supplement, rows)
+        inc("rows_written", len(rows), source=source, sink="columnar")
+
+def record_csv(source, supplement, csv_path):
+    if _store is not None:
+        with span("write", source=source, sink="columnar"):
+            _store.append_csv(source, supplement, csv_path)
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def import_raw(root, store, sources):
+    # 把已有的 data/raw/<数据源>/*.csv 导入列式数据集，crawl_date取文件修改日期
+    for source in sources:
+        raw_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', source)
+        if not os.path.isdir(raw_dir):
+            continue
+        files = sorted(f for f in os.listdir(raw_dir) if f.endswith(".csv"))
+        rows = 0
+        for name in files:
+            path = os.path.join(raw_dir, name)
+            crawl_date = date.fromtimestamp(os.path.getmtime(path))
+            rows += store.append_csv(source, name[:-len(".csv")], path, crawl_date)
+        logger.info(f"{source}: 导入 {len(files)} 个文件，{rows} 行")
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="把 data/raw 下的CSV导入分区Parquet数据集")
+    parser.add_argument("--columnar-dir", default=default_columnar_dir(root), help="列式数据集目录")
+    parser.add_argument("--source", choices=list(RECORD_KEYS), action="append",
+                        help="只导入指定数据源（可重复），默认全部")
+    args = parser.parse_args(argv)
+    store = ColumnarStore(args.columnar_dir)
+    import_raw(root, store, args.source or list(RECORD_KEYS))
+    logger.info(f"共写入 {store.files_written} 个文件，{store.rows_written} 行: {args.columnar_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import columnar_store
+import evidence_store
+import http_client
+from checkpoint import load_journal
+from crawl_state import load_state
+from metrics import PROFILE_MODES, default_metrics_dir, get_metrics, profile_stage, span
+from parse_pool import close_pipeline, configure_pipeline, default_parse_workers
+from rate_limiter import DEFAULT_CONCURRENCY, HOST_CONCURRENCY, configure_limiter, limiter_snapshot
+from response_cache import DEFAULT_MAX_BYTES, ResponseCache, default_cache_dir
+from sharding import SHARD_STATE_FILE, parse_shard, select_shard, shard_output_dir, write_manifest
+
+logger = logging.getLogger(__name__)
+
+def build_arg_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="使用asyncio并发爬取多个补剂")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="覆盖每个主机的最大并发请求数")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="覆盖该数据源的限流速率（请求/秒）")
+    parser.add_argument("--resume", action="store_true",
+                        help="从断点日志继续：跳过已完成的补剂，只重试失败和未处理的")
+    parser.add_argument("--cache", action="store_true",
+                        help="启用本地HTTP响应缓存")
+    parser.add_argument("--cache-only", action="store_true",
+                        help="离线回放：只读缓存，未命中时不访问网络")
+    parser.add_argument("--cache-dir", default=None,
+                        help="缓存目录（默认 knowledge_graph/data/cache）")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // 2**20,
+                        help="缓存容量上限（MB），超出后按LRU淘汰")
+    parser.add_argument("--columnar", action="store_true",
+                        help="同时把记录追加写入分区Parquet数据集（需要pyarrow）")
+    parser.add_argument("--columnar-dir", default=None,
+                        help="列式数据集目录（默认 knowledge_graph/data/columnar）")
+    parser.add_argument("--store", action="store_true",
+                        help="同时把记录upsert进本地SQLite证据库")
+    parser.add_argument("--store-path", default=None,
+                        help="证据库文件（默认 knowledge_graph/data/evidence.db）")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="K/N",
+                        help="只爬取第K个分片（共N个，按补剂名稳定哈希划分），输出写入 data/partial，"
+                             "之后用 merge_shards.py 合并")
+    parser.add_argument("--metrics-dir", default=None,
+                        help="运行指标输出目录（默认 knowledge_graph/data/metrics），写入JSON摘要与Prometheus文本文件")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                        help="剖析本次运行：cprofile（确定性，仅主线程）或 sample（定时采样所有线程的调用栈）")
+    parser.add_argument("--parse-workers", type=int, nargs="?", const=default_parse_workers(), default=0,
+                        metavar="N", help="用N个进程解析响应（不写N时为CPU核数-1），抓取线程只做网络I/O，"
+                                          "CSV由单独的写入线程批量写入；默认0为在抓取线程内直接解析")
+    parser.add_argument("--parse-queue", type=int, default=None,
+                        help="等待解析的响应体上限（默认每个解析进程2个），超出时抓取线程等待")
+    return parser
+
+def host_concurrency(host, override=None):
+    if override:
+        return max(1, override)
+    return HOST_CONCURRENCY.get(host, DEFAULT_CONCURRENCY)
+
+def run_serial(supplements, crawl_one):
+    # 请求节奏由rate_limiter的令牌桶控制，不再在补剂之间固定等待
+    for supplement in supplements:
+        try:
+            crawl_one(supplement)
+        except Exception as e:
+            logger.error(f"处理 {supplement} 时出错: {str(e)}")
+
+async def _crawl_all(supplements, crawl_one, limit):
+    # 信号量限制同一主机的在途请求数，阻塞的requests调用交给线程池
+    semaphore = asyncio.Semaphore(limit)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=limit) as executor:
+        async def crawl(supplement):
+            async with semaphore:
+                try:
+                    return await loop.run_in_executor(executor, crawl_one, supplement)
+                except Exception as e:
+                    logger.error(f"处理 {supplement} 时出错: {str(e)}")
+                    return None
+        return await asyncio.gather(*(crawl(s) for s in supplements))
+
+def run_async(supplements, crawl_one, host, concurrency=None):
+    limit = host_concurrency(host, concurrency)
+    logger.info(f"并发模式: {host} 最多 {limit} 个在途请求")
+    return asyncio.run(_crawl_all(supplements, crawl_one, limit))
+
+def configure_crawl(args, host, root):
+    # 在发出任何请求之前应用命令行中的全局设置
+    if args.rate:
+        configure_limiter(host, args.rate)
+    if args.concurrency:
+        # 覆盖后的并发上限同时决定http_client中该主机的连接池大小
+        HOST_CONCURRENCY[host] = host_concurrency(host, args.concurrency)
+    if args.cache or args.cache_only:
+        cache_dir = args.cache_dir or default_cache_dir(root)
+        cache = ResponseCache(cache_dir, args.cache_max_mb * 2**20, offline=args.cache_only)
+        http_client.configure_cache(cache)
+        logger.info(f"响应缓存: {cache_dir}{'（离线回放）' if args.cache_only else ''}")
+    if getattr(args, "columnar", False):
+        columnar_dir = args.columnar_dir or columnar_store.default_columnar_dir(root)
+        columnar_store.configure_store(columnar_store.ColumnarStore(columnar_dir))
+        logger.info(f"列式数据集: {columnar_dir}")
+    if getattr(args, "store", False):
+        store_path = args.store_path or evidence_store.default_store_path(root)
+        evidence_store.configure_evidence_store(evidence_store.EvidenceStore(store_path))
+        logger.info(f"证据库: {store_path}")
+    if getattr(args, "parse_workers", 0):
+        configure_pipeline(args.parse_workers, args.parse_queue)
+
+def crawl_layout(args, root, source, supplements):
+    # 返回 (本次要爬的补剂, 输出目录, 水位线, 断点日志)
+    # 分片模式下只保留本分片的补剂，输出和水位线写入分片目录，断点日志按分片区分
+    shard = getattr(args, "shard", None)
+    if not shard:
+        output_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', source)
+        os.makedirs(output_dir, exist_ok=True)
+        return supplements, output_dir, load_state(root, source), load_journal(root, source)
+    selected = select_shard(supplements, shard)
+    output_dir = shard_output_dir(root, source, shard)
+    os.makedirs(output_dir, exist_ok=True)
+    write_manifest(output_dir, source, shard, getattr(args, "incremental", False))
+    logger.info(f"分片 {shard[0]}/{shard[1]}: {len(selected)}/{len(supplements)} 种补剂")
+    state = load_state(root, source, save_path=os.path.join(output_dir, SHARD_STATE_FILE))
+    return selected, output_dir, state, load_journal(root, source, shard)
+
+@contextmanager
+def instrumented_run(args, root, source):
+    # 整次运行记一个stage耗时区间，结束时（包括中途异常）等待解析/写入流水线排空并导出指标；--profile 时同时剖析
+    metrics_dir = getattr(args, "metrics_dir", None) or default_metrics_dir(root)
+    shard = getattr(args, "shard", None)
+    run_name = f"{source}.shard{shard[0]}of{shard[1]}" if shard else source
+    profile = getattr(args, "profile", None)
+    if profile == "cprofile" and getattr(args, "use_async", False):
+        logger.warning("cprofile 只记录主线程，并发模式下请使用 --profile sample")
+    metrics = get_metrics()
+    try:
+        with profile_stage(profile, metrics_dir, run_name), span("stage", source=source):
+            try:
+                yield
+            finally:
+                close_pipeline()
+    finally:
+        metrics.log_top_spans()
+        metrics.write_report(metrics_dir, run_name)
+
+def run_crawl(supplements, crawl_one, host, args, journal=None):
+    if journal is not None:
+        supplements = journal.begin(supplements, resume=args.resume)
+        crawl_one = journal.track(crawl_one)
+    start = time.perf_counter()
+    if args.use_async:
+        run_async(supplements, crawl_one, host, args.concurrency)
+    else:
+        run_serial(supplements, crawl_one)
+    logger.info(f"爬取耗时 {time.perf_counter() - start:.1f} 秒")
+    for limited_host, state in limiter_snapshot().items():
+        logger.info(f"限流器状态 {limited_host}: {state}")
+    cache = http_client.get_cache()
+    if cache is not None:
+        logger.info(f"缓存统计: {cache.stats()}")
+    store = columnar_store.get_store()
+    if store is not None:
+        logger.info(f"列式数据集写入 {store.files_written} 个文件，{store.rows_written} 行")
+    if journal is not None:
+        journal.log_summary()
@@ -0,0 +1,104 @@
+import csv
+import json
+import logging
+import os
+import tempfile
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+def state_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'state')
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    # 先写同目录下的临时文件再原子替换，进程中途被杀也不会留下写了一半的文件
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def write_json_atomic(path, data):
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def copy_file_atomic(src, dst):
+    with open(src, 'rb') as source, atomic_write(dst, 'wb') as target:
+        shutil.copyfileobj(source, target)
+
+class CrawlState:
+    # 每个补剂的水位线：上次成功爬取日期 + 已见过的记录ID；每个数据源一个文件，避免互相覆盖
+    # save_path 用于分片爬取：从正式水位线读取，写入分片目录，合并时再汇总
+    # record() 立即落盘（与断点日志一致），进程超时被杀时已完成补剂的水位线不会丢失
+    def __init__(self, path, save_path=None):
+        self.path = save_path or path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+
+    def _entry(self, supplement):
+        return self._data.get(supplement, {})
+
+    def last_success(self, supplement):
+        value = self._entry(supplement).get("last_success")
+        return date.fromisoformat(value) if value else None
+
+    def seen_ids(self, supplement):
+        return set(self._entry(supplement).get("seen_ids", []))
+
+    def record(self, supplement, ids, crawl_date=None):
+        crawl_date = crawl_date or date.today()
+        with self._lock:
+            entry = self._data.setdefault(supplement, {})
+            entry["seen_ids"] = sorted(set(entry.get("seen_ids", [])) | set(ids))
+            entry["last_success"] = crawl_date.isoformat()
+            write_json_atomic(self.path, self._data)
+
+    def merge_from(self, path):
+        # 合并另一份水位线：ID取并集，日期取较晚者
+        with open(path, 'r', encoding='utf-8') as f:
+            other = json.load(f)
+        with self._lock:
+            for supplement, theirs in other.items():
+                entry = self._data.setdefault(supplement, {})
+                entry["seen_ids"] = sorted(set(entry.get("seen_ids", [])) | set(theirs.get("seen_ids", [])))
+                dates = [d for d in (entry.get("last_success"), theirs.get("last_success")) if d]
+                if dates:
+                    entry["last_success"] = max(dates)
+
+    def save(self):
+        with self._lock:
+            write_json_atomic(self.path, self._data)
+        logger.info(f"已保存爬取水位线: {self.path}")
+
+def load_state(root, source, save_path=None):
+    return CrawlState(os.path.join(state_dir(root), f'{source}_state.json'), save_path)
+
+def merge_rows_into_csv(path, rows, key):
+    # 新增/更新的记录放在前面，其余旧记录保持原顺序；返回(新增数, 更新数)
+    existing = []
+    fieldnames = list(rows[0].keys()) if rows else []
+    if os.path.exists(path):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            fieldnames += [name for name in (reader.fieldnames or []) if name not in fieldnames]
+            existing = list(reader)
+    incoming = {row[key] for row in rows}
+    kept = [row for row in existing if row.get(key) not in incoming]
+    updated = len(existing) - len(kept)
+    with atomic_write(path, "w", newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+        writer.writerows(kept)
+    return len(rows) - updated, updated
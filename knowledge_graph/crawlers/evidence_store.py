@@ -0,0 +1,328 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from metrics import inc, span
+
+logger = logging.getLogger(__name__)
+
+YEAR_PATTERN = re.compile(r"\d{4}")
+
+# 记录表按各自主键upsert，补剂与记录之间是多对多（同一篇文献可能被多个补剂检索到），用关联表保存
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    nct_id TEXT PRIMARY KEY,
+    title TEXT,
+    status TEXT,
+    conditions TEXT,
+    interventions TEXT,
+    primary_outcomes TEXT,
+    completion_date TEXT,
+    year INTEGER,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS articles (
+    pmid TEXT PRIMARY KEY,
+    title TEXT,
+    abstract TEXT,
+    journal TEXT,
+    pub_date TEXT,
+    mesh_terms TEXT,
+    year INTEGER,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY,
+    product_name TEXT NOT NULL,
+    manufacturer TEXT NOT NULL,
+    ingredients TEXT,
+    health_claims TEXT,
+    updated_at TEXT,
+    UNIQUE (product_name, manufacturer)
+);
+CREATE TABLE IF NOT EXISTS supplement_trials (
+    supplement TEXT NOT NULL,
+    nct_id TEXT NOT NULL,
+    PRIMARY KEY (supplement, nct_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS supplement_articles (
+    supplement TEXT NOT NULL,
+    pmid TEXT NOT NULL,
+    PRIMARY KEY (supplement, pmid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS supplement_products (
+    supplement TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    amount_value REAL,
+    amount_unit TEXT,
+    PRIMARY KEY (supplement, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_trials_status_year ON trials (status, year);
+CREATE INDEX IF NOT EXISTS idx_trials_year ON trials (year);
+CREATE INDEX IF NOT EXISTS idx_articles_year ON articles (year);
+CREATE INDEX IF NOT EXISTS idx_articles_journal ON articles (journal);
+CREATE INDEX IF NOT EXISTS idx_supplement_trials_nct ON supplement_trials (nct_id);
+CREATE INDEX IF NOT EXISTS idx_supplement_articles_pmid ON supplement_articles (pmid);
+CREATE INDEX IF NOT EXISTS idx_supplement_products_product ON supplement_products (product_id);
+"""
+
+TRIAL_COLUMNS = ["nct_id", "title", "status", "conditions", "interventions", "primary_outcomes", "completion_date"]
+ARTICLE_COLUMNS = ["pmid", "title", "abstract", "journal", "pub_date", "mesh_terms"]
+PRODUCT_COLUMNS = ["product_name", "manufacturer", "ingredients", "health_claims"]
+# 旧版数据库缺少的列，打开时补上
+MIGRATIONS = {"supplement_products": [("amount_value", "REAL"), ("amount_unit", "TEXT")]}
+
+def default_store_path(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'evidence.db')
+
+def extract_year(text):
+    match = YEAR_PATTERN.search(text or "")
+    return int(match.group()) if match else None
+
+def to_float(value):
+    # CSV导入时数值列为字符串，空串视为缺失
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _upsert_sql(table, columns, key):
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in key)
+    placeholders = ", ".join("?" for _ in columns)
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}")
+
+class EvidenceStore:
+    # 本地SQLite证据库：WAL模式允许多个线程/进程同时写入，读取不被写入阻塞；每个线程一个连接
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+
+    def _migrate(self, conn):
+        for table, columns in MIGRATIONS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, type_name in columns:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {type_name}")
+                    logger.info(f"证据库迁移: {table} 新增列 {name}")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def upsert_trials(self, supplement, rows):
+        now = _now()
+        values = [[row.get(c) for c in TRIAL_COLUMNS] + [extract_year(row.get("completion_date")), now]
+                  for row in rows]
+        with self._connection() as conn:
+            conn.executemany(_upsert_sql("trials", TRIAL_COLUMNS + ["year", "updated_at"], ["nct_id"]), values)
+            conn.executemany("INSERT OR IGNORE INTO supplement_trials (supplement, nct_id) VALUES (?, ?)",
+                             [(supplement, row["nct_id"]) for row in rows])
+        return len(rows)
+
+    def upsert_articles(self, supplement, rows):
+        now = _now()
+        values = [[row.get(c) for c in ARTICLE_COLUMNS] + [extract_year(row.get("pub_date")), now]
+                  for row in rows]
+        with self._connection() as conn:
+            conn.executemany(_upsert_sql("articles", ARTICLE_COLUMNS + ["year", "updated_at"], ["pmid"]), values)
+            conn.executemany("INSERT OR IGNORE INTO supplement_articles (supplement, pmid) VALUES (?, ?)",
+                             [(supplement, row["pmid"]) for row in rows])
+        return len(rows)
+
+    def upsert_products(self, supplement, rows):
+        # DSLD没有稳定的产品ID，以 (产品名, 制造商) 作为自然键；该补剂对应成分的含量记在关联表上
+        now = _now()
+        sql = _upsert_sql("products", PRODUCT_COLUMNS + ["updated_at"], ["product_name", "manufacturer"])
+        with self._connection() as conn:
+            for row in rows:
+                conn.execute(sql, [row.get(c) for c in PRODUCT_COLUMNS] + [now])
+                conn.execute(
+                    "INSERT INTO supplement_products (supplement, product_id, amount_value, amount_unit) "
+                    "SELECT ?, product_id, ?, ? FROM products WHERE product_name = ? AND manufacturer = ? "
+                    "ON CONFLICT (supplement, product_id) DO UPDATE SET "
+                    "amount_value = excluded.amount_value, amount_unit = excluded.amount_unit",
+                    (supplement, to_float(row.get("amount_value")), row.get("amount_unit") or None,
+                     row.get("product_name"), row.get("manufacturer")))
+        return len(rows)
+
+    def analyze(self):
+        # 批量导入后更新统计信息，让查询规划器在补剂/状态/年份索引之间选对
+        with self._connection() as conn:
+            conn.execute("ANALYZE")
+
+    def upsert(self, source, supplement, rows):
+        return UPSERTS[source](self, supplement, rows)
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._connection().execute(sql, params)]
+
+    def trials(self, supplement=None, status=None, since_year=None, limit=None):
+        # 例：trials("姜黄素", status="Completed", since_year=2020)
+        sql = "SELECT t.* FROM trials t"
+        clauses, params = [], []
+        if supplement:
+            sql += " JOIN supplement_trials st ON st.nct_id = t.nct_id"
+            clauses.append("st.supplement = ?")
+            params.append(supplement)
+        if status:
+            clauses.append("t.status = ?")
+            params.append(status)
+        if since_year:
+            clauses.append("t.year >= ?")
+            params.append(since_year)
+        return self._query(_finish(sql, clauses, "t.year DESC, t.nct_id", limit), params)
+
+    def articles(self, supplement=None, since_year=None, journal=None, limit=None):
+        sql = "SELECT a.* FROM articles a"
+        clauses, params = [], []
+        if supplement:
+            sql += " JOIN supplement_articles sa ON sa.pmid = a.pmid"
+            clauses.append("sa.supplement = ?")
+            params.append(supplement)
+        if since_year:
+            clauses.append("a.year >= ?")
+            params.append(since_year)
+        if journal:
+            clauses.append("a.journal = ?")
+            params.append(journal)
+        return self._query(_finish(sql, clauses, "a.year DESC, a.pmid", limit), params)
+
+    def products(self, supplement=None, limit=None):
+        sql = "SELECT p.* FROM products p"
+        clauses, params = [], []
+        if supplement:
+            sql = ("SELECT p.*, sp.amount_value, sp.amount_unit FROM products p"
+                   " JOIN supplement_products sp ON sp.product_id = p.product_id")
+            clauses.append("sp.supplement = ?")
+            params.append(supplement)
+        return self._query(_finish(sql, clauses, "p.product_name", limit), params)
+
+    def trial(self, nct_id):
+        rows = self._query("SELECT * FROM trials WHERE nct_id = ?", (nct_id,))
+        return rows[0] if rows else None
+
+    def article(self, pmid):
+        rows = self._query("SELECT * FROM articles WHERE pmid = ?", (pmid,))
+        return rows[0] if rows else None
+
+    def supplements_for(self, nct_id=None, pmid=None):
+        if nct_id:
+            rows = self._query("SELECT supplement FROM supplement_trials WHERE nct_id = ?", (nct_id,))
+        else:
+            rows = self._query("SELECT supplement FROM supplement_articles WHERE pmid = ?", (pmid,))
+        return sorted(row["supplement"] for row in rows)
+
+    def evidence_counts(self, supplement):
+        conn = self._connection()
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM supplement_{table} WHERE supplement = ?",
+                                (supplement,)).fetchone()[0]
+            for table in ("trials", "articles", "products")
+        }
+
+def _finish(sql, clauses, order_by, limit):
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order_by}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return sql
+
+UPSERTS = {
+    "clinical_trials": EvidenceStore.upsert_trials,
+    "pubmed": EvidenceStore.upsert_articles,
+    "nih_dsld": EvidenceStore.upsert_products,
+}
+
+_store = None
+
+def configure_evidence_store(store):
+    global _store
+    _store = store
+
+def get_evidence_store():
+    return _store
+
+def upsert_records(source, supplement, rows):
+    # 未启用证据库时不做任何事，爬虫可以无条件调用
+    if _store is not None and rows:
+        with span("write", source=source, sink="sqlite"):
+            _store.upsert(source, supplement, rows)
+        inc("rows_written", len(rows), source=source, sink="sqlite")
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def import_raw(root, store):
+    # 把已有的 data/raw/<数据源>/*.csv 全部upsert进证据库
+    for source in UPSERTS:
+        raw_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', source)
+        if not os.path.isdir(raw_dir):
+            continue
+        total = 0
+        for name in sorted(f for f in os.listdir(raw_dir) if f.endswith(".csv")):
+            with open(os.path.join(raw_dir, name), 'r', newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            total += store.upsert(source, name[:-len(".csv")], rows) if rows else 0
+        logger.info(f"{source}: 导入 {total} 条记录")
+    store.analyze()
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="本地SQLite证据库：导入与查询")
+    parser.add_argument("--db", default=default_store_path(root), help="数据库文件路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("import", help="从 data/raw 下的CSV导入")
+    for name in ("trials", "articles", "products"):
+        query = commands.add_parser(name, help=f"查询{name}")
+        query.add_argument("--supplement", default=None)
+        query.add_argument("--limit", type=int, default=20)
+        if name == "trials":
+            query.add_argument("--status", default=None, help="如 Completed")
+        if name in ("trials", "articles"):
+            query.add_argument("--since-year", type=int, default=None)
+        if name == "articles":
+            query.add_argument("--journal", default=None)
+    args = parser.parse_args(argv)
+    store = EvidenceStore(args.db)
+    if args.command == "import":
+        import_raw(root, store)
+        return
+    filters = {k: v for k, v in vars(args).items() if k not in ("db", "command")}
+    for row in getattr(store, args.command)(**filters):
+        print(json.dumps(row, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
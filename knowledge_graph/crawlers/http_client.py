@@ -0,0 +1,142 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import inc, span
+from rate_limiter import DEFAULT_CONCURRENCY, HOST_CONCURRENCY, get_limiter
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+# 值得重试的状态码：限流、超时与服务端错误
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+MAX_BACKOFF = 60
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_cache = None
+
+def configure_cache(cache):
+    global _cache
+    _cache = cache
+
+def get_cache():
+    return _cache
+
+def get_session(host):
+    # 每个主机一个长连接Session，连接池大小与该主机的并发上限一致
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            pool_size = HOST_CONCURRENCY.get(host, DEFAULT_CONCURRENCY)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                'User-Agent': USER_AGENT,
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive'
+            })
+            _sessions[host] = session
+        return session
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def retry_after_seconds(response):
+    # Retry-After 可以是秒数，也可以是HTTP日期
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt, response=None):
+    # 优先遵循服务端的Retry-After，否则使用带抖动的指数退避
+    retry_after = retry_after_seconds(response)
+    if retry_after is not None:
+        return min(retry_after, MAX_BACKOFF)
+    return random.uniform(0, min(2 ** attempt, MAX_BACKOFF))
+
+def safe_api_request(url, params, accept='application/json', retries=3, timeout=30, data=None):
+    # 传入data时发送POST（如E-utilities的epost），否则为GET
+    method = 'POST' if data is not None else 'GET'
+    host = urlparse(url).hostname
+    if _cache is not None:
+        cached = _cache.get(method, url, params, data)
+        if cached is not None:
+            inc("cache_hits", host=host)
+            return cached
+        inc("cache_misses", host=host)
+        if _cache.offline:
+            logger.warning(f"缓存未命中（离线模式，不访问网络）: {url}")
+            return None
+    session = get_session(host)
+    limiter = get_limiter(host)
+    headers = {'Accept': accept}
+    for attempt in range(retries):
+        response = None
+        if attempt:
+            inc("http_retries", host=host)
+        if limiter is not None:
+            with span("rate_limit_wait", host=host):
+                limiter.acquire()
+        try:
+            with span("http_request", host=host):
+                response = session.request(method, url, params=params, data=data, headers=headers, timeout=timeout)
+            inc("http_requests", host=host, status=response.status_code)
+            inc("http_bytes", len(response.content), host=host)
+            response.raise_for_status()
+            if _cache is not None:
+                _cache.put(method, url, params, data, response)
+            return response
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code
+            if status == 404:
+                logger.error(f"404 未找到: {url}")
+                return None
+            if status not in RETRY_STATUS:
+                logger.error(f"HTTP错误 {status}，不再重试: {str(e)}")
+                return None
+            if status == 429:
+                logger.warning("请求过多，服务端要求限流")
+            else:
+                logger.error(f"HTTP错误 {status}: {str(e)}")
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            inc("http_errors", host=host, kind=type(e).__name__)
+            logger.error(f"网络错误: {str(e)}")
+        except Exception as e:
+            inc("http_errors", host=host, kind=type(e).__name__)
+            logger.error(f"未知错误: {str(e)}")
+        if attempt < retries - 1:
+            wait = backoff_delay(attempt, response)
+            logger.warning(f"等待 {wait:.1f} 秒后重试...")
+            if limiter is not None and response is not None and response.status_code == 429:
+                # 限流时暂停整个主机的令牌桶，而不仅是当前线程
+                limiter.defer(wait)
+            else:
+                with span("backoff_sleep", host=host):
+                    time.sleep(wait)
+    inc("http_failures", host=host)
+    logger.error(f"请求失败，重试 {retries} 次后放弃")
+    return None
@@ -0,0 +1,92 @@
+import argparse
+import csv
+import logging
+import os
+import shutil
+
+from crawl_state import copy_file_atomic, load_state, merge_rows_into_csv
+from sharding import SHARD_STATE_FILE, partial_dir, read_manifest, shard_name
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+SOURCES = ["clinical_trials", "pubmed", "nih_dsld"]
+# 增量分片只含变更的记录，按主键合并进正式CSV；全量分片直接替换整个文件
+MERGE_KEYS = {"clinical_trials": "nct_id", "pubmed": "pmid"}
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def merge_shard(shard_dir, raw_dir, source, manifest):
+    key = MERGE_KEYS.get(source)
+    merged = 0
+    for name in sorted(os.listdir(shard_dir)):
+        # 跳过元数据和未完成的 .part 文件
+        if not name.endswith(".csv"):
+            continue
+        path = os.path.join(shard_dir, name)
+        target = os.path.join(raw_dir, name)
+        if manifest.get("incremental") and key:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            if rows:
+                merge_rows_into_csv(target, rows, key)
+        else:
+            copy_file_atomic(path, target)
+        merged += 1
+    return merged
+
+def merge_source(root, source, keep=False):
+    source_dir = partial_dir(root, source)
+    if not os.path.isdir(source_dir):
+        return
+    shard_dirs = sorted(d for d in os.listdir(source_dir) if os.path.isdir(os.path.join(source_dir, d)))
+    if not shard_dirs:
+        return
+    raw_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', source)
+    os.makedirs(raw_dir, exist_ok=True)
+    state = load_state(root, source)
+    seen_shards = set()
+    for shard_dir_name in shard_dirs:
+        shard_dir = os.path.join(source_dir, shard_dir_name)
+        try:
+            manifest = read_manifest(shard_dir)
+        except (OSError, ValueError) as e:
+            logger.warning(f"跳过无效分片目录 {shard_dir}: {str(e)}")
+            continue
+        shard = tuple(manifest["shard"])
+        seen_shards.add(shard)
+        merged = merge_shard(shard_dir, raw_dir, source, manifest)
+        state_path = os.path.join(shard_dir, SHARD_STATE_FILE)
+        if os.path.exists(state_path):
+            state.merge_from(state_path)
+        logger.info(f"{source} {shard_name(shard)}: 合并 {merged} 个文件")
+    counts = {count for _, count in seen_shards}
+    for count in counts:
+        missing = [i for i in range(1, count + 1) if (i, count) not in seen_shards]
+        if missing:
+            logger.warning(f"{source} 缺少分片 {missing}（共 {count} 个），对应补剂本次未更新")
+    state.save()
+    if not keep:
+        shutil.rmtree(source_dir)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 --shard 分片爬取的结果合并回 data/raw/<数据源>/")
+    parser.add_argument("--source", choices=SOURCES, action="append",
+                        help="只合并指定数据源（可重复），默认全部")
+    parser.add_argument("--keep", action="store_true", help="合并后保留分片目录")
+    args = parser.parse_args(argv)
+    root = get_project_root()
+    for source in args.source or SOURCES:
+        merge_source(root, source, args.keep)
+    logger.info("分片合并完成")
+
+if __name__ == "__main__":
+    main()
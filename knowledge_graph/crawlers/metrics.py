@@ -0,0 +1,242 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from crawl_state import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# 进程内的耗时区间(span)与计数器，每次运行结束导出一份JSON摘要和一份Prometheus文本格式文件
+#   span:    http_request / backoff_sleep / rate_limit_wait / parse / write / stage，按标签（host、source）区分
+#   counter: http_requests、http_retries、http_bytes、cache_hits、records_parsed、rows_written 等
+METRIC_PREFIX = "kg_"
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005
+PROFILE_TOP = 20
+
+def default_metrics_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'metrics')
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+class SpanStats:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(SPAN_BUCKETS)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+class Metrics:
+    def __init__(self):
+        self.spans = {}
+        self.counters = Counter()
+        self.started_at = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            stats = self.spans.get(key)
+            if stats is None:
+                stats = self.spans[key] = SpanStats()
+            stats.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[_key(name, labels)] += value
+
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def time_iter(self, name, iterable, **labels):
+        # 逐项计时的迭代器（如iterparse逐篇产出），只统计产出每一项的耗时，不含调用方处理
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, time.perf_counter() - start, **labels)
+            yield item
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.started_at = datetime.now(timezone.utc)
+
+    def summary(self):
+        with self._lock:
+            spans = [{"name": name, "labels": dict(labels), "count": s.count, "total_seconds": round(s.total, 6),
+                      "mean_ms": round(s.total / s.count * 1000, 3) if s.count else 0.0,
+                      "max_ms": round(s.max * 1000, 3)}
+                     for (name, labels), s in sorted(self.spans.items())]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {"started_at": self.started_at.isoformat(timespec="seconds"),
+                "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "spans": spans, "counters": counters}
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        span_metric = f"{METRIC_PREFIX}span_seconds"
+        if spans:
+            lines += [f"# HELP {span_metric} 各阶段耗时区间", f"# TYPE {span_metric} histogram"]
+        for (name, labels), s in spans:
+            base = (("span", name),) + labels
+            cumulative = 0
+            for bound, count in zip(SPAN_BUCKETS, s.buckets):
+                cumulative += count
+                lines.append(f"{span_metric}_bucket{_labels(base + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{span_metric}_bucket{_labels(base + (('le', '+Inf'),))} {s.count}")
+            lines.append(f"{span_metric}_sum{_labels(base)} {s.total:.6f}")
+            lines.append(f"{span_metric}_count{_labels(base)} {s.count}")
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, directory, run_name):
+        # <run>.json 为本次运行摘要；<run>.prom 可交给 node_exporter 的 textfile collector 采集
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, f"{run_name}.json")
+        write_json_atomic(json_path, dict(self.summary(), run=run_name))
+        prom_path = os.path.join(directory, f"{run_name}.prom")
+        with open(f"{prom_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(f"{prom_path}.tmp", prom_path)
+        logger.info(f"指标已导出: {json_path}, {prom_path}")
+        return json_path, prom_path
+
+    def log_top_spans(self, top=8):
+        for span in sorted(self.summary()["spans"], key=lambda s: -s["total_seconds"])[:top]:
+            labels = ",".join(f"{k}={v}" for k, v in span["labels"].items())
+            logger.info(f"耗时 {span['name']}[{labels}]: {span['total_seconds']:.2f} 秒 / {span['count']} 次"
+                        f"（平均 {span['mean_ms']:.2f} ms，最长 {span['max_ms']:.1f} ms）")
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+_metrics = Metrics()
+
+def get_metrics():
+    return _metrics
+
+def span(name, **labels):
+    return _metrics.span(name, **labels)
+
+def inc(name, value=1, **labels):
+    _metrics.inc(name, value, **labels)
+
+def time_iter(name, iterable, **labels):
+    return _metrics.time_iter(name, iterable, **labels)
+
+class StackSampler:
+    # 采样式剖析：后台线程定期抓取所有线程的调用栈（并发模式下工作线程也能覆盖），
+    # 输出 flamegraph.pl / speedscope 可读的折叠栈格式
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_frames(self, top=PROFILE_TOP):
+        # 按栈顶函数（自身耗时）汇总
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(top)
+
+@contextmanager
+def profile_stage(mode, directory, run_name):
+    # mode为None时不剖析；cprofile 只覆盖当前线程（串行模式），sample 覆盖所有线程
+    if not mode:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(directory, f"{run_name}.prof")
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            logger.info(f"cProfile结果: {path}\n{out.getvalue()}")
+        return
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        path = os.path.join(directory, f"{run_name}.folded")
+        sampler.write(path)
+        total = sum(sampler.stacks.values()) or 1
+        top = "\n".join(f"{count / total:7.1%}  {frame}" for frame, count in sampler.top_frames())
+        logger.info(f"采样剖析结果: {path}（{total} 个样本）\n{top}")
@@ -1,9 +1,20 @@
-import requests
 import csv
+import gzip
+import io
 import os
-import time
 import logging
+import re
+import zipfile
+from functools import partial
+from urllib.parse import urlparse
 from lxml import etree  # 替换XML解析器（提高兼容性）
+from columnar_store import record_csv
+from evidence_store import upsert_records
+from crawl_runner import build_arg_parser, configure_crawl, crawl_layout, instrumented_run, run_crawl
+from http_client import safe_api_request
+from metrics import inc, time_iter
+from parse_pool import get_writer, parse_payload, wait_writes
+from supplement_aliases import get_resolver, load_supplement_list, normalize_key
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,138 +33,304 @@ def get_project_root():
     return os.path.dirname(os.path.dirname(current_dir))
 
 def load_supplements():
-    root = get_project_root()
-    config_path = os.path.join(root, 'knowledge_graph', 'config', 'supplements.txt')
-    logger.info(f"加载补剂列表从: {config_path}")
-    if not os.path.exists(config_path):
-        logger.error(f"配置文件不存在: {config_path}")
-        return []
-    with open(config_path, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f.readlines() if line.strip()]
-
-# 复用补剂中英文映射表（核心修改）
-SUPPLEMENT_MAPPING = {
-    "复合B族": "B-complex",
-    "维生素C": "Vitamin C",
-    "锌": "Zinc",
-    # ...（同clinical_trials_gov.py中的完整映射表）
-    "水飞蓟宾": "Silybin"
-}
+    # 按别名表合并同义名称（如 铁 / 铁剂），每种补剂只检索一次
+    return load_supplement_list(get_project_root())
 
 DSLD_API = "https://dsld.nlm.nih.gov/dsld/api"
+PAGE_SIZE = 100
+# 批量导入时每个补剂累积多少行再写一次证据库
+DUMP_BATCH = 500
+PRODUCT_FIELDS = ["supplement", "product_name", "manufacturer", "ingredients", "health_claims",
+                  "amount_value", "amount_unit"]
+
+# 成分含量归一化为 数值 + 单位：质量统一换算为mg，IU、CFU、kcal、mL、% 原样保留，
+# DFE/RAE 等折算说明丢弃，无法识别的单位保留原文
+MASS_TO_MG = {"g": 1000.0, "mg": 1.0, "mcg": 0.001, "µg": 0.001, "μg": 0.001, "ug": 0.001}
+UNIT_LABELS = {"iu": "IU", "cfu": "CFU", "kcal": "kcal", "calories": "kcal", "ml": "mL", "%": "%"}
+COUNT_MULTIPLIERS = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "trillion": 1e12}
+AMOUNT_PATTERN = re.compile(r"^[<>~≤≥]?\s*(\d[\d,]*(?:\.\d+)?|\.\d+)(?:\s*[-–]\s*[\d,.]+)?\s*(.*)$")
+UNIT_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|%")
+INGREDIENT_FORM_PATTERN = re.compile(r"^(.*?)\s*\((?:as\s+)?(.*)\)\s*$", re.IGNORECASE)
+
+def parse_amount(text):
+    # "1,000 mcg DFE" -> (1.0, "mg")，"10 Billion CFU" -> (1e10, "CFU")，范围取下限，无法解析返回 (None, None)
+    match = AMOUNT_PATTERN.match((text or "").strip())
+    if not match:
+        return None, None
+    value = float(match.group(1).replace(",", ""))
+    tokens = UNIT_TOKEN_PATTERN.findall(match.group(2))
+    if tokens and tokens[0].lower() in COUNT_MULTIPLIERS:
+        value *= COUNT_MULTIPLIERS[tokens.pop(0).lower()]
+    if not tokens:
+        return round(value, 6), None
+    unit = tokens[0].lower()
+    if unit in MASS_TO_MG:
+        return round(value * MASS_TO_MG[unit], 6), "mg"
+    return round(value, 6), UNIT_LABELS.get(unit, tokens[0])
 
-def safe_api_request(url, params, retries=3, timeout=30):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'application/xml'
+def ingredient_keys(name):
+    # "Vitamin C (as Ascorbic Acid)" -> 全名、括号前的名称、括号内的化合物名
+    keys = [normalize_key(name)]
+    match = INGREDIENT_FORM_PATTERN.match(name)
+    if match:
+        keys += [normalize_key(match.group(1)), normalize_key(match.group(2))]
+    return [key for key in keys if key]
+
+class IngredientMatcher:
+    # 按成分名把产品归到补剂：补剂的标准名、英文检索名和全部别名归一化后作为键
+    def __init__(self, supplements):
+        resolver = get_resolver()
+        self.keys = {}
+        for supplement in supplements:
+            for name in resolver.names(supplement) + [resolver.search_name(supplement)]:
+                self.keys.setdefault(normalize_key(name), supplement)
+
+    def match(self, product):
+        # 返回 {补剂: 含量文本}，同一补剂取第一个匹配的成分
+        matched = {}
+        for name, amount in product["ingredients"]:
+            for key in ingredient_keys(name):
+                supplement = self.keys.get(key)
+                if supplement is not None:
+                    matched.setdefault(supplement, amount)
+                    break
+        return matched
+
+def parse_product(product):
+    ingredients = [(ing.findtext("name") or "未知成分", ing.findtext("amount") or "未知含量")
+                   for ing in product.iter("ingredient")]
+    health_claims = [claim.text.strip() for claim in product.iter("health_claim")
+                     if claim.text and claim.text.strip()]
+    return {
+        "product_name": product.findtext("name") or "未命名产品",
+        "manufacturer": product.findtext("manufacturer") or "未知制造商",
+        "ingredients": ingredients,
+        "health_claims": health_claims
     }
-    for attempt in range(retries):
+
+def iter_products(source):
+    # 流式解析产品XML：逐个产出产品并释放已处理的元素，内存不随页大小或批量文件大小增长
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    context = etree.iterparse(source, events=("end",), tag="product",
+                              resolve_entities=False, huge_tree=True)
+    for _, product in context:
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=timeout)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.HTTPError as e:
-            status = e.response.status_code
-            if status == 404:
-                logger.error(f"404 未找到: {url}")
-                return None
-            elif status == 429:
-                wait = min(2 **attempt, 60)
-                logger.warning(f"请求过多，等待 {wait} 秒后重试...")
-                time.sleep(wait)
-            else:
-                logger.error(f"HTTP错误 {status}: {str(e)}")
-                wait = min(2** attempt, 30)
-                time.sleep(wait)
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
-            logger.error(f"网络错误: {str(e)}")
-            wait = min(2 **attempt, 30)
-            time.sleep(wait)
+            yield parse_product(product)
         except Exception as e:
-            logger.error(f"未知错误: {str(e)}")
-            wait = min(2** attempt, 30)
-            time.sleep(wait)
-    logger.error(f"请求失败，重试 {retries} 次后放弃")
-    return None
-
-def get_supplement_details(supplement_name):
-    # 使用英文名称查询（核心修改）
-    supplement_en = SUPPLEMENT_MAPPING.get(supplement_name, supplement_name)
-    params = {"name": supplement_en, "format": "xml"}
-    logger.info(f"查询NIH DSLD: {DSLD_API}?name={supplement_en}")  # 新增日志：输出查询URL
-    response = safe_api_request(DSLD_API, params, timeout=45)
-    if not response:
-        logger.warning(f"无法获取 {supplement_name} 的数据")
-        return []
-    if not response.content:
-        logger.warning(f"空响应: {supplement_name}")
-        return []
-    try:
-        # 使用lxml解析XML（提高兼容性，核心修改）
-        root = etree.fromstring(response.content)
-    except etree.XMLSyntaxError as e:
-        logger.error(f"XML解析失败: {str(e)}")
-        return []
-    details = []
-    products = root.findall(".//product")
-    if not products:
-        logger.info(f"{supplement_name}（{supplement_en}）无相关产品")
+            logger.error(f"解析产品失败: {str(e)}")
+        product.clear()
+        while product.getprevious() is not None:
+            del product.getparent()[0]
+    del context
+
+def product_row(product, supplement, amount=None):
+    amount_value, amount_unit = parse_amount(amount)
+    return {
+        "supplement": supplement,
+        "product_name": product["product_name"],
+        "manufacturer": product["manufacturer"],
+        "ingredients": "; ".join(f"{name} ({value})" for name, value in product["ingredients"]),
+        "health_claims": "; ".join(product["health_claims"]),
+        "amount_value": amount_value,
+        "amount_unit": amount_unit
+    }
+
+def parse_product_page(content, supplement):
+    # 可在解析进程中执行：一页产品XML -> CSV行；检索命中但成分名不在别名表中的产品也保留，含量列为空
+    if not content:
         return []
-    for product in products:
+    matcher = IngredientMatcher([supplement])
+    return [product_row(p, supplement, matcher.match(p).get(supplement)) for p in iter_products(content)]
+
+def iter_product_pages(supplement, offset=0, max_products=None):
+    # 按 from/size 逐页拉取，每页解析后立即产出 (产品行, 下一页偏移)，最后一页偏移为None；
+    # 请求或解析失败时产出None并结束
+    supplement_en = get_resolver().search_name(supplement)
+    logger.info(f"查询NIH DSLD: {DSLD_API}?name={supplement_en}")
+    first_row = None
+    while True:
+        size = PAGE_SIZE if max_products is None else min(PAGE_SIZE, max_products - offset)
+        params = {"name": supplement_en, "format": "xml", "from": offset, "size": size}
+        response = safe_api_request(DSLD_API, params, accept='application/xml', timeout=45)
+        if not response:
+            logger.warning(f"无法获取 {supplement} 的数据")
+            yield None
+            return
         try:
-            name_elem = product.find("name")
-            product_name = name_elem.text if name_elem is not None and name_elem.text else "未命名产品"
-            manufacturer_elem = product.find("manufacturer")
-            manufacturer = manufacturer_elem.text if manufacturer_elem is not None and manufacturer_elem.text else "未知制造商"
-            ingredients = []
-            for ing in product.findall(".//ingredient"):
-                name_elem = ing.find("name")
-                name = name_elem.text if name_elem is not None else "未知成分"
-                amount_elem = ing.find("amount")
-                amount = amount_elem.text if amount_elem is not None else "未知含量"
-                ingredients.append(f"{name} ({amount})")
-            health_claims = []
-            for claim in product.findall(".//health_claim"):
-                if claim.text and claim.text.strip():
-                    health_claims.append(claim.text.strip())
-            details.append({
-                "supplement": supplement_name,
-                "product_name": product_name,
-                "manufacturer": manufacturer,
-                "ingredients": "; ".join(ingredients),
-                "health_claims": "; ".join(health_claims)
-            })
-        except Exception as e:
-            logger.error(f"解析产品失败: {str(e)}")
-            continue
-    return details
+            rows = parse_payload(parse_product_page, response.content, supplement, source="nih_dsld")
+        except etree.XMLSyntaxError as e:
+            logger.error(f"XML解析失败: {str(e)}")
+            yield None
+            return
+        inc("records_parsed", len(rows), source="nih_dsld")
+        if rows and offset and rows[0] == first_row:
+            # 接口忽略了分页参数，每页都返回同一批产品
+            logger.warning(f"{supplement} 的DSLD响应不支持分页，只保留第一页")
+            yield [], None
+            return
+        if rows and not offset:
+            first_row = rows[0]
+        offset += len(rows)
+        done = len(rows) < size or (max_products is not None and offset >= max_products)
+        yield rows, None if done else offset
+        if done:
+            return
+
+def page_written(supplement, journal, rows, next_offset, written):
+    upsert_records('nih_dsld', supplement, rows)
+    if next_offset:
+        journal.set_cursor(supplement, offset=next_offset, rows=written)
+
+def crawl_supplement(supplement, output_dir, journal, max_products=None):
+    # 每页写入 .part 文件，完成后再替换正式CSV；每页的偏移记入断点日志，--resume 时从中断的页继续
+    logger.info(f"处理: {supplement}")
+    output_path = os.path.join(output_dir, f"{supplement}.csv")
+    part_path = f"{output_path}.part"
+    cursor = journal.cursor(supplement)
+    offset = cursor.get("offset", 0) if os.path.exists(part_path) else 0
+    written = cursor.get("rows", 0) if offset else 0
+    if offset:
+        logger.info(f"{supplement} 从断点继续（已写入 {written} 个产品）")
+    fetched_pages = 0
+    # 行由写入阶段追加到 .part 文件，flush之后才upsert并记录断点
+    writer = get_writer()
+    writes = [writer.append(part_path, PRODUCT_FIELDS, [], truncate=not offset, source="nih_dsld")]
+    for page in iter_product_pages(supplement, offset, max_products):
+        if page is None:
+            writes.append(writer.close(part_path))
+            wait_writes(writes)
+            return None
+        rows, next_offset = page
+        fetched_pages += 1
+        written += len(rows)
+        writes.append(writer.append(part_path, PRODUCT_FIELDS, rows, source="nih_dsld",
+                                    callback=partial(page_written, supplement, journal, rows, next_offset, written)))
+    writes.append(writer.close(part_path))
+    error = wait_writes(writes)
+    if error is not None:
+        # 有一页没有写入 .part 文件，断点不再可信，下次从头开始
+        journal.set_cursor(supplement)
+        logger.error(f"写入 {supplement} 失败: {str(error)}")
+        return None
+    if not written:
+        os.remove(part_path)
+        logger.info(f"{supplement}（{get_resolver().search_name(supplement)}）无相关产品")
+        return 0
+    os.replace(part_path, output_path)
+    record_csv('nih_dsld', supplement, output_path)
+    logger.info(f"保存 {written} 个产品: {supplement}（{fetched_pages} 页）")
+    return written
+
+def open_dump(path):
+    # 依次产出批量标签文件中的XML流：.xml / .xml.gz，或 .zip 包内的全部 .xml
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(n for n in archive.namelist() if n.lower().endswith(".xml")):
+                with archive.open(name) as f:
+                    yield name, f
+    elif path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            yield path, f
+    else:
+        with open(path, "rb") as f:
+            yield path, f
+
+class DumpWriter:
+    # 单个补剂的批量导入输出：行写入 .part 文件，证据库按批upsert
+    def __init__(self, supplement, output_dir):
+        self.supplement = supplement
+        self.output_path = os.path.join(output_dir, f"{supplement}.csv")
+        self.part_path = f"{self.output_path}.part"
+        self.file = open(self.part_path, "w", newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=PRODUCT_FIELDS)
+        self.writer.writeheader()
+        self.pending = []
+        self.written = 0
+
+    def add(self, row):
+        self.writer.writerow(row)
+        self.pending.append(row)
+        self.written += 1
+        if len(self.pending) >= DUMP_BATCH:
+            self.flush()
 
-def main():
+    def flush(self):
+        upsert_records('nih_dsld', self.supplement, self.pending)
+        self.pending = []
+
+    def finish(self):
+        self.flush()
+        self.file.close()
+        if not self.written:
+            os.remove(self.part_path)
+            return 0
+        os.replace(self.part_path, self.output_path)
+        record_csv('nih_dsld', self.supplement, self.output_path)
+        return self.written
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.part_path)
+
+def ingest_dump(path, supplements, output_dir, journal, resume=False):
+    # 离线批量导入：单遍流式读取下载的DSLD标签文件，按成分名把产品分发到各补剂，不访问网络
+    supplements = journal.begin(supplements, resume=resume)
+    matcher = IngredientMatcher(supplements)
+    writers = {s: DumpWriter(s, output_dir) for s in supplements}
+    scanned = 0
+    try:
+        for name, stream in open_dump(path):
+            logger.info(f"读取批量标签文件: {name}")
+            for product in time_iter("parse", iter_products(stream), source="nih_dsld"):
+                scanned += 1
+                for supplement, amount in matcher.match(product).items():
+                    writers[supplement].add(product_row(product, supplement, amount))
+    except (OSError, zipfile.BadZipFile, etree.XMLSyntaxError) as e:
+        logger.error(f"批量标签文件读取失败: {str(e)}")
+        for supplement, writer in writers.items():
+            writer.discard()
+            journal.mark_failed(supplement, str(e))
+        return None
+    inc("records_parsed", scanned, source="nih_dsld")
+    total = 0
+    for supplement, writer in writers.items():
+        count = writer.finish()
+        inc("rows_written", count, source="nih_dsld", sink="csv")
+        journal.mark_completed(supplement, count)
+        total += count
+        if count:
+            logger.info(f"保存 {count} 个产品: {supplement}")
+    logger.info(f"扫描 {scanned} 个产品标签，{len(supplements)} 种补剂共匹配 {total} 条")
+    return total
+
+def main(argv=None):
+    parser = build_arg_parser("NIH DSLD 补剂标签数据爬虫")
+    parser.add_argument("--max-products", type=int, default=None,
+                        help="每种补剂最多拉取的产品数（默认翻页拉取全部匹配的标签）")
+    parser.add_argument("--dump", default=None, metavar="PATH",
+                        help="从本地下载的DSLD批量标签文件（.xml / .xml.gz / .zip）导入，不访问网络")
+    args = parser.parse_args(argv)
     supplements = load_supplements()
     if not supplements:
         logger.error("未加载任何补剂，程序终止")
         return
     root = get_project_root()
-    output_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', 'nih_dsld')
-    os.makedirs(output_dir, exist_ok=True)
+    # DSLD每次全量抓取，不使用水位线
+    supplements, output_dir, _, journal = crawl_layout(args, root, 'nih_dsld', supplements)
     logger.info(f"输出目录: {output_dir}")
-    logger.info(f"开始爬取 {len(supplements)} 种补剂的NIH DSLD数据")
-    for supplement in supplements:
-        try:
-            logger.info(f"处理: {supplement}")
-            data = get_supplement_details(supplement)
-            if not data:
-                logger.warning(f"{supplement} 无有效数据")
-                continue
-            output_path = os.path.join(output_dir, f"{supplement}.csv")
-            with open(output_path, "w", newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=data[0].keys())
-                writer.writeheader()
-                writer.writerows(data)
-            logger.info(f"保存 {len(data)} 个产品: {supplement}")
-            time.sleep(5)
-        except Exception as e:
-            logger.error(f"处理 {supplement} 时出错: {str(e)}")
+    host = urlparse(DSLD_API).hostname
+    configure_crawl(args, host, root)
+    if args.dump:
+        logger.info(f"从批量标签文件导入 {len(supplements)} 种补剂: {args.dump}")
+        with instrumented_run(args, root, 'nih_dsld'):
+            ingest_dump(args.dump, supplements, output_dir, journal, resume=args.resume)
+        journal.log_summary()
+    else:
+        logger.info(f"开始爬取 {len(supplements)} 种补剂的NIH DSLD数据")
+        crawl_one = partial(crawl_supplement, output_dir=output_dir, journal=journal, max_products=args.max_products)
+        with instrumented_run(args, root, 'nih_dsld'):
+            run_crawl(supplements, crawl_one, host, args, journal)
     logger.info("NIH DSLD数据爬取完成")
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+import csv
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from metrics import inc, span, get_metrics
+
+logger = logging.getLogger(__name__)
+
+# 抓取 -> 解析 -> 写入 三段流水线（--parse-workers N 时启用）：
+#   抓取线程只做网络I/O，把原始响应体交给进程池解析/规范化，在途的响应体数受信号量限制（背压），
+#   解析结果交给单独的写入线程，写入线程把同一文件的多批行合并后一次写入并flush，再执行回调（如更新断点日志）
+# 未启用时解析与写入都在调用线程内直接执行，爬虫代码无需区分两种模式
+DEFAULT_PENDING_PER_WORKER = 2
+WRITER_QUEUE_SIZE = 64
+# 写入线程每轮最多合并的任务数
+WRITER_BATCH_TASKS = 32
+
+def _start_method():
+    # 抓取线程已在运行时fork子进程不安全，优先使用forkserver（Windows/macOS退回spawn）
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+def _timed_call(func, payload, args):
+    # 在解析进程内执行，返回 (结果, 解析耗时)，耗时由主进程记入指标
+    start = time.perf_counter()
+    result = func(payload, *args)
+    return result, time.perf_counter() - start
+
+class ParsePool:
+    def __init__(self, workers, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending or workers * DEFAULT_PENDING_PER_WORKER
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(_start_method()))
+
+    def submit(self, func, payload, *args, source):
+        # 在途任务已满时阻塞调用方（抓取线程），直到有解析任务完成
+        waited = time.perf_counter()
+        self._slots.acquire()
+        get_metrics().observe("parse_backpressure", time.perf_counter() - waited, source=source)
+        submitted = time.perf_counter()
+        try:
+            inner = self._executor.submit(_timed_call, func, payload, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        outer = Future()
+        def done(inner):
+            self._slots.release()
+            try:
+                result, seconds = inner.result()
+            except BaseException as e:
+                outer.set_exception(e)
+                return
+            get_metrics().observe("parse", seconds, source=source)
+            # 排队 + 进程间传输的耗时
+            get_metrics().observe("parse_overhead", max(0.0, time.perf_counter() - submitted - seconds), source=source)
+            outer.set_result(result)
+        inner.add_done_callback(done)
+        return outer
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class RowWriter:
+    # 按文件追加CSV行；threaded=True 时由单独的写入线程从有界队列取任务执行，否则在调用线程内加锁直接写
+    def __init__(self, threaded=False, queue_size=WRITER_QUEUE_SIZE):
+        self.threaded = threaded
+        self._files = {}
+        # 写入失败的文件：之后的追加直接失败（不再以"a"模式重新打开而漏掉一批行），直到重新truncate或close
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size) if threaded else None
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, name="row-writer", daemon=True)
+            self._thread.start()
+
+    def append(self, path, fieldnames, rows, truncate=False, callback=None, source="csv"):
+        # truncate=True 时新建文件并写表头；callback 在这批行flush到磁盘之后调用
+        return self._submit(("append", path, fieldnames, rows, truncate, callback, source))
+
+    def close(self, path):
+        # 返回的Future在该文件之前的全部写入完成并关闭后结束；该文件此前有写入失败时抛出该异常
+        return self._submit(("close", path, None, None, False, None, None))
+
+    def _submit(self, task):
+        future = Future()
+        if self._queue is None:
+            with self._lock:
+                self._execute([(task, future)])
+        else:
+            waited = time.perf_counter()
+            self._queue.put((task, future))
+            get_metrics().observe("write_backpressure", time.perf_counter() - waited, sink="csv")
+        return future
+
+    def shutdown(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+        with self._lock:
+            for handle in self._files.values():
+                handle["file"].close()
+            self._files.clear()
+            self._failed.clear()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # 队列中已积压的任务一并处理，同一文件的多批行只flush一次
+            while len(batch) < WRITER_BATCH_TASKS:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._execute(batch)
+                    return
+                batch.append(item)
+            self._execute(batch)
+
+    def _execute(self, batch):
+        touched = {}
+        for task, future in batch:
+            kind, path, fieldnames, rows, truncate, callback, source = task
+            try:
+                if kind == "close":
+                    self._flush(path, touched)
+                    handle = self._files.pop(path, None)
+                    if handle is not None:
+                        handle["file"].close()
+                    error = self._failed.pop(path, None)
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(None)
+                    continue
+                if truncate:
+                    self._failed.pop(path, None)
+                elif path in self._failed:
+                    future.set_exception(self._failed[path])
+                    continue
+                handle = self._open(path, fieldnames, truncate)
+                with span("write", source=source, sink="csv"):
+                    handle["writer"].writerows(rows)
+                inc("rows_written", len(rows), source=source, sink="csv")
+                touched.setdefault(path, []).append((future, callback))
+            except Exception as e:
+                logger.error(f"写入 {path} 失败: {str(e)}")
+                self._fail(path, e, touched)
+                future.set_exception(e)
+        for path in list(touched):
+            self._flush(path, touched)
+
+    def _open(self, path, fieldnames, truncate):
+        handle = self._files.get(path)
+        if handle is not None and truncate:
+            handle["file"].close()
+            handle = None
+        if handle is None:
+            f = open(path, "w" if truncate else "a", newline='', encoding='utf-8')
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            if truncate:
+                writer.writeheader()
+            handle = self._files[path] = {"file": f, "writer": writer}
+        return handle
+
+    def _flush(self, path, touched):
+        handle = self._files.get(path)
+        if handle is not None:
+            try:
+                handle["file"].flush()
+            except OSError as e:
+                # 不能让异常结束写入线程，否则之后的close()/put()会一直阻塞
+                logger.error(f"写入 {path} 失败: {str(e)}")
+                self._fail(path, e, touched)
+                return
+        pending = touched.pop(path, [])
+        for future, callback in pending:
+            try:
+                if callback is not None:
+                    callback()
+                future.set_result(None)
+            except Exception as e:
+                logger.error(f"写入回调失败 {path}: {str(e)}")
+                future.set_exception(e)
+
+    def _fail(self, path, error, touched):
+        self._failed[path] = error
+        for future, _ in touched.pop(path, []):
+            future.set_exception(error)
+        handle = self._files.pop(path, None)
+        if handle is not None:
+            try:
+                handle["file"].close()
+            except OSError:
+                pass
+
+_pool = None
+_writer = RowWriter()
+
+def configure_pipeline(workers, max_pending=None):
+    global _pool, _writer
+    _pool = ParsePool(workers, max_pending)
+    _writer = RowWriter(threaded=True)
+    logger.info(f"解析进程池: {workers} 个进程，最多 {_pool.max_pending} 个在途响应；写入线程已启动")
+
+def close_pipeline():
+    # 等待解析与写入全部完成，之后恢复为调用线程内直接执行
+    global _pool, _writer
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    _writer.shutdown()
+    _writer = RowWriter()
+
+def get_writer():
+    return _writer
+
+def wait_writes(futures):
+    # 等待一组写入（含回调）全部结束，返回第一个异常；全部成功时返回None
+    error = None
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            error = error or e
+    return error
+
+def submit_parse(func, payload, *args, source):
+    # 返回Future；未启用进程池时在调用线程内解析，返回已完成的Future
+    if _pool is not None:
+        return _pool.submit(func, payload, *args, source=source)
+    future = Future()
+    try:
+        with span("parse", source=source):
+            future.set_result(func(payload, *args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def parse_payload(func, payload, *args, source):
+    return submit_parse(func, payload, *args, source=source).result()
+
+def default_parse_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
@@ -1,9 +1,19 @@
-import requests
-import csv
+import io
 import os
-import time
 import logging
-from bs4 import BeautifulSoup
+from collections import deque
+from datetime import date
+from functools import partial
+from urllib.parse import urlparse
+from lxml import etree
+from columnar_store import record_rows
+from evidence_store import upsert_records
+from crawl_runner import build_arg_parser, configure_crawl, crawl_layout, instrumented_run, run_crawl
+from crawl_state import merge_rows_into_csv
+from http_client import safe_api_request
+from metrics import inc, span
+from parse_pool import get_writer, parse_payload, submit_parse, wait_writes
+from supplement_aliases import get_resolver, load_supplement_list
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,76 +32,111 @@ def get_project_root():
     return os.path.dirname(os.path.dirname(current_dir))
 
 def load_supplements():
-    root = get_project_root()
-    config_path = os.path.join(root, 'knowledge_graph', 'config', 'supplements.txt')
-    logger.info(f"加载补剂列表从: {config_path}")
-    if not os.path.exists(config_path):
-        logger.error(f"配置文件不存在: {config_path}")
-        return []
-    with open(config_path, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f.readlines() if line.strip()]
-
-# 复用补剂中英文映射表（核心修改）
-SUPPLEMENT_MAPPING = {
-    "复合B族": "B-complex",
-    "维生素C": "Vitamin C",
-    "锌": "Zinc",
-    # ...（同clinical_trials_gov.py中的完整映射表）
-    "水飞蓟宾": "Silybin"
-}
-
-def safe_api_request(url, params, retries=3, timeout=30):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'application/json'
+    # 按别名表合并同义名称（如 铁 / 铁剂），每种补剂只检索一次
+    return load_supplement_list(get_project_root())
+
+EUTILS_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+def eutils_params(params):
+    # 配置了NCBI_API_KEY时附带api_key，配额从3次/秒提升到10次/秒
+    api_key = os.environ.get("NCBI_API_KEY")
+    if api_key:
+        params = dict(params, api_key=api_key)
+    return params
+
+# 批量模式：efetch每页文章数与每个补剂的检索上限（逐个补剂模式固定为50）
+BATCH_PAGE_SIZE = 500
+BATCH_MAX_ARTICLES = 500
+
+def build_search_term(supplement):
+    # 使用英文名称查询（核心修改）
+    supplement_en = get_resolver().search_name(supplement)
+    # 修正查询术语：使用正确的MeSH术语和逻辑（核心修改）
+    return f'"{supplement_en}"[Title/Abstract] AND "Dietary Supplements"[MeSH Major Topic]'
+
+def _text(elem):
+    # 标题等字段可能含<i>/<sup>等内联标签，需要拼接全部文本
+    return "".join(elem.itertext()) if elem is not None else None
+
+def parse_article(article):
+    title = _text(article.find('.//ArticleTitle'))
+    if title is None:
+        title = "无标题"
+    sections = []
+    for section in article.iterfind('.//Abstract/AbstractText'):
+        text = _text(section).strip()
+        label = section.get('Label')
+        if text:
+            sections.append(f"{label}: {text}" if label else text)
+    abstract = " ".join(sections) if sections else "无摘要"
+    if len(abstract) > 500:
+        abstract = abstract[:500] + "..."
+    journal_title = _text(article.find('.//Journal/Title'))
+    if journal_title is None:
+        journal_title = "未知期刊"
+    pub_date = "未知日期"
+    pub_date_elem = article.find('.//PubDate')
+    if pub_date_elem is not None:
+        year = pub_date_elem.findtext('Year') or "年份未知"
+        month = pub_date_elem.findtext('Month') or ""
+        pub_date = f"{year}-{month}" if month else year
+    pmid = article.findtext('.//PMID') or "无PMID"
+    mesh_terms = [_text(d) for d in article.iterfind('.//MeshHeadingList/MeshHeading/DescriptorName')]
+    return {
+        "pmid": pmid,
+        "title": title,
+        "abstract": abstract,
+        "journal": journal_title,
+        "pub_date": pub_date,
+        "mesh_terms": "; ".join(mesh_terms)
     }
-    for attempt in range(retries):
+
+def iter_pubmed_articles(source):
+    # 流式解析efetch XML：逐篇产出记录并释放已处理的元素，内存不随批次大小增长
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    context = etree.iterparse(source, events=("end",), tag="PubmedArticle",
+                              resolve_entities=False, huge_tree=True)
+    for _, article in context:
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=timeout)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.HTTPError as e:
-            status = e.response.status_code
-            if status == 404:
-                logger.error(f"404 未找到: {url}")
-                return None
-            elif status == 429:
-                wait = min(2 **attempt, 60)
-                logger.warning(f"请求过多，等待 {wait} 秒后重试...")
-                time.sleep(wait)
-            else:
-                logger.error(f"HTTP错误 {status}: {str(e)}")
-                wait = min(2** attempt, 30)
-                time.sleep(wait)
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
-            logger.error(f"网络错误: {str(e)}")
-            wait = min(2 **attempt, 30)
-            time.sleep(wait)
+            yield parse_article(article)
         except Exception as e:
-            logger.error(f"未知错误: {str(e)}")
-            wait = min(2** attempt, 30)
-            time.sleep(wait)
-    logger.error(f"请求失败，重试 {retries} 次后放弃")
-    return None
+            logger.error(f"解析文章失败: {str(e)}")
+        article.clear()
+        while article.getprevious() is not None:
+            del article.getparent()[0]
+    del context
 
-def fetch_pubmed(supplement):
-    # 使用英文名称查询（核心修改）
-    supplement_en = SUPPLEMENT_MAPPING.get(supplement, supplement)
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
-    search_url = f"{base_url}esearch.fcgi"
-    # 修正查询术语：使用正确的MeSH术语和逻辑（核心修改）
-    term = f'"{supplement_en}"[Title/Abstract] AND "Dietary Supplements"[MeSH Major Topic]'
+def parse_articles(content):
+    # 可在解析进程中执行：efetch响应体 -> 文章列表
+    return list(iter_pubmed_articles(content))
+
+def date_window(since):
+    # 按Entrez收录日期(edat)只检索水位线之后的新文章
+    return {
+        "datetype": "edat",
+        "mindate": since.strftime("%Y/%m/%d"),
+        "maxdate": date.today().strftime("%Y/%m/%d")
+    }
+
+def fetch_pubmed(supplement, since=None, skip_ids=()):
+    # 返回 (补剂, 文章列表)；请求失败时文章列表为None，以免推进水位线
+    supplement_en = get_resolver().search_name(supplement)
+    search_url = f"{EUTILS_BASE}esearch.fcgi"
+    term = build_search_term(supplement)
     search_params = {
         "db": "pubmed",
         "term": term,
         "retmax": 50,
         "retmode": "json"
     }
+    if since:
+        search_params.update(date_window(since))
     logger.info(f"查询PubMed: {search_url}?db=pubmed&term={term}")  # 新增日志：输出查询URL
-    search_res = safe_api_request(search_url, search_params, timeout=45)
+    search_res = safe_api_request(search_url, eutils_params(search_params), timeout=45)
     if not search_res:
         logger.warning(f"搜索 {supplement} 失败")
-        return supplement, []
+        return supplement, None
     try:
         search_data = search_res.json()
         id_list = search_data.get("esearchresult", {}).get("idlist", [])
@@ -100,84 +145,235 @@ def fetch_pubmed(supplement):
             return supplement, []
     except Exception as e:
         logger.error(f"解析搜索结果失败: {str(e)}")
+        return supplement, None
+    id_list = [pmid for pmid in id_list if pmid not in skip_ids]
+    if not id_list:
+        logger.info(f"{supplement} 无新文章")
         return supplement, []
-    fetch_url = f"{base_url}efetch.fcgi"
+    fetch_url = f"{EUTILS_BASE}efetch.fcgi"
     fetch_params = {
         "db": "pubmed",
         "id": ",".join(id_list),
         "retmode": "xml"
     }
-    fetch_res = safe_api_request(fetch_url, fetch_params, timeout=60)
+    fetch_res = safe_api_request(fetch_url, eutils_params(fetch_params), timeout=60)
     if not fetch_res:
         logger.warning(f"获取文章详情失败: {supplement}")
-        return supplement, []
+        return supplement, None
     try:
-        soup = BeautifulSoup(fetch_res.content, 'xml')
-        articles = []
-        for article in soup.find_all('PubmedArticle'):
-            try:
-                title_elem = article.find('ArticleTitle')
-                title = title_elem.text if title_elem else "无标题"
-                abstract_elem = article.find('AbstractText')
-                abstract = abstract_elem.text if abstract_elem else "无摘要"
-                if len(abstract) > 500:
-                    abstract = abstract[:500] + "..."
-                journal_elem = article.find('Journal')
-                journal_title = "未知期刊"
-                if journal_elem:
-                    title_elem = journal_elem.find('Title')
-                    journal_title = title_elem.text if title_elem else "未知期刊"
-                pub_date_elem = article.find('PubDate')
-                pub_date = "未知日期"
-                if pub_date_elem:
-                    year_elem = pub_date_elem.find('Year')
-                    month_elem = pub_date_elem.find('Month')
-                    year = year_elem.text if year_elem else "年份未知"
-                    month = month_elem.text if month_elem else ""
-                    pub_date = f"{year}-{month}" if month else year
-                pmid_elem = article.find('PMID')
-                pmid = pmid_elem.text if pmid_elem else "无PMID"
-                articles.append({
-                    "pmid": pmid,
-                    "title": title,
-                    "abstract": abstract,
-                    "journal": journal_title,
-                    "pub_date": pub_date
-                })
-            except Exception as e:
-                logger.error(f"解析文章失败: {str(e)}")
-                continue
+        articles = parse_payload(parse_articles, fetch_res.content, source="pubmed")
+        inc("records_parsed", len(articles), source="pubmed")
         return supplement, articles
     except Exception as e:
         logger.error(f"解析文章列表失败: {str(e)}")
-        return supplement, []
+        return supplement, None
 
-def main():
+def search_with_history(supplement, retmax, since=None):
+    search_url = f"{EUTILS_BASE}esearch.fcgi"
+    term = build_search_term(supplement)
+    search_params = {
+        "db": "pubmed",
+        "term": term,
+        "retmax": retmax,
+        "retmode": "json",
+        "usehistory": "y"
+    }
+    if since:
+        search_params.update(date_window(since))
+    logger.info(f"查询PubMed: {search_url}?db=pubmed&term={term}&usehistory=y")
+    search_res = safe_api_request(search_url, eutils_params(search_params), timeout=45)
+    if not search_res:
+        logger.warning(f"搜索 {supplement} 失败")
+        return None
+    try:
+        result = search_res.json().get("esearchresult", {})
+        return result.get("idlist", []), result.get("webenv")
+    except Exception as e:
+        logger.error(f"解析搜索结果失败: {str(e)}")
+        return None
+
+def post_to_history(pmids, webenv=None):
+    # 将去重后的PMID一次性上传到历史服务器，返回(query_key, WebEnv)
+    data = {"db": "pubmed", "id": ",".join(pmids)}
+    if webenv:
+        data["WebEnv"] = webenv
+    post_res = safe_api_request(f"{EUTILS_BASE}epost.fcgi", eutils_params({}),
+                                accept='application/xml', timeout=60, data=data)
+    if not post_res:
+        return None
+    try:
+        root = etree.fromstring(post_res.content)
+    except etree.XMLSyntaxError as e:
+        logger.error(f"epost响应解析失败: {str(e)}")
+        return None
+    query_key = root.findtext('.//QueryKey')
+    webenv_text = root.findtext('.//WebEnv')
+    if not query_key or not webenv_text:
+        logger.error("epost响应缺少QueryKey/WebEnv")
+        return None
+    return query_key, webenv_text
+
+def fetch_from_history(query_key, webenv, total, page_size=BATCH_PAGE_SIZE):
+    # 每页下载后提交解析即继续下载下一页，解析进程池启用时下载与多页解析重叠（在途页数受进程池背压限制）；
+    # 按页顺序产出文章
+    pending = deque()
+    for page in _fetch_history_pages(query_key, webenv, total, page_size):
+        pending.append(page)
+        while pending and pending[0][1].done():
+            yield from _page_articles(*pending.popleft())
+    while pending:
+        yield from _page_articles(*pending.popleft())
+
+def _page_articles(retstart, future):
+    try:
+        articles = future.result()
+    except Exception as e:
+        logger.error(f"解析文章列表失败: retstart={retstart}, {str(e)}")
+        return
+    inc("records_parsed", len(articles), source="pubmed")
+    yield from articles
+
+def _fetch_history_pages(query_key, webenv, total, page_size):
+    fetch_url = f"{EUTILS_BASE}efetch.fcgi"
+    for retstart in range(0, total, page_size):
+        fetch_params = {
+            "db": "pubmed",
+            "query_key": query_key,
+            "WebEnv": webenv,
+            "retstart": retstart,
+            "retmax": page_size,
+            "retmode": "xml"
+        }
+        logger.info(f"分页获取文章: retstart={retstart}, retmax={page_size}, 共 {total} 篇")
+        fetch_res = safe_api_request(fetch_url, eutils_params(fetch_params), timeout=120)
+        if not fetch_res:
+            logger.warning(f"获取文章详情失败: retstart={retstart}")
+            continue
+        yield retstart, submit_parse(parse_articles, fetch_res.content, source="pubmed")
+
+def save_articles(output_dir, supplement, articles, incremental=False):
+    output_path = os.path.join(output_dir, f"{supplement}.csv")
+    record_rows('pubmed', supplement, articles)
+    upsert_records('pubmed', supplement, articles)
+    if incremental:
+        with span("write", source="pubmed", sink="csv"):
+            added, updated = merge_rows_into_csv(output_path, articles, "pmid")
+        inc("rows_written", len(articles), source="pubmed", sink="csv")
+        logger.info(f"合并 {supplement}: 新增 {added} 篇，更新 {updated} 篇")
+        return
+    # 等待写入阶段落盘后才返回，断点日志不会在文件写完之前记为完成
+    writer = get_writer()
+    error = wait_writes([writer.append(output_path, list(articles[0].keys()), articles, truncate=True, source="pubmed"),
+                         writer.close(output_path)])
+    if error is not None:
+        raise error
+    logger.info(f"保存 {len(articles)} 篇文章: {supplement}")
+
+def crawl_supplement(supplement, output_dir, state, incremental=False):
+    logger.info(f"处理: {supplement}")
+    since = state.last_success(supplement) if incremental else None
+    skip_ids = state.seen_ids(supplement) if incremental else set()
+    supp, articles = fetch_pubmed(supplement, since, skip_ids)
+    if articles is None:
+        return None
+    if not articles:
+        state.record(supplement, [])
+        logger.warning(f"{supplement} 无有效文章")
+        return 0
+    save_articles(output_dir, supplement, articles, incremental)
+    # 写入成功后才推进水位线，写入失败时异常由断点日志记为失败
+    state.record(supplement, [a["pmid"] for a in articles])
+    return len(articles)
+
+def crawl_batched(supplements, output_dir, host, args, state, journal):
+    supplements = journal.begin(supplements, resume=args.resume)
+    # 1. 逐个补剂检索（usehistory=y），只取PMID列表；增量模式下剔除已见过的PMID
+    id_lists = {}
+    webenvs = {}
+    def search(supplement):
+        since = state.last_success(supplement) if args.incremental else None
+        found = search_with_history(supplement, args.max_articles, since)
+        if not found:
+            journal.mark_failed(supplement, "检索失败")
+            return None
+        ids, webenv = found
+        if args.incremental:
+            seen = state.seen_ids(supplement)
+            ids = [pmid for pmid in ids if pmid not in seen]
+        id_lists[supplement] = ids
+        if webenv:
+            webenvs[supplement] = webenv
+        return len(ids)
+    run_crawl(supplements, search, host, args)
+    # 2. 跨补剂去重，每篇文章只下载、解析一次
+    unique_pmids = list(dict.fromkeys(pmid for s in supplements for pmid in id_lists.get(s, [])))
+    total_hits = sum(len(ids) for ids in id_lists.values())
+    logger.info(f"检索命中 {total_hits} 条，去重后 {len(unique_pmids)} 篇文章")
+    articles = {}
+    if unique_pmids:
+        # 按补剂顺序而非完成顺序选取WebEnv，并发与串行运行的请求序列一致，缓存可回放
+        webenv = next((webenvs[s] for s in supplements if s in webenvs), None)
+        posted = post_to_history(unique_pmids, webenv)
+        if not posted:
+            logger.error("上传PMID到历史服务器失败，批量模式终止")
+            for supplement in id_lists:
+                journal.mark_failed(supplement, "上传PMID到历史服务器失败")
+            journal.log_summary()
+            return
+        query_key, webenv = posted
+        # 3. 按retstart/retmax大块分页获取
+        articles = {a["pmid"]: a for a in fetch_from_history(query_key, webenv, len(unique_pmids), args.page_size)}
+    for supplement in supplements:
+        if supplement not in id_lists:
+            continue
+        rows = [articles[pmid] for pmid in id_lists[supplement] if pmid in articles]
+        missing = len(id_lists[supplement]) - len(rows)
+        # 有文章未能取回时不推进水位线并记为失败，--resume 时重新检索
+        if rows:
+            try:
+                save_articles(output_dir, supplement, rows, args.incremental)
+            except Exception as e:
+                logger.error(f"保存 {supplement} 失败: {str(e)}")
+                journal.mark_failed(supplement, f"写入失败: {str(e)}")
+                continue
+        else:
+            logger.warning(f"{supplement} 无有效文章")
+        # 写入成功后才推进水位线并记为完成
+        if missing:
+            journal.mark_failed(supplement, f"{missing} 篇文章未能取回")
+        else:
+            state.record(supplement, [row["pmid"] for row in rows])
+            journal.mark_completed(supplement, len(rows))
+    journal.log_summary()
+
+def main(argv=None):
+    parser = build_arg_parser("PubMed 文献数据爬虫")
+    parser.add_argument("--batch", action="store_true",
+                        help="批量模式：历史服务器(WebEnv)+跨补剂PMID去重+分页efetch")
+    parser.add_argument("--max-articles", type=int, default=BATCH_MAX_ARTICLES,
+                        help="批量模式下每个补剂的最大文章数")
+    parser.add_argument("--page-size", type=int, default=BATCH_PAGE_SIZE,
+                        help="批量模式下每次efetch的文章数")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量模式：只检索水位线之后的新文章并合并进已有CSV")
+    args = parser.parse_args(argv)
     supplements = load_supplements()
     if not supplements:
         logger.error("未加载任何补剂，程序终止")
         return
     root = get_project_root()
-    output_dir = os.path.join(root, 'knowledge_graph', 'data', 'raw', 'pubmed')
-    os.makedirs(output_dir, exist_ok=True)
+    supplements, output_dir, state, journal = crawl_layout(args, root, 'pubmed', supplements)
     logger.info(f"输出目录: {output_dir}")
     logger.info(f"开始爬取 {len(supplements)} 种补剂的PubMed数据")
-    for supplement in supplements:
-        try:
-            logger.info(f"处理: {supplement}")
-            supp, articles = fetch_pubmed(supplement)
-            if not articles:
-                logger.warning(f"{supplement} 无有效文章")
-                continue
-            output_path = os.path.join(output_dir, f"{supplement}.csv")
-            with open(output_path, "w", newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=articles[0].keys())
-                writer.writeheader()
-                writer.writerows(articles)
-            logger.info(f"保存 {len(articles)} 篇文章: {supplement}")
-            time.sleep(5)
-        except Exception as e:
-            logger.error(f"处理 {supplement} 时出错: {str(e)}")
+    host = urlparse(EUTILS_BASE).hostname
+    configure_crawl(args, host, root)
+    with instrumented_run(args, root, 'pubmed'):
+        if args.batch:
+            crawl_batched(supplements, output_dir, host, args, state, journal)
+        else:
+            crawl_one = partial(crawl_supplement, output_dir=output_dir, state=state, incremental=args.incremental)
+            run_crawl(supplements, crawl_one, host, args, journal)
+        state.save()
     logger.info("PubMed数据爬取完成")
 
 if __name__ == "__main__":
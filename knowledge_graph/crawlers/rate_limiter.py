@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# 主机 -> 数据源名称
+HOST_SOURCES = {
+    "eutils.ncbi.nlm.nih.gov": "pubmed",
+    "clinicaltrials.gov": "clinical_trials",
+    "dsld.nlm.nih.gov": "nih_dsld",
+}
+
+# 每个API主机允许的最大并发请求数（同时决定连接池大小）
+HOST_CONCURRENCY = {
+    "eutils.ncbi.nlm.nih.gov": 3,
+    "clinicaltrials.gov": 8,
+    "dsld.nlm.nih.gov": 8,
+}
+DEFAULT_CONCURRENCY = 4
+
+# 各数据源默认配额（请求/秒）：NCBI无key 3次/秒、有key 10次/秒；ClinicalTrials.gov约50次/分钟
+DEFAULT_RATES = {
+    "pubmed": 3.0,
+    "clinical_trials": 0.8,
+    "nih_dsld": 2.0,
+}
+NCBI_KEYED_RATE = 10.0
+
+class TokenBucket:
+    # 线程安全的令牌桶；令牌不足时预留未来的令牌，调用方按返回的时间等待
+    def __init__(self, rate, capacity=1.0):
+        if rate <= 0:
+            raise ValueError(f"速率必须大于0: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            self.acquired += 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            if wait:
+                self.throttled += 1
+                self.total_wait += wait
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def defer(self, seconds):
+        # 服务端要求暂停（如429 Retry-After）时，清空令牌让所有调用方一起等待
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def snapshot(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 3),
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "total_wait": round(self.total_wait, 3),
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def default_rate(source):
+    override = os.environ.get(f"RATE_LIMIT_{source.upper()}")
+    if override:
+        return float(override)
+    if source == "pubmed" and os.environ.get("NCBI_API_KEY"):
+        return NCBI_KEYED_RATE
+    return DEFAULT_RATES[source]
+
+def get_limiter(host):
+    source = HOST_SOURCES.get(host)
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None and source is not None:
+            limiter = _limiters[host] = TokenBucket(default_rate(source))
+            logger.info(f"{source} 限流: {limiter.rate:g} 次/秒")
+        return limiter
+
+def configure_limiter(host, rate, capacity=1.0):
+    with _limiters_lock:
+        limiter = _limiters[host] = TokenBucket(rate, capacity)
+    logger.info(f"{host} 限流: {rate:g} 次/秒")
+    return limiter
+
+def limiter_snapshot():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.snapshot() for host, limiter in limiters.items()}
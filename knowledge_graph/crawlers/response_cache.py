@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from rate_limiter import HOST_SOURCES
+
+logger = logging.getLogger(__name__)
+
+# 各数据源缓存有效期（秒）：PubMed每周更新，试验状态变化较快，DSLD标签很少变动
+CACHE_TTLS = {
+    "pubmed": 7 * 86400,
+    "clinical_trials": 86400,
+    "nih_dsld": 30 * 86400,
+}
+DEFAULT_TTL = 86400
+# NCBI历史服务器的会话（WebEnv/query_key）几小时后失效：esearch usehistory=y、epost
+# 以及按 query_key/WebEnv 分页的 efetch 只短期缓存（--cache-only 回放时仍不过期）
+HISTORY_TTL = 3600
+DEFAULT_MAX_BYTES = 512 * 2**20
+# 不参与缓存键、也不落盘的参数
+IGNORED_PARAMS = {"api_key"}
+
+def cache_key(method, url, params=None, data=None):
+    # 规范化：参数按键排序、值统一为字符串，同一查询无论参数顺序都命中同一条目
+    def canonical(values):
+        return sorted((str(k), str(v)) for k, v in (values or {}).items() if k not in IGNORED_PARAMS)
+    payload = json.dumps([method.upper(), url, canonical(params), canonical(data)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    # 内容寻址的磁盘缓存：gzip压缩存储响应，按数据源TTL过期，超出容量时按最近使用时间淘汰
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if name.endswith(".gz"):
+                    yield os.path.join(dirpath, name)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.gz")
+
+    def ttl_for(self, url, params=None, data=None):
+        if uses_history_server(url, params, data):
+            return HISTORY_TTL
+        host = urlparse(url).hostname
+        return CACHE_TTLS.get(HOST_SOURCES.get(host), DEFAULT_TTL)
+
+    def get(self, method, url, params=None, data=None):
+        path = self._path(cache_key(method, url, params, data))
+        try:
+            with gzip.open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (FileNotFoundError, OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        # 离线回放模式忽略TTL，只要有缓存就使用
+        if not self.offline and time.time() - meta["created"] > self.ttl_for(url, params, data):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # 刷新修改时间，作为LRU淘汰依据
+        except FileNotFoundError:
+            pass  # 读取之后被并发的淘汰删除，内容已读到，照常使用
+        with self._lock:
+            self.hits += 1
+        response = requests.Response()
+        response.status_code = meta["status"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.url = meta["url"]
+        response.encoding = meta.get("encoding")
+        response._content = body
+        return response
+
+    def put(self, method, url, params, data, response):
+        path = self._path(cache_key(method, url, params, data))
+        meta = {
+            "created": time.time(),
+            "status": response.status_code,
+            "url": url,
+            "encoding": response.encoding,
+            "headers": {"Content-Type": response.headers.get("Content-Type", "")},
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            f.write(json.dumps(meta).encode('utf-8') + b"\n")
+            f.write(response.content)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path) - old_size
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for path in self._entries():
+                mtime = _mtime(path)
+                if mtime is not None:
+                    entries.append((mtime, path))
+            entries.sort()
+            removed = 0
+            for _, path in entries:
+                if self._size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self._size -= size
+                removed += 1
+        logger.info(f"缓存淘汰 {removed} 个条目，当前 {self._size / 2**20:.1f} MB")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._size, "offline": self.offline}
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+def uses_history_server(url, params=None, data=None):
+    endpoint = urlparse(url).path.rsplit("/", 1)[-1]
+    values = dict(params or {}, **(data or {}))
+    if endpoint == "epost.fcgi":
+        return True
+    if endpoint == "esearch.fcgi":
+        return str(values.get("usehistory", "")).lower() == "y"
+    return "query_key" in values or "WebEnv" in values
+
+def default_cache_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'cache')
@@ -0,0 +1,43 @@
+import argparse
+import hashlib
+import json
+import os
+
+# 分片目录中的元数据文件：爬取模式、分片号，以及分片自己的水位线
+MANIFEST_FILE = "_shard.json"
+SHARD_STATE_FILE = "_state.json"
+
+def parse_shard(value):
+    # "3/8" -> (3, 8)，分片号从1开始
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 K/N: {value}")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"分片号超出范围: {value}")
+    return index, count
+
+def shard_index(name, count):
+    # md5而非内置hash()：后者每个进程随机加盐，不同机器上划分结果会不一致
+    return int(hashlib.md5(name.encode('utf-8')).hexdigest(), 16) % count
+
+def select_shard(supplements, shard):
+    index, count = shard
+    return [s for s in supplements if shard_index(s, count) == index - 1]
+
+def shard_name(shard):
+    return "shard-{:02d}-of-{:02d}".format(*shard)
+
+def partial_dir(root, source):
+    return os.path.join(root, 'knowledge_graph', 'data', 'partial', source)
+
+def shard_output_dir(root, source, shard):
+    return os.path.join(partial_dir(root, source), shard_name(shard))
+
+def write_manifest(output_dir, source, shard, incremental):
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"source": source, "shard": list(shard), "incremental": incremental}, f)
+
+def read_manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
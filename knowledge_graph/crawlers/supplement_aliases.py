@@ -0,0 +1,162 @@
+import argparse
+import csv
+import difflib
+import json
+import logging
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# 补剂别名表（config/supplement_aliases.csv，R端 normalize_names 读取同一文件）：
+#   canonical    标准名称（数据文件名、图谱节点ID都用它）
+#   search_name  调用 ClinicalTrials.gov / PubMed / DSLD 时使用的英文检索词
+#   aliases      其他写法，用 | 分隔
+# 查找顺序：原样 -> 归一化形式（NFKC全角转半角、忽略大小写、空白、连字符和点）-> 模糊匹配（仅 fuzzy=True 时）
+# 补剂列表与数据清洗只用前两步：模糊匹配会把 Vitamin B2 / B12、D2 / K2 这类不同营养素并成一种
+ALIAS_SEPARATOR = "|"
+SEPARATOR_PATTERN = re.compile(r"[\s_.\u2010-\u2015-]+")
+# 型号标记，如 b12、d3、q10、omega3 中的 a3；模糊匹配要求两边完全一致
+VARIANT_PATTERN = re.compile(r"[a-z]?\d+[a-z]?")
+FUZZY_CUTOFF = 0.88
+FUZZY_MIN_CHARS = 5
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def default_alias_path(root):
+    return os.path.join(root, 'knowledge_graph', 'config', 'supplement_aliases.csv')
+
+def normalize_key(name):
+    # 与R端 normalize_key 保持一致
+    return SEPARATOR_PATTERN.sub("", unicodedata.normalize("NFKC", name or "").casefold())
+
+class AliasResolver:
+    def __init__(self, rows):
+        self.search_names = {}
+        self.aliases = {}
+        self.exact = {}
+        self.keys = {}
+        for row in rows:
+            canonical = row["canonical"].strip()
+            search_name = (row.get("search_name") or "").strip() or canonical
+            aliases = [a.strip() for a in (row.get("aliases") or "").split(ALIAS_SEPARATOR) if a.strip()]
+            names = list(dict.fromkeys([canonical, search_name] + aliases))
+            self.search_names[canonical] = search_name
+            self.aliases[canonical] = names
+            for name in names:
+                key = normalize_key(name)
+                owner = self.keys.setdefault(key, canonical)
+                if owner != canonical:
+                    raise ValueError(f"别名冲突: {name!r} 同时属于 {owner} 和 {canonical}")
+                self.exact[name] = canonical
+        self._fuzzy_keys = [k for k in self.keys if len(k) >= FUZZY_MIN_CHARS]
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return cls(list(csv.DictReader(f)))
+
+    @lru_cache(maxsize=4096)
+    def resolve(self, name, fuzzy=False):
+        # 返回标准名称；无法识别时返回None
+        if name in self.exact:
+            return self.exact[name]
+        key = normalize_key(name)
+        if key in self.keys:
+            return self.keys[key]
+        if fuzzy and len(key) >= FUZZY_MIN_CHARS:
+            return self._fuzzy_match(key)
+        return None
+
+    def _fuzzy_match(self, key):
+        # 型号标记不同的候选直接排除；最高分对应多个补剂时视为无法识别
+        variants = sorted(VARIANT_PATTERN.findall(key))
+        matcher = difflib.SequenceMatcher(b=key)
+        best, owners = 0.0, set()
+        for candidate in self._fuzzy_keys:
+            if sorted(VARIANT_PATTERN.findall(candidate)) != variants:
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < FUZZY_CUTOFF or matcher.quick_ratio() < FUZZY_CUTOFF:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best:
+                best, owners = ratio, {self.keys[candidate]}
+            elif ratio == best:
+                owners.add(self.keys[candidate])
+        if best >= FUZZY_CUTOFF and len(owners) == 1:
+            return owners.pop()
+        return None
+
+    def canonical(self, name, fuzzy=False):
+        # 未登记的名称原样返回
+        return self.resolve(name, fuzzy) or name
+
+    def canonical_list(self, names):
+        # 归一化并去重（保持首次出现顺序），如 铁 / 铁剂 只保留 铁
+        result = list(dict.fromkeys(self.canonical(name) for name in names))
+        if len(result) < len(names):
+            logger.info(f"别名合并: {len(names)} 个名称 -> {len(result)} 种补剂")
+        return result
+
+    def search_name(self, name):
+        canonical = self.canonical(name)
+        return self.search_names.get(canonical, canonical)
+
+    def names(self, name):
+        # 标准名称及其全部别名（用于在文本中查找该补剂）
+        canonical = self.canonical(name)
+        return self.aliases.get(canonical, [canonical])
+
+@lru_cache(maxsize=None)
+def _load(path):
+    if not os.path.exists(path):
+        logger.warning(f"别名表不存在: {path}，按原名称处理")
+        return AliasResolver([])
+    return AliasResolver.from_csv(path)
+
+def get_resolver(path=None):
+    return _load(path or default_alias_path(get_project_root()))
+
+def load_supplement_list(root):
+    # 读取 config/supplements.txt 并按别名表合并为标准名称列表
+    config_path = os.path.join(root, 'knowledge_graph', 'config', 'supplements.txt')
+    logger.info(f"加载补剂列表从: {config_path}")
+    if not os.path.exists(config_path):
+        logger.error(f"配置文件不存在: {config_path}")
+        return []
+    with open(config_path, 'r', encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip()]
+    return get_resolver(default_alias_path(root)).canonical_list(names)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="补剂别名解析")
+    parser.add_argument("names", nargs="*", help="要解析的名称；为空时检查 supplements.txt 中的全部补剂")
+    parser.add_argument("--aliases", default=None, help="别名表路径")
+    parser.add_argument("--fuzzy", action="store_true", help="精确与归一化查找失败时尝试模糊匹配")
+    args = parser.parse_args(argv)
+    resolver = get_resolver(args.aliases)
+    if args.names:
+        for name in args.names:
+            canonical = resolver.resolve(name, args.fuzzy)
+            print(json.dumps({"name": name, "canonical": canonical,
+                              "search_name": resolver.search_name(name) if canonical else None},
+                             ensure_ascii=False))
+        return
+    root = get_project_root()
+    with open(os.path.join(root, 'knowledge_graph', 'config', 'supplements.txt'), 'r', encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip()]
+    missing = [name for name in names if resolver.resolve(name) is None]
+    for name in missing:
+        logger.warning(f"别名表中未登记: {name}（将直接用原名称检索）")
+    logger.info(f"{len(names)} 个名称 -> {len(resolver.canonical_list(names))} 种补剂，未登记 {len(missing)} 个")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'crawlers'))
+from columnar_store import ColumnarStore  # noqa: E402
+from crawl_state import write_json_atomic  # noqa: E402
+from metrics import PROFILE_MODES, default_metrics_dir, get_metrics, inc, profile_stage, span  # noqa: E402
+from supplement_aliases import get_resolver  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# 与 visualization/data_cleaning.R 相同的清洗与建图规则，用pandas向量化实现，CI中无需安装R工具链
+VALID_TRIAL_STATUS = ["Completed", "Active, not recruiting"]
+MIN_TITLE_CHARS = 10
+MIN_ABSTRACT_CHARS = 50
+CONDITION_SEPARATOR = re.compile(r",\s*")
+# 全部输出写完后才更新的清单，下游（如 evidence_service.py）据其中的版本号判断是否有新快照
+SNAPSHOT_MANIFEST = "snapshot.json"
+
+# 同义名称统一由 config/supplement_aliases.csv 定义（R端 normalize_names / similar_rules 读取同一文件）
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def normalize_names(names):
+    # 只对去重后的名称查别名表，再整列映射回去
+    resolver = get_resolver()
+    unique = names.dropna().unique()
+    return names.map(dict(zip(unique, map(resolver.canonical, unique)))).fillna(names)
+
+def read_raw_dir(raw_dir):
+    # 合并目录下所有CSV，附加来源文件序号和补剂名；与readr一致：""和"NA"视为缺失、去除首尾空白
+    files = sorted(f for f in os.listdir(raw_dir) if f.endswith(".csv")) if os.path.isdir(raw_dir) else []
+    frames = []
+    for i, name in enumerate(files):
+        df = pd.read_csv(os.path.join(raw_dir, name), dtype=str, keep_default_na=False, na_values=["", "NA"])
+        frames.append(df.assign(_file=i, supplement=name[:-len(".csv")]))
+    if not frames:
+        return pd.DataFrame()
+    combined = pd.concat(frames, ignore_index=True, sort=False)
+    return finish_raw(combined, list(frames[0].columns.drop(["_file", "supplement"])))
+
+def read_columnar(store, source):
+    # 一次内存映射扫描读取整个数据源（每条记录取最新版本），按补剂排序后等同于逐个读CSV
+    frame = store.read_frame(source)
+    if frame is None or frame.empty:
+        return pd.DataFrame()
+    frame = frame.drop(columns="crawl_date").sort_values("supplement", kind="stable", ignore_index=True)
+    frame["_file"] = pd.factorize(frame["supplement"])[0]
+    return finish_raw(frame, [c for c in frame.columns if c not in ("_file", "supplement")])
+
+def finish_raw(combined, first_columns):
+    for column in combined.columns.drop(["_file", "supplement"]):
+        combined[column] = combined[column].astype(object).str.strip()
+    combined["supplement"] = normalize_names(combined["supplement"].astype(object))
+    combined.attrs["first_columns"] = first_columns
+    return combined
+
+def load_source(raw_root, source, store=None):
+    if store is not None:
+        return read_columnar(store, source)
+    return read_raw_dir(os.path.join(raw_root, source))
+
+def r_column_order(df, derived):
+    # R中每个文件先追加派生列再bind_rows：第一个文件的列 + 派生列 + 其他文件才有的列
+    first = df.attrs["first_columns"]
+    head = first + [c for c in derived if c not in first]
+    return df[head + [c for c in df.columns if c not in head and c != "_file"]]
+
+def dedupe_conditions(conditions):
+    # 按逗号拆分后去重再拼接，保持首次出现的顺序；缺失值保持缺失
+    # 条件组合重复度很高，只对不同取值计算一次再整列映射
+    mapping = {value: ", ".join(dict.fromkeys(CONDITION_SEPARATOR.split(value)))
+               for value in conditions.dropna().unique()}
+    return conditions.map(mapping)
+
+def write_csv(df, path):
+    # 缺失值写成NA，与R write_csv输出一致
+    name = os.path.basename(path)
+    with span("write", source=name, sink="csv"):
+        df.to_csv(path, index=False, na_rep="NA", lineterminator="\n", encoding="utf-8")
+    inc("rows_written", len(df), source=name, sink="csv")
+
+def clean_clinical_trials(trials, processed_dir):
+    if trials.empty:
+        logger.info("无 Clinical Trials CSV 文件，跳过清洗")
+        return trials
+    trials = trials[trials["status"].isin(VALID_TRIAL_STATUS)]
+    # 按归一化后的补剂去重：别名文件（如 铁剂.csv 与 铁.csv）中的同一试验只保留一条
+    trials = trials.drop_duplicates(subset=["supplement", "nct_id"])
+    trials = trials.assign(conditions=dedupe_conditions(trials["conditions"]))
+    trials = r_column_order(trials, ["supplement"])
+    write_csv(trials, os.path.join(processed_dir, "clinical_trials_clean.csv"))
+    logger.info(f"临床试验清洗完成: {len(trials)} 条")
+    return trials
+
+def clean_pubmed_data(pubmed, processed_dir):
+    if pubmed.empty:
+        raise FileNotFoundError("未找到PubMed数据")
+    pubmed = pubmed.assign(year=pubmed["pub_date"].str.extract(r"(\d{4})", expand=False))
+    pubmed = pubmed.drop_duplicates(subset=["supplement", "pmid"])
+    valid = (pubmed["title"].str.len() > MIN_TITLE_CHARS) & (pubmed["abstract"].str.len() > MIN_ABSTRACT_CHARS)
+    pubmed = r_column_order(pubmed[valid], ["supplement", "year"])
+    write_csv(pubmed, os.path.join(processed_dir, "pubmed_clean.csv"))
+    logger.info(f"PubMed清洗完成: {len(pubmed)} 条")
+    return pubmed
+
+def build_entity_union_find(nodes):
+    # 并查集合并同义实体：root_id为连通分量编号（按首次出现顺序，从1开始），canonical_name取分量内第一个id
+    parent = {node_id: node_id for node_id in nodes["id"]}
+    def find(node_id):
+        while parent[node_id] != node_id:
+            parent[node_id] = parent[parent[node_id]]
+            node_id = parent[node_id]
+        return node_id
+    resolver = get_resolver()
+    for b in list(parent):
+        a = resolver.canonical(b)
+        if a != b and a in parent:
+            parent[find(b)] = find(a)
+    roots = nodes["id"].map(find)
+    root_ids = pd.Series(pd.factorize(roots)[0] + 1, index=nodes.index).astype(str)
+    canonical = nodes["id"].groupby(root_ids).transform("first")
+    return nodes.assign(root_id=root_ids, canonical_name=canonical)
+
+def build_knowledge_graph(trials, pubmed, processed_dir):
+    if trials.empty and pubmed.empty:
+        raise ValueError("trials和pubmed数据均为空，无法构建知识图谱")
+    supplements = pd.concat([frame["supplement"] for frame in (trials, pubmed) if not frame.empty])
+    nodes = pd.DataFrame({"supplement": supplements.drop_duplicates().reset_index(drop=True)})
+    nodes = nodes.assign(type="Supplement", id=nodes["supplement"], label=nodes["supplement"])
+    nodes = build_entity_union_find(nodes)
+    relations = []
+    if not trials.empty:
+        relations.append(pd.DataFrame({"from": trials["supplement"], "to": trials["nct_id"], "rel_type": "STUDIED_IN"}))
+    if not pubmed.empty:
+        relations.append(pd.DataFrame({"from": pubmed["supplement"], "to": pubmed["pmid"], "rel_type": "RESEARCHED_IN"}))
+    edges = pd.concat(relations, ignore_index=True)
+    write_csv(nodes, os.path.join(processed_dir, "knowledge_graph_nodes.csv"))
+    write_csv(edges, os.path.join(processed_dir, "knowledge_graph_edges.csv"))
+    logger.info(f"知识图谱CSV数据已生成: {len(nodes)} 个节点，{len(edges)} 条关系")
+    return nodes, edges
+
+def publish_snapshot(processed_dir, counts):
+    now = datetime.now(timezone.utc)
+    manifest = {"version": now.strftime("%Y%m%dT%H%M%S%fZ"), "published_at": now.isoformat(timespec="seconds"),
+                "rows": counts}
+    write_json_atomic(os.path.join(processed_dir, SNAPSHOT_MANIFEST), manifest)
+    logger.info(f"已发布快照 {manifest['version']}")
+    return manifest
+
+def run_pipeline(raw_root, processed_dir, columnar_dir=None):
+    # columnar_dir 不为空时从Parquet数据集读取，否则逐个读取 raw_root 下的CSV
+    os.makedirs(processed_dir, exist_ok=True)
+    store = ColumnarStore(columnar_dir) if columnar_dir else None
+    timings = {}
+    start = time.perf_counter()
+    trials = clean_clinical_trials(load_source(raw_root, "clinical_trials", store), processed_dir)
+    timings["clean_clinical_trials"] = time.perf_counter() - start
+    start = time.perf_counter()
+    pubmed = clean_pubmed_data(load_source(raw_root, "pubmed", store), processed_dir)
+    timings["clean_pubmed_data"] = time.perf_counter() - start
+    start = time.perf_counter()
+    nodes, edges = build_knowledge_graph(trials, pubmed, processed_dir)
+    timings["build_knowledge_graph"] = time.perf_counter() - start
+    publish_snapshot(processed_dir, {"clinical_trials": len(trials), "pubmed": len(pubmed),
+                                     "nodes": len(nodes), "edges": len(edges)})
+    for step, seconds in timings.items():
+        get_metrics().observe("stage", seconds, source=step)
+    return timings
+
+def main(argv=None):
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="数据清洗 + 知识图谱节点/关系CSV构建（pandas实现）")
+    parser.add_argument("--raw-dir", default=os.path.join(root, 'knowledge_graph', 'data', 'raw'),
+                        help="原始数据目录（包含 clinical_trials/ 与 pubmed/）")
+    parser.add_argument("--processed-dir", default=os.path.join(root, 'knowledge_graph', 'data', 'processed'),
+                        help="输出目录")
+    parser.add_argument("--columnar-dir", default=None,
+                        help="从分区Parquet数据集读取原始数据（见 crawlers/columnar_store.py），代替逐个读取CSV")
+    parser.add_argument("--metrics-dir", default=default_metrics_dir(root), help="运行指标输出目录")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None, help="剖析本次运行")
+    args = parser.parse_args(argv)
+    try:
+        with profile_stage(args.profile, args.metrics_dir, "build"):
+            timings = run_pipeline(args.raw_dir, args.processed_dir, args.columnar_dir)
+    finally:
+        get_metrics().write_report(args.metrics_dir, "build")
+    for step, seconds in timings.items():
+        logger.info(f"{step}: {seconds:.2f} 秒")
+
+if __name__ == "__main__":
+    main()
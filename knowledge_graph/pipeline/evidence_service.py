@@ -0,0 +1,401 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlparse
+
+import pandas as pd
+
+from data_cleaning import SNAPSHOT_MANIFEST
+from graph_engine import GraphEngine
+from metrics import get_metrics, inc, span
+from pair_index import PairIndex
+from supplement_aliases import get_resolver
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# 本地只读证据查询服务：启动时把 data/processed 的清洗结果与图谱载入内存，
+# 计算结果按 (快照版本, 路径, 参数) 缓存在LRU中；后台线程轮询 snapshot.json，
+# 发现新快照后在后台加载完整份数据再整体替换，替换后清空缓存
+#   GET /health                                   快照版本与缓存统计
+#   GET /supplements                              全部补剂及证据数
+#   GET /supplements/<名称>/evidence?limit=&since_year=   该补剂的临床试验与文献
+#   GET /supplements/<名称>/related?top=          按共享证据数排序的相关补剂
+#   GET /pairs/shared?a=&b=                       两种补剂共享的试验与文献
+#   GET /pairs/check?names=a,b,c                  组合证据/冲突检查（需要 pair_index.py build 的索引）
+#   GET /years                                    每年的文献数
+#   GET /pmids/top?year=&limit=                   某年被最多补剂共同检索到的文献
+#   GET /metrics                                  Prometheus文本格式的服务指标
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_ENTRIES = 4096
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def snapshot_version(processed_dir):
+    # 以 snapshot.json 的版本号为准；旧的输出目录没有清单时退回节点/关系文件的修改时间
+    manifest_path = os.path.join(processed_dir, SNAPSHOT_MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    paths = [os.path.join(processed_dir, name) for name in ("knowledge_graph_nodes.csv", "knowledge_graph_edges.csv")]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return f"mtime-{max(os.stat(path).st_mtime_ns for path in paths)}"
+
+def read_processed(path):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=["NA"]).fillna("")
+
+class EvidenceSnapshot:
+    # 一份只读快照：加载后不再修改，请求线程之间无需加锁
+    def __init__(self, processed_dir, index_dir=None):
+        self.version = snapshot_version(processed_dir)
+        if self.version is None:
+            raise FileNotFoundError(f"未找到知识图谱CSV: {processed_dir}")
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.engine = GraphEngine.from_csv(os.path.join(processed_dir, "knowledge_graph_nodes.csv"),
+                                           os.path.join(processed_dir, "knowledge_graph_edges.csv"))
+        trials = read_processed(os.path.join(processed_dir, "clinical_trials_clean.csv"))
+        pubmed = read_processed(os.path.join(processed_dir, "pubmed_clean.csv"))
+        self.trials = {}
+        if not trials.empty:
+            columns = ["nct_id", "title", "status", "conditions", "completion_date"]
+            self.trials = {row["nct_id"]: row for row in trials.drop_duplicates("nct_id")[columns].to_dict("records")}
+        self.articles = {}
+        self.pmids_by_year = {}
+        if not pubmed.empty:
+            columns = ["pmid", "title", "journal", "pub_date", "year"]
+            self.articles = {row["pmid"]: row for row in pubmed.drop_duplicates("pmid")[columns].to_dict("records")}
+            # 每篇文献被多少种补剂检索到，按年份分组后降序排列
+            breadth = (pubmed.groupby(["year", "pmid"])["supplement"].nunique()
+                       .reset_index(name="supplements")
+                       .sort_values(["year", "supplements", "pmid"], ascending=[True, False, True]))
+            self.pmids_by_year = {year: list(zip(group["pmid"], group["supplements"].astype(int)))
+                                  for year, group in breadth.groupby("year", sort=True) if year}
+        nodes = read_processed(os.path.join(processed_dir, "knowledge_graph_nodes.csv"))
+        self.supplements = sorted(nodes["id"]) if not nodes.empty else []
+        index_dir = index_dir or os.path.join(processed_dir, "pair_index")
+        self.pairs = PairIndex.load(index_dir) if os.path.exists(os.path.join(index_dir, "meta.json")) else None
+
+    def resolve(self, name):
+        # 接受别名（如 维C / Vitamin C），不做模糊匹配；未收录的补剂抛出KeyError，
+        # 模糊匹配到的补剂只作为第二个参数（did_you_mean）返回，不替换查询
+        resolver = get_resolver()
+        canonical = resolver.canonical(name, fuzzy=False)
+        try:
+            self.engine.node_id(canonical)
+        except KeyError:
+            suggestion = resolver.resolve(name, fuzzy=True)
+            if suggestion is not None and suggestion != canonical and self.has_node(suggestion):
+                raise KeyError(f"补剂不存在: {name}", suggestion) from None
+            raise KeyError(f"补剂不存在: {name}") from None
+        return canonical
+
+    def has_node(self, name):
+        try:
+            self.engine.node_id(name)
+            return True
+        except KeyError:
+            return False
+
+    def evidence_ids(self, supplement):
+        node = self.engine.node_id(supplement)
+        return [self.engine.node_name(n) for n in self.engine.neighbor_ids(node)]
+
+    def split_evidence(self, ids, since_year=None, limit=DEFAULT_LIMIT):
+        trials = [self.trials[i] for i in ids if i in self.trials]
+        articles = [self.articles[i] for i in ids if i in self.articles]
+        if since_year:
+            trials = [t for t in trials if t["completion_date"][:4] >= str(since_year)]
+            articles = [a for a in articles if a["year"] >= str(since_year)]
+        trials.sort(key=lambda t: (t["completion_date"], t["nct_id"]), reverse=True)
+        articles.sort(key=lambda a: (a["year"], a["pmid"]), reverse=True)
+        return {"trial_count": len(trials), "article_count": len(articles),
+                "trials": trials[:limit], "articles": articles[:limit]}
+
+    def supplement_list(self):
+        result = []
+        for name in self.supplements:
+            ids = self.evidence_ids(name)
+            result.append({"name": name, "trials": sum(1 for i in ids if i in self.trials),
+                           "articles": sum(1 for i in ids if i in self.articles)})
+        return result
+
+    def evidence(self, name, limit=DEFAULT_LIMIT, since_year=None):
+        supplement = self.resolve(name)
+        return dict(supplement=supplement, **self.split_evidence(self.evidence_ids(supplement), since_year, limit))
+
+    def related(self, name, top=10):
+        supplement = self.resolve(name)
+        return {"supplement": supplement,
+                "related": [{"name": other, "shared": count} for other, count in self.engine.related(supplement, top=top)]}
+
+    def shared(self, a, b, limit=DEFAULT_LIMIT):
+        a, b = self.resolve(a), self.resolve(b)
+        return dict(pair=[a, b], **self.split_evidence(self.engine.shared_evidence(a, b), limit=limit))
+
+    def check(self, names, limit=5):
+        if self.pairs is None:
+            raise LookupError("未加载补剂两两证据索引，请先运行 pair_index.py build")
+        return self.pairs.check([get_resolver().canonical(name, fuzzy=False) for name in names], limit)
+
+    def years(self):
+        return {year: len(pmids) for year, pmids in self.pmids_by_year.items()}
+
+    def top_pmids(self, year, limit=DEFAULT_LIMIT):
+        top = self.pmids_by_year.get(str(year), [])[:limit]
+        return {"year": str(year), "pmids": [dict(self.articles[pmid], supplements=count) for pmid, count in top]}
+
+class ResponseLRU:
+    # (状态码, 已编码响应体) 缓存，按最近使用淘汰；max_entries为0时不缓存
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+class EvidenceService:
+    def __init__(self, processed_dir, index_dir=None, cache_entries=DEFAULT_CACHE_ENTRIES,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.processed_dir = processed_dir
+        self.index_dir = index_dir
+        self.poll_interval = poll_interval
+        self.cache = ResponseLRU(cache_entries)
+        self.snapshot = self._load()
+        self.reloads = 0
+        self._failed_version = None
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True)
+
+    def _load(self):
+        start = time.perf_counter()
+        snapshot = EvidenceSnapshot(self.processed_dir, self.index_dir)
+        logger.info(f"已加载快照 {snapshot.version}: {len(snapshot.supplements)} 种补剂，{len(snapshot.trials)} 项试验，"
+                    f"{len(snapshot.articles)} 篇文献（{time.perf_counter() - start:.2f} 秒）")
+        return snapshot
+
+    def start(self):
+        if self.poll_interval > 0:
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.refresh()
+
+    def refresh(self):
+        # 新快照完整加载后才替换引用；加载失败时继续使用旧快照，同一版本不重复尝试
+        version = snapshot_version(self.processed_dir)
+        if version is None or version == self.snapshot.version or version == self._failed_version:
+            return False
+        try:
+            snapshot = self._load()
+        except Exception as e:
+            logger.error(f"加载快照 {version} 失败，继续使用 {self.snapshot.version}: {str(e)}")
+            self._failed_version = version
+            return False
+        self.snapshot = snapshot
+        self.cache.clear()
+        self.reloads += 1
+        return True
+
+    def health(self, snapshot):
+        return {"snapshot": snapshot.version, "loaded_at": snapshot.loaded_at, "reloads": self.reloads,
+                "supplements": len(snapshot.supplements), "trials": len(snapshot.trials),
+                "articles": len(snapshot.articles), "pair_index": snapshot.pairs is not None,
+                "cache": self.cache.stats()}
+
+def int_param(params, name, default, upper=MAX_LIMIT):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} 必须是整数") from None
+    if number < 0:
+        raise ValueError(f"{name} 不能为负数")
+    return min(number, upper)
+
+def route(snapshot, parts, params):
+    # 返回 (端点名, 结果)；未知路径返回None，参数错误抛ValueError，补剂不存在抛KeyError
+    if parts == ["supplements"]:
+        return "supplements", snapshot.supplement_list()
+    if len(parts) == 3 and parts[0] == "supplements" and parts[2] == "evidence":
+        return "evidence", snapshot.evidence(parts[1], int_param(params, "limit", DEFAULT_LIMIT),
+                                                   int_param(params, "since_year", None, upper=9999))
+    if len(parts) == 3 and parts[0] == "supplements" and parts[2] == "related":
+        return "related", snapshot.related(parts[1], int_param(params, "top", 10))
+    if parts == ["pairs", "shared"]:
+        if not params.get("a") or not params.get("b"):
+            raise ValueError("需要参数 a 和 b")
+        return "shared", snapshot.shared(params["a"], params["b"], int_param(params, "limit", DEFAULT_LIMIT))
+    if parts == ["pairs", "check"]:
+        names = [n.strip() for n in params.get("names", "").split(",") if n.strip()]
+        if len(names) < 2:
+            raise ValueError("names 至少需要两种补剂，用逗号分隔")
+        return "check", snapshot.check(names, int_param(params, "limit", 5))
+    if parts == ["years"]:
+        return "years", snapshot.years()
+    if parts == ["pmids", "top"]:
+        if not params.get("year"):
+            raise ValueError("需要参数 year")
+        return "top_pmids", snapshot.top_pmids(params["year"], int_param(params, "limit", DEFAULT_LIMIT))
+    return None
+
+class EvidenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头部与正文分两次写出，不关闭Nagle时keep-alive连接上每个请求会多出约40ms的延迟确认等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        service = self.server.service
+        # 整个请求只使用同一份快照，后台替换不会让一次响应混用新旧数据
+        snapshot = service.snapshot
+        # http.server按latin-1解码请求行，还原成UTF-8以支持未转义的中文补剂名
+        url = urlparse(self.path.encode('iso-8859-1').decode('utf-8', 'replace'))
+        parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+        params = dict(parse_qsl(url.query))
+        # 健康检查与指标每次实时生成，不经过缓存
+        if parts == ["health"]:
+            self._send(200, _json(service.health(snapshot)), "application/json; charset=utf-8", snapshot.version)
+            return
+        if parts == ["metrics"]:
+            self._send(200, get_metrics().to_prometheus().encode('utf-8'), "text/plain; version=0.0.4")
+            return
+        key = (snapshot.version, tuple(parts), tuple(sorted(params.items())))
+        cached = service.cache.get(key)
+        endpoint = "cached"
+        with span("request", service="evidence"):
+            if cached is None:
+                status, endpoint, cacheable, body = self._compute(snapshot, parts, params)
+                if cacheable:
+                    service.cache.put(key, (status, body))
+            else:
+                status, body = cached
+                inc("service_cache_hits", service="evidence")
+        inc("service_requests", service="evidence", endpoint=endpoint, status=status)
+        self._send(status, body, "application/json; charset=utf-8", snapshot.version)
+
+    def _compute(self, snapshot, parts, params):
+        # 返回 (状态码, 端点名, 可缓存, 响应体)
+        try:
+            with span("compute", service="evidence"):
+                routed = route(snapshot, parts, params)
+            if routed is None:
+                return 404, "unknown", False, _json({"error": f"未知路径: {self.path}"})
+            endpoint, result = routed
+            return 200, endpoint, True, _json(result)
+        except KeyError as e:
+            # 未收录的补剂同样缓存，避免重复查找
+            body = {"error": str(e.args[0]) if e.args else "未找到"}
+            if len(e.args) > 1:
+                body["did_you_mean"] = e.args[1]
+            return 404, "not_found", True, _json(body)
+        except LookupError as e:
+            return 503, "unavailable", False, _json({"error": str(e)})
+        except ValueError as e:
+            return 400, "bad_request", False, _json({"error": str(e)})
+
+    def _send(self, status, body, content_type, version=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if version:
+            self.send_header("X-Snapshot-Version", version)
+        self.end_headers()
+        self.wfile.write(body)
+
+def _json(result):
+    return json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+class EvidenceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def start_service(service, host="127.0.0.1", port=DEFAULT_PORT):
+    server = EvidenceHTTPServer((host, port), EvidenceHandler)
+    server.service = service
+    service.start()
+    return server
+
+def main(argv=None):
+    root = get_project_root()
+    processed_dir = os.path.join(root, 'knowledge_graph', 'data', 'processed')
+    parser = argparse.ArgumentParser(description="本地只读证据查询服务（多线程HTTP + LRU响应缓存）")
+    parser.add_argument("--processed-dir", default=processed_dir, help="data_cleaning.py 的输出目录")
+    parser.add_argument("--index-dir", default=None, help="补剂两两证据索引目录（默认 processed/pair_index）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES, help="LRU缓存的响应数，0为不缓存")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="检查新快照的间隔（秒），0为不检查")
+    args = parser.parse_args(argv)
+    service = EvidenceService(args.processed_dir, args.index_dir, args.cache_entries, args.poll_interval)
+    server = start_service(service, args.host, args.port)
+    logger.info(f"证据查询服务已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# 关系类型 -> 目标节点类型；补剂节点来自 knowledge_graph_nodes.csv
+RELATION_TARGETS = {
+    "STUDIED_IN": "Trial",
+    "RESEARCHED_IN": "Article",
+}
+NODE_TYPES = ["Supplement", "Trial", "Article", "Unknown"]
+SNAPSHOT_VERSION = 1
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def build_csr(src, dst, n_nodes):
+    # 按起点排序后，indptr[i]:indptr[i+1] 是节点i的邻居区间；区间内邻居有序，便于求交集
+    order = np.lexsort((dst, src))
+    indices = dst[order].astype(np.int32)
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    return indptr, indices
+
+def gather(indptr, indices, nodes):
+    # 一次取出一组节点的全部邻居（向量化，不逐个节点切片）
+    starts, ends = indptr[nodes], indptr[nodes + 1]
+    lengths = ends - starts
+    if not lengths.sum():
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+    owners = np.repeat(np.arange(len(nodes)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return indices[np.repeat(starts, lengths) + offsets], owners
+
+class GraphEngine:
+    # 整数化节点ID + 每种关系一份正向/反向CSR邻接表；所有数组都可以从快照内存映射加载
+    def __init__(self, names, node_type, name_order, relations):
+        self.names = names                # 按节点ID排列的定长字节串
+        self.node_type = node_type        # NODE_TYPES 的下标
+        self.name_order = name_order      # names 的排序下标，用于二分查找名称
+        self.relations = relations        # 关系 -> {"out": (indptr, indices), "in": (indptr, indices)}
+
+    @classmethod
+    def from_csv(cls, nodes_path, edges_path):
+        nodes = pd.read_csv(nodes_path, dtype=str, keep_default_na=False)
+        edges = pd.read_csv(edges_path, dtype=str, keep_default_na=False).drop_duplicates()
+        codes, uniques = pd.factorize(pd.concat([nodes["id"], edges["from"], edges["to"]], ignore_index=True))
+        n_nodes = len(uniques)
+        node_codes = codes[:len(nodes)]
+        src = codes[len(nodes):len(nodes) + len(edges)]
+        dst = codes[len(nodes) + len(edges):]
+        node_type = np.full(n_nodes, NODE_TYPES.index("Unknown"), dtype=np.int8)
+        relations = {}
+        for rel_type in edges["rel_type"].unique():
+            mask = (edges["rel_type"] == rel_type).to_numpy()
+            target = RELATION_TARGETS.get(rel_type, "Unknown")
+            node_type[dst[mask]] = NODE_TYPES.index(target)
+            relations[rel_type] = {
+                "out": build_csr(src[mask], dst[mask], n_nodes),
+                "in": build_csr(dst[mask], src[mask], n_nodes),
+            }
+        node_type[node_codes] = NODE_TYPES.index("Supplement")
+        names = np.array([str(u).encode('utf-8') for u in uniques], dtype=bytes)
+        return cls(names, node_type, np.argsort(names, kind="stable").astype(np.int32), relations)
+
+    @property
+    def n_nodes(self):
+        return len(self.names)
+
+    def node_id(self, name):
+        key = name.encode('utf-8')
+        pos = np.searchsorted(self.names, key, sorter=self.name_order)
+        if pos < len(self.name_order) and self.names[self.name_order[pos]] == key:
+            return int(self.name_order[pos])
+        raise KeyError(f"节点不存在: {name}")
+
+    def node_name(self, node):
+        return self.names[node].decode('utf-8')
+
+    def _adjacency(self, rel_type=None, direction="out"):
+        rel_types = [rel_type] if rel_type else list(self.relations)
+        directions = ["out", "in"] if direction == "both" else [direction]
+        return [(r, self.relations[r][d]) for r in rel_types for d in directions]
+
+    def neighbor_ids(self, node, rel_type=None, direction="out"):
+        parts = [indices[indptr[node]:indptr[node + 1]] for _, (indptr, indices) in self._adjacency(rel_type, direction)]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+    def neighbors(self, name, rel_type=None, direction="out"):
+        return [self.node_name(n) for n in self.neighbor_ids(self.node_id(name), rel_type, direction)]
+
+    def shared_evidence(self, a, b, rel_type=None):
+        # 两个补剂共同关联的试验/文献（有序邻居数组求交集）
+        return [self.node_name(n) for n in np.intersect1d(
+            self.neighbor_ids(self.node_id(a), rel_type), self.neighbor_ids(self.node_id(b), rel_type),
+            assume_unique=True)]
+
+    def related(self, name, rel_type=None, top=10):
+        # 按共享证据数量排序的相关补剂：补剂 -> 证据 -> 补剂 两跳计数
+        node = self.node_id(name)
+        counts = np.zeros(self.n_nodes, dtype=np.int64)
+        for r, (indptr, indices) in self._adjacency(rel_type, "out"):
+            evidence = indices[indptr[node]:indptr[node + 1]]
+            reverse_indptr, reverse_indices = self.relations[r]["in"]
+            others, _ = gather(reverse_indptr, reverse_indices, evidence)
+            counts += np.bincount(others, minlength=self.n_nodes)
+        counts[node] = 0
+        best = np.argsort(-counts, kind="stable")[:top]
+        return [(self.node_name(n), int(counts[n])) for n in best if counts[n]]
+
+    def k_hop(self, name, k, rel_type=None):
+        # 无向BFS，返回 {节点名: 跳数}（不含起点）
+        start = self.node_id(name)
+        dist = np.full(self.n_nodes, -1, dtype=np.int32)
+        dist[start] = 0
+        frontier = np.array([start], dtype=np.int64)
+        for hop in range(1, k + 1):
+            reached = [gather(indptr, indices, frontier)[0]
+                       for _, (indptr, indices) in self._adjacency(rel_type, "both")]
+            candidates = np.unique(np.concatenate(reached))
+            frontier = candidates[dist[candidates] < 0]
+            if not len(frontier):
+                break
+            dist[frontier] = hop
+        found = np.flatnonzero(dist > 0)
+        return {self.node_name(n): int(dist[n]) for n in found}
+
+    def path(self, a, b, max_hops=4, rel_type=None):
+        # 无向最短路径（BFS逐层扩展并记录前驱），返回 [(节点, 类型), ...]；超出跳数返回None
+        start, goal = self.node_id(a), self.node_id(b)
+        parent = np.full(self.n_nodes, -1, dtype=np.int64)
+        parent[start] = start
+        frontier = np.array([start], dtype=np.int64)
+        for _ in range(max_hops):
+            if parent[goal] >= 0 or not len(frontier):
+                break
+            next_nodes, next_parents = [], []
+            for _, (indptr, indices) in self._adjacency(rel_type, "both"):
+                reached, owners = gather(indptr, indices, frontier)
+                next_nodes.append(reached)
+                next_parents.append(frontier[owners])
+            reached = np.concatenate(next_nodes)
+            parents = np.concatenate(next_parents)
+            reached, first = np.unique(reached, return_index=True)
+            fresh = parent[reached] < 0
+            parent[reached[fresh]] = parents[first][fresh]
+            frontier = reached[fresh]
+        if parent[goal] < 0:
+            return None
+        path = [goal]
+        while path[-1] != start:
+            path.append(int(parent[path[-1]]))
+        return [(self.node_name(n), NODE_TYPES[self.node_type[n]]) for n in reversed(path)]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"names": self.names, "node_type": self.node_type, "name_order": self.name_order}
+        for rel_type, directions in self.relations.items():
+            for direction, (indptr, indices) in directions.items():
+                arrays[f"{rel_type}.{direction}.indptr"] = indptr
+                arrays[f"{rel_type}.{direction}.indices"] = indices
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        meta = {"version": SNAPSHOT_VERSION, "nodes": self.n_nodes, "relations": list(self.relations),
+                "edges": {r: int(len(d["out"][1])) for r, d in self.relations.items()}}
+        with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        # 内存映射加载：只读取文件头，数组内容按需由操作系统分页载入
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"快照版本不兼容: {meta['version']}")
+        mode = "r" if mmap else None
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+        relations = {r: {d: (array(f"{r}.{d}.indptr"), array(f"{r}.{d}.indices")) for d in ("out", "in")}
+                     for r in meta["relations"]}
+        return cls(array("names"), array("node_type"), array("name_order"), relations)
+
+def default_snapshot_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'processed', 'graph_snapshot')
+
+def main(argv=None):
+    root = get_project_root()
+    processed_dir = os.path.join(root, 'knowledge_graph', 'data', 'processed')
+    parser = argparse.ArgumentParser(description="离线知识图谱引擎：CSR邻接表 + 内存映射快照")
+    parser.add_argument("--snapshot-dir", default=default_snapshot_dir(root), help="快照目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="从节点/关系CSV构建快照")
+    build.add_argument("--processed-dir", default=processed_dir)
+    neighbors = commands.add_parser("neighbors", help="列出邻居")
+    neighbors.add_argument("name")
+    neighbors.add_argument("--rel-type", default=None)
+    neighbors.add_argument("--direction", choices=["out", "in", "both"], default="out")
+    shared = commands.add_parser("shared", help="两个补剂共享的证据")
+    shared.add_argument("a")
+    shared.add_argument("b")
+    shared.add_argument("--rel-type", default=None)
+    related = commands.add_parser("related", help="按共享证据数排序的相关补剂")
+    related.add_argument("name")
+    related.add_argument("--top", type=int, default=10)
+    related.add_argument("--rel-type", default=None)
+    hops = commands.add_parser("khop", help="k跳以内的节点")
+    hops.add_argument("name")
+    hops.add_argument("-k", type=int, default=2)
+    hops.add_argument("--rel-type", default=None)
+    path = commands.add_parser("path", help="两个节点之间的最短路径")
+    path.add_argument("a")
+    path.add_argument("b")
+    path.add_argument("--max-hops", type=int, default=4)
+    path.add_argument("--rel-type", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        engine = GraphEngine.from_csv(os.path.join(args.processed_dir, "knowledge_graph_nodes.csv"),
+                                      os.path.join(args.processed_dir, "knowledge_graph_edges.csv"))
+        engine.save(args.snapshot_dir)
+        logger.info(f"快照已保存: {args.snapshot_dir}（{engine.n_nodes} 个节点，"
+                    f"{time.perf_counter() - start:.2f} 秒）")
+        return
+    engine = GraphEngine.load(args.snapshot_dir)
+    if getattr(args, "rel_type", None) and args.rel_type not in engine.relations:
+        raise SystemExit(f"未知关系类型: {args.rel_type}（可选 {', '.join(engine.relations)}）")
+    try:
+        if args.command == "neighbors":
+            result = engine.neighbors(args.name, args.rel_type, args.direction)
+        elif args.command == "shared":
+            result = engine.shared_evidence(args.a, args.b, args.rel_type)
+        elif args.command == "related":
+            result = engine.related(args.name, args.rel_type, top=args.top)
+        elif args.command == "khop":
+            result = engine.k_hop(args.name, args.k, args.rel_type)
+        else:
+            result = engine.path(args.a, args.b, args.max_hops, args.rel_type)
+    except KeyError as e:
+        raise SystemExit(str(e.args[0]) if e.args else "节点不存在")
+    print(json.dumps(result, ensure_ascii=False, indent=1))
+
+if __name__ == "__main__":
+    main()
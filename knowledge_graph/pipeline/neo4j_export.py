@@ -0,0 +1,267 @@
+import argparse
+import csv
+import logging
+import os
+import re
+
+import pandas as pd
+
+from graph_engine import RELATION_TARGETS
+
+try:
+    from neo4j import GraphDatabase
+except ImportError:  # neo4j驱动为可选依赖，只有增量导入时才需要
+    GraphDatabase = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# 每种节点标签：清洗后的明细表、主键列、导出的属性列 (列名, neo4j类型)
+NODE_SPECS = {
+    "Supplement": {"table": None, "key": "id",
+                   "properties": [("label", "string"), ("root_id", "int"), ("canonical_name", "string")]},
+    "Trial": {"table": "clinical_trials_clean.csv", "key": "nct_id",
+              "properties": [("title", "string"), ("status", "string"), ("conditions", "string[]"),
+                             ("interventions", "string"), ("primary_outcomes", "string"),
+                             ("completion_date", "string")]},
+    "Article": {"table": "pubmed_clean.csv", "key": "pmid",
+                "properties": [("title", "string"), ("journal", "string"), ("pub_date", "string"),
+                               ("year", "int")]},
+}
+ARRAY_DELIMITER = ";"
+# 爬虫用 "; " 拼接多个条件（parse_study），条件名本身可含逗号（如 Diabetes Mellitus, Type 2）
+CONDITION_SEPARATOR = re.compile(r";\s*")
+HEADER_FIELD = re.compile(r"^(?P<name>[^:]*)(?::(?P<kind>[A-Z_]+|[a-z]+(?:\[\])?)(?:\((?P<group>[^)]+)\))?)?$")
+SCALAR_TYPES = {"string", "int", "long", "float", "double", "boolean"}
+DEFAULT_BATCH_SIZE = 5000
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def file_stem(name):
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+def load_graph_tables(processed_dir):
+    # 返回 {标签: 节点DataFrame(id + 属性列)} 与关系表；证据节点的属性从清洗后的明细表补齐
+    read = lambda name: pd.read_csv(os.path.join(processed_dir, name), dtype=str, keep_default_na=False)
+    nodes = read("knowledge_graph_nodes.csv")
+    edges = read("knowledge_graph_edges.csv").drop_duplicates()
+    tables = {"Supplement": nodes.drop_duplicates("id")}
+    for rel_type in edges["rel_type"].unique():
+        label = RELATION_TARGETS.get(rel_type)
+        if label is None:
+            raise ValueError(f"未知的关系类型: {rel_type}（请在 graph_engine.RELATION_TARGETS 中登记）")
+        ids = pd.DataFrame({"id": edges.loc[edges["rel_type"] == rel_type, "to"].unique()})
+        spec = NODE_SPECS[label]
+        path = os.path.join(processed_dir, spec["table"])
+        if os.path.exists(path):
+            details = read(spec["table"]).drop_duplicates(spec["key"]).rename(columns={spec["key"]: "id"})
+            ids = ids.merge(details, on="id", how="left")
+        frame = pd.concat([tables[label], ids]) if label in tables else ids
+        tables[label] = frame.drop_duplicates("id").fillna("")
+    return tables, edges
+
+def property_value(value, kind):
+    if kind == "string[]":
+        return ARRAY_DELIMITER.join(v.strip() for v in CONDITION_SEPARATOR.split(value) if v.strip())
+    if kind == "int":
+        match = re.search(r"-?\d+", value)
+        return match.group() if match else ""
+    return value
+
+def write_pair(out_dir, stem, header, rows):
+    # 头文件与数据文件分开（neo4j-admin: --nodes=Label=header.csv,data.csv），所有字段加引号，允许多行文本
+    header_path = os.path.join(out_dir, f"{stem}.header.csv")
+    data_path = os.path.join(out_dir, f"{stem}.csv")
+    for path, content in ((header_path, [header]), (data_path, rows)):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows(content)
+    return header_path, data_path
+
+def export_admin_import(processed_dir, out_dir):
+    # 每种标签一个独立的ID空间（PMID、NCT编号、补剂名互不冲突），关系类型直接取自 rel_type
+    os.makedirs(out_dir, exist_ok=True)
+    tables, edges = load_graph_tables(processed_dir)
+    args = [f"--array-delimiter={ARRAY_DELIMITER}", "--multiline-fields=true"]
+    for label, frame in tables.items():
+        properties = [(c, k) for c, k in NODE_SPECS[label]["properties"] if c in frame.columns]
+        header = [f"id:ID({label})"] + [f"{c}:{k}" for c, k in properties] + [":LABEL"]
+        rows = ([row["id"]] + [property_value(row[c], k) for c, k in properties] + [label]
+                for row in frame.to_dict("records"))
+        header_path, data_path = write_pair(out_dir, file_stem(label), header, rows)
+        args.append(f"--nodes={label}={os.path.basename(header_path)},{os.path.basename(data_path)}")
+        logger.info(f"{label}: {len(frame)} 个节点")
+    for rel_type, group in edges.groupby("rel_type", sort=True):
+        header = [":START_ID(Supplement)", f":END_ID({RELATION_TARGETS[rel_type]})", ":TYPE"]
+        rows = ([row["from"], row["to"], rel_type] for row in group.to_dict("records"))
+        header_path, data_path = write_pair(out_dir, rel_type.lower(), header, rows)
+        args.append(f"--relationships={rel_type}={os.path.basename(header_path)},{os.path.basename(data_path)}")
+        logger.info(f"{rel_type}: {len(group)} 条关系")
+    # 参数文件：cd 到导出目录后运行 neo4j-admin database import full @import.args <数据库名>
+    with open(os.path.join(out_dir, "import.args"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(args) + "\n")
+    return args
+
+def parse_header(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f), [])
+    fields = []
+    for raw in header:
+        match = HEADER_FIELD.match(raw)
+        if not match:
+            raise ValueError(f"{os.path.basename(path)}: 无法解析的表头字段 {raw!r}")
+        fields.append((match["name"], match["kind"] or "string", match["group"]))
+    return fields
+
+def check_value(value, kind):
+    base = kind[:-2] if kind.endswith("[]") else kind
+    if base not in ("int", "long") or value == "":
+        return True
+    values = value.split(ARRAY_DELIMITER) if kind.endswith("[]") else [value]
+    return all(re.fullmatch(r"-?\d+", v) for v in values)
+
+def validate_import_dir(out_dir):
+    # 按 neo4j-admin 的规则离线检查导出文件：表头类型、列数、ID唯一性、关系两端节点是否存在
+    errors = []
+    with open(os.path.join(out_dir, "import.args"), 'r', encoding='utf-8') as f:
+        args = [line.strip() for line in f if line.strip()]
+    files = {"--nodes": [], "--relationships": []}
+    for arg in args:
+        option, _, value = arg.partition("=")
+        if option in files:
+            files[option].append(value.partition("=")[2].split(","))
+    id_spaces = {}
+    # 先读完全部节点文件，再检查关系引用
+    for header_file, data_file in files["--nodes"]:
+        errors.extend(check_node_file(out_dir, header_file, data_file, id_spaces))
+    for header_file, data_file in files["--relationships"]:
+        errors.extend(check_relationship_file(out_dir, header_file, data_file, id_spaces))
+    return errors
+
+def read_rows(out_dir, data_file):
+    with open(os.path.join(out_dir, data_file), 'r', newline='', encoding='utf-8') as f:
+        yield from enumerate(csv.reader(f), start=1)
+
+def check_node_file(out_dir, header_file, data_file, id_spaces):
+    errors = []
+    fields = parse_header(os.path.join(out_dir, header_file))
+    id_fields = [i for i, (_, kind, _) in enumerate(fields) if kind == "ID"]
+    if len(id_fields) != 1:
+        return [f"{header_file}: 需要且只能有一个 :ID 字段"]
+    for name, kind, _ in fields:
+        if kind not in ("ID", "LABEL") and kind.rstrip("[]") not in SCALAR_TYPES:
+            errors.append(f"{header_file}: 不支持的属性类型 {name}:{kind}")
+    space = id_spaces.setdefault(fields[id_fields[0]][2] or "", set())
+    for line_no, row in read_rows(out_dir, data_file):
+        if len(row) != len(fields):
+            errors.append(f"{data_file}:{line_no}: 列数 {len(row)} 与表头 {len(fields)} 不一致")
+            continue
+        node_id = row[id_fields[0]]
+        if not node_id or node_id in space:
+            errors.append(f"{data_file}:{line_no}: 节点ID为空或重复: {node_id!r}")
+        space.add(node_id)
+        for (name, kind, _), value in zip(fields, row):
+            if not check_value(value, kind):
+                errors.append(f"{data_file}:{line_no}: {name} 不是 {kind}: {value!r}")
+    return errors
+
+def check_relationship_file(out_dir, header_file, data_file, id_spaces):
+    errors = []
+    fields = parse_header(os.path.join(out_dir, header_file))
+    kinds = [kind for _, kind, _ in fields]
+    if not {"START_ID", "END_ID", "TYPE"} <= set(kinds):
+        return [f"{header_file}: 缺少 :START_ID / :END_ID / :TYPE 字段"]
+    start, end, rel_type = kinds.index("START_ID"), kinds.index("END_ID"), kinds.index("TYPE")
+    spaces = [id_spaces.get(fields[i][2] or "", set()) for i in (start, end)]
+    for line_no, row in read_rows(out_dir, data_file):
+        if len(row) != len(fields):
+            errors.append(f"{data_file}:{line_no}: 列数 {len(row)} 与表头 {len(fields)} 不一致")
+            continue
+        if not row[rel_type]:
+            errors.append(f"{data_file}:{line_no}: 关系类型为空")
+        for i, space in zip((start, end), spaces):
+            if row[i] not in space:
+                errors.append(f"{data_file}:{line_no}: 引用了不存在的节点 {fields[i][2]}:{row[i]!r}")
+    return errors
+
+def load_incremental(driver, processed_dir, batch_size=DEFAULT_BATCH_SIZE):
+    # 增量导入：先建唯一约束（MERGE走索引），再按标签MERGE节点、按类型MERGE关系，每批一个事务
+    tables, edges = load_graph_tables(processed_dir)
+    with driver.session() as session:
+        for label in NODE_SPECS:
+            session.run(f"CREATE CONSTRAINT {file_stem(label)}_id IF NOT EXISTS "
+                        f"FOR (n:{label}) REQUIRE n.id IS UNIQUE").consume()
+        for label, frame in tables.items():
+            properties = [(c, k) for c, k in NODE_SPECS[label]["properties"] if c in frame.columns]
+            rows = [{"id": row["id"], "props": {c: typed_value(row[c], k) for c, k in properties}}
+                    for row in frame.to_dict("records")]
+            query = f"UNWIND $rows AS row MERGE (n:{label} {{id: row.id}}) SET n += row.props"
+            run_batches(session, query, rows, batch_size)
+            logger.info(f"{label}: 已合并 {len(rows)} 个节点")
+        for rel_type, group in edges.groupby("rel_type", sort=True):
+            query = (f"UNWIND $rows AS row "
+                     f"MATCH (s:Supplement {{id: row.from}}) "
+                     f"MATCH (t:{RELATION_TARGETS[rel_type]} {{id: row.to}}) "
+                     f"MERGE (s)-[:{rel_type}]->(t)")
+            run_batches(session, query, group[["from", "to"]].to_dict("records"), batch_size)
+            logger.info(f"{rel_type}: 已合并 {len(group)} 条关系")
+
+def typed_value(value, kind):
+    value = property_value(value, kind)
+    if value == "":
+        return None  # SET n += {k: null} 会删除该属性，与admin import中空字段不写属性一致
+    if kind == "int":
+        return int(value)
+    if kind == "string[]":
+        return value.split(ARRAY_DELIMITER)
+    return value
+
+def run_batches(session, query, rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+
+def main(argv=None):
+    root = get_project_root()
+    processed_dir = os.path.join(root, 'knowledge_graph', 'data', 'processed')
+    parser = argparse.ArgumentParser(description="知识图谱导出到Neo4j：neo4j-admin批量导入文件 / 增量MERGE导入")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="生成 neo4j-admin database import 所需的表头与数据文件")
+    export.add_argument("--processed-dir", default=processed_dir)
+    export.add_argument("--out-dir", default=os.path.join(processed_dir, 'neo4j_import'))
+    validate = commands.add_parser("validate", help="离线校验导出目录")
+    validate.add_argument("--out-dir", default=os.path.join(processed_dir, 'neo4j_import'))
+    load = commands.add_parser("load", help="通过Bolt增量导入（需要 pip install neo4j）")
+    load.add_argument("--processed-dir", default=processed_dir)
+    load.add_argument("--uri", default=os.environ.get("NEO4J_URI", "bolt://localhost:7687"))
+    load.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_admin_import(args.processed_dir, args.out_dir)
+        logger.info(f"导出完成: {args.out_dir}（cd 到该目录后运行 neo4j-admin database import full @import.args neo4j）")
+        args.command = "validate"
+    if args.command == "validate":
+        errors = validate_import_dir(args.out_dir)
+        for error in errors[:50]:
+            logger.error(error)
+        if errors:
+            raise SystemExit(f"校验失败：{len(errors)} 个错误")
+        logger.info("导出文件校验通过")
+        return
+    if GraphDatabase is None:
+        raise RuntimeError("增量导入需要neo4j驱动，请运行：pip install neo4j")
+    if not os.environ.get("NEO4J_USER") or not os.environ.get("NEO4J_PASS"):
+        raise RuntimeError("未检测到Neo4j凭据（NEO4J_USER / NEO4J_PASS）")
+    with GraphDatabase.driver(args.uri, auth=(os.environ["NEO4J_USER"], os.environ["NEO4J_PASS"])) as driver:
+        load_incremental(driver, args.processed_dir, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+from data_cleaning import ColumnarStore, load_source
+from supplement_aliases import get_resolver, load_supplement_list
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# 补剂两两之间的证据索引。补剂按ID编号，(i, j) i<j 按上三角顺序映射到一个槽位；
+# 每种信号一份 CSR：indptr[槽位]:indptr[槽位+1] 是该补剂对的证据ID（计数即区间长度）
+SIGNALS = {
+    "shared_trials": "同一临床试验同时出现在两种补剂的检索结果中",
+    "co_interventions": "临床试验的干预措施同时提到两种补剂",
+    "shared_articles": "同一文献同时出现在两种补剂的检索结果中",
+    "risk_articles": "共同文献的标题/摘要提到相互作用或不良反应",
+    "co_formulated": "DSLD产品的成分表同时包含两种补剂",
+}
+RISK_PATTERN = re.compile(
+    r"interaction|adverse|side effect|toxicit|contraindicat|serotonin syndrome|hepatotoxic|bleeding|相互作用|不良反应")
+# 被过多补剂同时检索到的证据（如检索词未翻译时返回的泛泛结果）不具备两两关联意义，不计入
+MAX_MEMBERS = 10
+INDEX_VERSION = 1
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def default_index_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'processed', 'pair_index')
+
+def n_pairs(n):
+    return n * (n - 1) // 2
+
+def pair_slot(i, j, n):
+    # 上三角（不含对角线）按行展开后的位置；i、j 可以是numpy数组
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    return i * n - i * (i + 1) // 2 + (j - i - 1)
+
+def normalize_text(text):
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+class NameMatcher:
+    # 在干预措施/成分文本中查找补剂名称（一个正则一次扫描，名称按长度降序，优先匹配长名称）
+    def __init__(self, names_by_supplement):
+        self.lookup = {}
+        for supplement_id, names in names_by_supplement.items():
+            for name in names:
+                self.lookup.setdefault(normalize_text(name), supplement_id)
+        alternatives = "|".join(re.escape(n) for n in sorted(self.lookup, key=len, reverse=True) if n)
+        self.pattern = re.compile(rf"(?<![a-z0-9])(?:{alternatives})(?![a-z0-9])") if alternatives else None
+
+    def find(self, text):
+        if self.pattern is None or not isinstance(text, str):
+            return set()
+        return {self.lookup[m.group()] for m in self.pattern.finditer(normalize_text(text))}
+
+def build_signal(doc_members, n):
+    # doc_members: [(证据ID, {补剂ID...})]，每个含 >=2 种补剂的证据给其中每一对补剂各记一次
+    slots, ids = [], []
+    for doc_id, members in doc_members:
+        if len(members) > MAX_MEMBERS:
+            continue
+        for a, b in itertools.combinations(sorted(members), 2):
+            slots.append(pair_slot(a, b, n))
+            ids.append(str(doc_id).encode('utf-8'))
+    slots = np.array(slots, dtype=np.int64)
+    order = np.argsort(slots, kind="stable")
+    indptr = np.zeros(n_pairs(n) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(slots, minlength=n_pairs(n)), out=indptr[1:])
+    return indptr, np.array(ids, dtype=bytes)[order] if ids else np.array([], dtype="S1")
+
+def group_members(frame, key, supplement_ids, extra=None):
+    # 按证据ID汇总出现过的补剂；extra(行) 返回该行文本中额外提到的补剂
+    members = {}
+    for row in frame.dropna(subset=[key]).to_dict("records"):
+        found = members.setdefault(row[key], set())
+        if row["supplement"] in supplement_ids:
+            found.add(supplement_ids[row["supplement"]])
+        if extra is not None:
+            found |= extra(row)
+    return sorted(members.items())
+
+def build_pair_index(raw_root, supplements, store=None):
+    trials = load_source(raw_root, "clinical_trials", store)
+    pubmed = load_source(raw_root, "pubmed", store)
+    products = load_source(raw_root, "nih_dsld", store)
+    # 数据中出现但不在配置列表中的补剂追加在后面，ID保持稳定
+    seen = set()
+    for frame in (trials, pubmed, products):
+        if not frame.empty:
+            seen |= set(frame["supplement"].dropna())
+    supplements = list(dict.fromkeys(supplements + sorted(seen - set(supplements))))
+    supplement_ids = {name: i for i, name in enumerate(supplements)}
+    n = len(supplements)
+    # 文本中按标准名称及全部别名查找（如 Vitamin C / 维C / Ascorbic acid 都记为 维生素C）
+    resolver = get_resolver()
+    matcher = NameMatcher({i: resolver.names(name) for i, name in enumerate(supplements)})
+    signals = {}
+    if not trials.empty:
+        signals["shared_trials"] = build_signal(group_members(trials, "nct_id", supplement_ids), n)
+        signals["co_interventions"] = build_signal(group_members(
+            trials, "nct_id", supplement_ids, lambda row: matcher.find(row.get("interventions"))), n)
+    if not pubmed.empty:
+        signals["shared_articles"] = build_signal(group_members(pubmed, "pmid", supplement_ids), n)
+        risky = pubmed[(pubmed["title"].fillna("") + " " + pubmed["abstract"].fillna(""))
+                       .map(normalize_text).str.contains(RISK_PATTERN)]
+        signals["risk_articles"] = build_signal(group_members(risky, "pmid", supplement_ids), n)
+    if not products.empty:
+        products = products.assign(product_key=products["product_name"].fillna("") + " | "
+                                   + products["manufacturer"].fillna(""))
+        signals["co_formulated"] = build_signal(group_members(
+            products, "product_key", supplement_ids,
+            lambda row: matcher.find(re.sub(r"\([^)]*\)", " ", row.get("ingredients") or ""))), n)
+    empty = (np.zeros(n_pairs(n) + 1, dtype=np.int64), np.array([], dtype="S1"))
+    return PairIndex(supplements, {name: signals.get(name, empty) for name in SIGNALS})
+
+class PairIndex:
+    def __init__(self, supplements, signals):
+        self.supplements = supplements
+        self.supplement_ids = {name: i for i, name in enumerate(supplements)}
+        self.signals = signals  # 信号 -> (indptr, ids)
+
+    def supplement_id(self, name):
+        if name not in self.supplement_ids:
+            raise KeyError(f"未知补剂: {name}")
+        return self.supplement_ids[name]
+
+    def pair(self, a, b, limit=5):
+        # 单个补剂对：每种信号的证据数与前 limit 个证据ID
+        i, j = self.supplement_id(a), self.supplement_id(b)
+        if i == j:
+            raise ValueError(f"同一补剂: {a}")
+        slot = pair_slot(i, j, len(self.supplements))
+        result = {}
+        for name, (indptr, ids) in self.signals.items():
+            start, end = int(indptr[slot]), int(indptr[slot + 1])
+            result[name] = {"count": end - start,
+                            "ids": [x.decode('utf-8') for x in ids[start:min(end, start + limit)]]}
+        return result
+
+    def check(self, names, limit=5):
+        # 组合检查：N种补剂只需 N(N-1)/2 次槽位查找，不扫描语料
+        return [{"pair": [a, b], **self.pair(a, b, limit)} for a, b in itertools.combinations(names, 2)]
+
+    def partners(self, name, signal="shared_articles", top=10):
+        # 某补剂与其他所有补剂在某信号上的证据数（向量化计算全部槽位）
+        i = self.supplement_id(name)
+        n = len(self.supplements)
+        others = np.delete(np.arange(n), i)
+        indptr = self.signals[signal][0]
+        slots = pair_slot(np.full(len(others), i), others, n)
+        counts = indptr[slots + 1] - indptr[slots]
+        order = np.argsort(-counts, kind="stable")[:top]
+        return [(self.supplements[others[k]], int(counts[k])) for k in order if counts[k]]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, (indptr, ids) in self.signals.items():
+            np.save(os.path.join(directory, f"{name}.indptr.npy"), indptr)
+            np.save(os.path.join(directory, f"{name}.ids.npy"), ids)
+        with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "supplements": self.supplements, "signals": list(self.signals)},
+                      f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta["version"] != INDEX_VERSION:
+            raise ValueError(f"索引版本不兼容: {meta['version']}")
+        array = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        return cls(meta["supplements"], {s: (array(f"{s}.indptr"), array(f"{s}.ids")) for s in meta["signals"]})
+
+def main(argv=None):
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="补剂两两证据/冲突索引：预计算与组合检查")
+    parser.add_argument("--index-dir", default=default_index_dir(root), help="索引目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="从 data/raw 预计算")
+    build.add_argument("--raw-dir", default=os.path.join(root, 'knowledge_graph', 'data', 'raw'))
+    build.add_argument("--columnar-dir", default=None, help="从分区Parquet数据集读取（见 columnar_store.py）")
+    check = commands.add_parser("check", help="检查补剂组合")
+    check.add_argument("supplements", nargs="+")
+    check.add_argument("--limit", type=int, default=5, help="每种信号列出的证据ID数")
+    partners = commands.add_parser("partners", help="与某补剂证据关联最多的补剂")
+    partners.add_argument("supplement")
+    partners.add_argument("--signal", choices=list(SIGNALS), default="shared_articles")
+    partners.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        store = ColumnarStore(args.columnar_dir) if args.columnar_dir else None
+        index = build_pair_index(args.raw_dir, load_supplement_list(root), store)
+        index.save(args.index_dir)
+        counts = ", ".join(f"{name}={len(ids)}" for name, (_, ids) in index.signals.items())
+        logger.info(f"索引已保存: {args.index_dir}（{len(index.supplements)} 种补剂，{counts}，"
+                    f"{time.perf_counter() - start:.2f} 秒）")
+        return
+    index = PairIndex.load(args.index_dir)
+    if args.command == "check":
+        for result in index.check(args.supplements, args.limit):
+            print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(json.dumps(index.partners(args.supplement, args.signal, args.top), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from data_cleaning import ColumnarStore, load_source
+from text_index import tokenize
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP = 5
+DEFAULT_EVIDENCE = 3
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.diags(1.0 / norms) @ matrix
+
+class SupplementRecommender:
+    # 文档 × 词项 TF-IDF 矩阵 D（行归一化），补剂向量 = 该补剂全部证据文档行之和再归一化（矩阵 S = M·D）
+    # 查询打分只需一次稀疏矩阵-向量乘；批量查询拼成一个稀疏矩阵一次相乘
+    def __init__(self, vocabulary, doc_ids, supplements, counts, membership):
+        self.vocabulary = vocabulary          # 词项 -> 列号
+        self.doc_ids = doc_ids                # PMID / NCT编号
+        self.supplements = supplements
+        self.membership = membership.tocsr()  # 补剂 × 文档 0/1矩阵
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        self.idf = np.log((1 + counts.shape[0]) / (1 + df)) + 1
+        tf = counts.tocsr(copy=True).astype(np.float64)
+        tf.data = 1 + np.log(tf.data)  # 次线性词频，长摘要不压过短摘要
+        self.doc_matrix = l2_normalize(tf @ sp.diags(self.idf)).tocsr()
+        self.supplement_matrix = l2_normalize(self.membership @ self.doc_matrix).tocsr()
+        # 按词项为行的转置副本：查询矩阵 Q（查询 × 词项）直接右乘，得到 查询 × 补剂 / 查询 × 文档
+        self.supplement_terms = self.supplement_matrix.T.tocsr()
+        self.doc_terms = self.doc_matrix.T.tocsr()
+
+    @classmethod
+    def from_documents(cls, documents):
+        # documents: [(文档ID, 文本, [补剂...])]
+        vocabulary, supplements = {}, {}
+        rows, cols, member_rows, member_cols = [], [], [], []
+        for doc, (_, text, doc_supplements) in enumerate(documents):
+            for term, _ in tokenize(text):
+                rows.append(doc)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            for supplement in doc_supplements:
+                member_rows.append(supplements.setdefault(supplement, len(supplements)))
+                member_cols.append(doc)
+        counts = sp.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)),
+                               shape=(len(documents), len(vocabulary)))
+        counts.sum_duplicates()
+        membership = sp.csr_matrix((np.ones(len(member_rows)), (member_rows, member_cols)),
+                                   shape=(len(supplements), len(documents)))
+        membership.data[:] = 1
+        return cls(vocabulary, [d[0] for d in documents], list(supplements), counts, membership)
+
+    def query_matrix(self, queries):
+        # 直接拼CSR数组，避免每个查询构造一次稀疏矩阵对象
+        indptr, cols = [0], []
+        for query in queries:
+            cols.extend(c for c in (self.vocabulary.get(term) for term, _ in tokenize(query)) if c is not None)
+            indptr.append(len(cols))
+        counts = sp.csr_matrix((np.ones(len(cols)), np.array(cols, dtype=np.int64), np.array(indptr)),
+                               shape=(len(queries), len(self.vocabulary)))
+        counts.sum_duplicates()
+        counts.data *= self.idf[counts.indices]
+        row_ids = np.repeat(np.arange(len(queries)), np.diff(counts.indptr))
+        counts.data /= np.sqrt(np.bincount(row_ids, weights=counts.data ** 2, minlength=len(queries)))[row_ids]
+        return counts
+
+    def recommend_batch(self, queries, top=DEFAULT_TOP, evidence=DEFAULT_EVIDENCE):
+        # 返回每个查询的 [{supplement, score, match, relative, evidence}]
+        #   match    匹配度：查询与补剂向量的余弦相似度×100，跨查询可比，证据弱时整体偏低
+        #   relative 相对本次最高分的百分比（最高分=100），只用于同一查询内排序展示
+        q = self.query_matrix(queries)
+        scores = (q @ self.supplement_terms).toarray()    # 查询 × 补剂（补剂数很小，稠密即可）
+        doc_scores = (q @ self.doc_terms).tocsr() if evidence else None
+        results = []
+        for i, row in enumerate(scores):
+            k = min(top, np.count_nonzero(row))
+            if not k:
+                results.append([])
+                continue
+            best = np.argpartition(-row, k - 1)[:k]
+            best = best[np.argsort(-row[best], kind="stable")]
+            if evidence:
+                span = slice(doc_scores.indptr[i], doc_scores.indptr[i + 1])
+                hits = (doc_scores.indices[span], doc_scores.data[span])
+            results.append([{
+                "supplement": self.supplements[s],
+                "score": round(float(row[s]), 4),
+                "match": round(float(100 * min(row[s], 1.0)), 1),
+                "relative": round(float(100 * row[s] / row[best[0]])),
+                "evidence": self.evidence(s, hits, evidence) if evidence else [],
+            } for s in best])
+        return results
+
+    def recommend(self, query, top=DEFAULT_TOP, evidence=DEFAULT_EVIDENCE):
+        return self.recommend_batch([query], top, evidence)[0]
+
+    def evidence(self, supplement, hits, limit):
+        # 命中查询词的文档中属于该补剂、且相关度最高的几篇
+        docs, doc_scores = hits
+        members = self.membership.indices[self.membership.indptr[supplement]:self.membership.indptr[supplement + 1]]
+        mask = np.isin(docs, members, assume_unique=True)
+        docs, doc_scores = docs[mask], doc_scores[mask]
+        return [self.doc_ids[d] for d in docs[np.argsort(-doc_scores, kind="stable")[:limit]]]
+
+def collect_documents(raw_root, store=None):
+    # PubMed文章取标题+摘要，临床试验取 conditions；同一ID被多个补剂检索到时合并为一篇文档
+    documents = {}
+    pubmed = load_source(raw_root, "pubmed", store)
+    if not pubmed.empty:
+        for row in pubmed.dropna(subset=["pmid"]).itertuples(index=False):
+            text = " ".join(t for t in (row.title, row.abstract) if isinstance(t, str))
+            documents.setdefault(row.pmid, [text, set()])[1].add(row.supplement)
+    trials = load_source(raw_root, "clinical_trials", store)
+    if not trials.empty:
+        for row in trials.dropna(subset=["nct_id"]).itertuples(index=False):
+            text = row.conditions if isinstance(row.conditions, str) else ""
+            documents.setdefault(row.nct_id, [text, set()])[1].add(row.supplement)
+    return [(doc_id, text, sorted(supplements)) for doc_id, (text, supplements) in sorted(documents.items())]
+
+def main(argv=None):
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="症状 -> 补剂推荐（TF-IDF稀疏矩阵打分）")
+    parser.add_argument("query", nargs="+", help='症状描述，可给多个，如 insomnia "anxiety stress"')
+    parser.add_argument("--raw-dir", default=os.path.join(root, 'knowledge_graph', 'data', 'raw'))
+    parser.add_argument("--columnar-dir", default=None, help="从分区Parquet数据集读取（见 columnar_store.py）")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--evidence", type=int, default=DEFAULT_EVIDENCE, help="每个补剂附带的证据ID数")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    store = ColumnarStore(args.columnar_dir) if args.columnar_dir else None
+    recommender = SupplementRecommender.from_documents(collect_documents(args.raw_dir, store))
+    logger.info(f"模型构建完成: {len(recommender.supplements)} 种补剂，{len(recommender.doc_ids)} 篇证据，"
+                f"{len(recommender.vocabulary)} 个词项，{time.perf_counter() - start:.2f} 秒")
+    for query, result in zip(args.query, recommender.recommend_batch(args.query, args.top, args.evidence)):
+        print(json.dumps({"query": query, "results": result}, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import unicodedata
+
+import numpy as np
+
+from data_cleaning import ColumnarStore, load_source
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# 索引目录布局：index.json 记录当前段列表；每个段是一次构建/增量更新写出的只读目录
+#   terms.npy        排序后的词项（补剂过滤用 "supplement:<名称>" 词项，无位置）
+#   df.npy           每个词项的文档频率
+#   doc_offsets.npy  每个词项在 postings.bin 中的字节区间：varint(文档ID差值...) + varint(词频...)
+#   pos_offsets.npy  每个词项在 positions.bin 中的字节区间：每篇文档内的位置差值
+#   pmids.npy / years.npy / lengths.npy  段内文档表；deleted.npy 标记被后续段覆盖的文档
+INDEX_VERSION = 1
+MANIFEST = "index.json"
+SUPPLEMENT_PREFIX = "supplement:"
+MAX_TERM_CHARS = 32
+MAX_SEGMENTS = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+YEAR_PATTERN = re.compile(r"\d{4}")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were with "
+    "we our these those than then there their which who whom not no but been into can may also".split())
+
+def get_project_root():
+    if 'GITHUB_WORKSPACE' in os.environ:
+        return os.environ['GITHUB_WORKSPACE']
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(os.path.dirname(current_dir))
+
+def default_index_dir(root):
+    return os.path.join(root, 'knowledge_graph', 'data', 'index', 'pubmed')
+
+def fold_plural(token):
+    # 轻量词形归并，只处理复数（studies -> study, supplements -> supplement）
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    # 返回 [(词项, 位置)]：英文按单词切分，中文连续汉字切成重叠二元组；停用词不出词项但占位置，短语查询不受影响
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    position = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        if word[0] >= "一":
+            grams = [word] if len(word) == 1 else [word[i:i + 2] for i in range(len(word) - 1)]
+            for gram in grams:
+                tokens.append((gram, position))
+                position += 1
+            continue
+        if word not in STOPWORDS and len(word) <= MAX_TERM_CHARS:
+            tokens.append((fold_plural(word), position))
+        position += 1
+    return tokens
+
+def extract_year(text):
+    match = YEAR_PATTERN.search(text or "")
+    return int(match.group()) if match else 0
+
+def varint_encode(values):
+    # 向量化LEB128：每字节低7位存数据，最高位表示后面还有字节
+    values = np.asarray(values, dtype=np.uint64)
+    widths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        widths += rest > 0
+        rest >>= np.uint64(7)
+    ends = np.cumsum(widths)
+    out = np.zeros(int(ends[-1]) if len(values) else 0, dtype=np.uint8)
+    starts = ends - widths
+    for k in range(int(widths.max()) if len(values) else 0):
+        mask = widths > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (widths[mask] - 1 > k).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = (byte | more).astype(np.uint8)
+    return out, widths
+
+def varint_decode(data):
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.empty(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = (np.arange(len(data)) - starts[group]) * 7
+    weights = (data & 0x7F).astype(np.float64) * np.exp2(shift)
+    return np.bincount(group, weights=weights, minlength=len(ends)).astype(np.int64)
+
+def write_segment(path, pmids, years, lengths, postings):
+    # postings: {词项: ([文档ID...], [位置数组...])}，文档ID按升序追加
+    os.makedirs(path)
+    terms = sorted(postings)
+    doc_values, doc_counts, pos_values, pos_counts, df = [], [], [], [], []
+    for term in terms:
+        docs, positions = postings[term]
+        docs = np.asarray(docs, dtype=np.int64)
+        freqs = np.array([len(p) for p in positions], dtype=np.int64)
+        doc_values += [np.diff(docs, prepend=0), freqs]
+        doc_counts.append(2 * len(docs))
+        deltas = [np.diff(p, prepend=0) for p in positions if len(p)]
+        pos_values += deltas
+        pos_counts.append(int(freqs.sum()))
+        df.append(len(docs))
+    for name, values, counts in (("postings", doc_values, doc_counts), ("positions", pos_values, pos_counts)):
+        data, widths = varint_encode(np.concatenate(values) if values else [])
+        value_ends = np.cumsum(counts, dtype=np.int64)
+        byte_ends = np.concatenate(([0], np.cumsum(widths)))
+        offsets = np.concatenate(([0], byte_ends[value_ends]))
+        data.tofile(os.path.join(path, f"{name}.bin"))
+        np.save(os.path.join(path, "doc_offsets.npy" if name == "postings" else "pos_offsets.npy"), offsets)
+    np.save(os.path.join(path, "terms.npy"), np.array(terms, dtype=f"U{max(map(len, terms), default=1)}"))
+    np.save(os.path.join(path, "df.npy"), np.array(df, dtype=np.int32))
+    np.save(os.path.join(path, "pmids.npy"), np.array(pmids, dtype=bytes))
+    np.save(os.path.join(path, "years.npy"), np.array(years, dtype=np.int16))
+    np.save(os.path.join(path, "lengths.npy"), np.array(lengths, dtype=np.int32))
+    np.save(os.path.join(path, "deleted.npy"), np.zeros(len(pmids), dtype=bool))
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.terms = load("terms")
+        self.df = load("df")
+        self.doc_offsets = load("doc_offsets")
+        self.pos_offsets = load("pos_offsets")
+        self.pmids = load("pmids")
+        self.years = load("years")
+        self.lengths = load("lengths")
+        self.deleted = np.load(os.path.join(path, "deleted.npy"))
+        self.postings = self._bytes("postings.bin")
+        self.positions = self._bytes("positions.bin")
+
+    def _bytes(self, name):
+        path = os.path.join(self.path, name)
+        return np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, np.uint8)
+
+    def term_id(self, term):
+        pos = np.searchsorted(self.terms, term)
+        return int(pos) if pos < len(self.terms) and self.terms[pos] == term else None
+
+    def docs(self, term_id):
+        values = varint_decode(self.postings[self.doc_offsets[term_id]:self.doc_offsets[term_id + 1]])
+        half = len(values) // 2
+        return np.cumsum(values[:half]), values[half:]
+
+    def doc_positions(self, term_id, freqs):
+        # 位置按文档分组存储差值，分组内累加还原
+        deltas = varint_decode(self.positions[self.pos_offsets[term_id]:self.pos_offsets[term_id + 1]])
+        if not len(deltas):
+            return deltas
+        totals = np.cumsum(deltas)
+        group_starts = np.cumsum(freqs) - freqs
+        base = np.repeat(totals[group_starts] - deltas[group_starts], freqs)
+        return totals - base
+
+    def save_deleted(self):
+        tmp_path = os.path.join(self.path, "deleted.npy.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.deleted)
+        os.replace(tmp_path, os.path.join(self.path, "deleted.npy"))
+
+    def live_df(self, term_id):
+        # 已标记删除的文档不计入文档频率，增量更新后IDF与 n_docs（只数未删除文档）口径一致
+        if not self.deleted.any():
+            return int(self.df[term_id])
+        docs, _ = self.docs(term_id)
+        return int((~self.deleted[docs]).sum())
+
+    def live_docs(self):
+        return int((~self.deleted).sum())
+
+def build_postings(articles):
+    # articles: [(pmid, 年份, 文本, [补剂...])]，返回段文件所需的文档表与倒排表
+    pmids, years, lengths, postings = [], [], [], {}
+    for doc, (pmid, year, text, supplements) in enumerate(articles):
+        tokens = tokenize(text)
+        by_term = {}
+        for term, position in tokens:
+            by_term.setdefault(term, []).append(position)
+        for supplement in supplements:
+            by_term.setdefault(SUPPLEMENT_PREFIX + supplement, [])
+        for term, positions in by_term.items():
+            entry = postings.setdefault(term, ([], []))
+            entry[0].append(doc)
+            entry[1].append(np.array(positions, dtype=np.int64))
+        pmids.append(str(pmid).encode('utf-8'))
+        years.append(year)
+        lengths.append(len(tokens))
+    return pmids, years, lengths, postings
+
+class TextIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            if self.manifest["version"] != INDEX_VERSION:
+                raise ValueError(f"索引版本不兼容: {self.manifest['version']}，请使用 rebuild 重建")
+        else:
+            self.manifest = {"version": INDEX_VERSION, "segments": [], "next_segment": 1}
+        self.segments = [Segment(os.path.join(directory, name)) for name in self.manifest["segments"]]
+        self._drop_shadowed()
+
+    def _drop_shadowed(self):
+        # 同一PMID在较新的段中存在时，旧段中的版本标记删除（修复上次更新在登记新段后、标记删除前中断的情况）
+        newer = set()
+        for segment in reversed(self.segments):
+            if newer:
+                hits = np.isin(segment.pmids, list(newer)) & ~segment.deleted
+                if hits.any():
+                    segment.deleted |= hits
+                    segment.save_deleted()
+            newer.update(segment.pmids[~segment.deleted].tolist())
+
+    def _save_manifest(self):
+        tmp_path = os.path.join(self.directory, f"{MANIFEST}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST))
+
+    def _new_segment_path(self):
+        # next_segment 随清单保存；写段之后、保存清单之前中断会留下未登记的同名段目录，它不被任何清单引用，直接删除
+        name = f"seg-{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            logger.warning(f"删除未登记的段目录（上次更新中断）: {path}")
+            shutil.rmtree(path)
+        return name, path
+
+    def indexed_supplements(self):
+        # {pmid: {补剂...}}（仅未删除的文档），用于判断哪些文章是新的或新增了补剂关联
+        result = {}
+        for segment in self.segments:
+            pmids = segment.pmids
+            live = ~segment.deleted
+            for term_id in range(np.searchsorted(segment.terms, SUPPLEMENT_PREFIX), len(segment.terms)):
+                term = str(segment.terms[term_id])
+                if not term.startswith(SUPPLEMENT_PREFIX):
+                    break
+                docs, _ = segment.docs(term_id)
+                for doc in docs[live[docs]]:
+                    result.setdefault(pmids[doc].decode('utf-8'), set()).add(term[len(SUPPLEMENT_PREFIX):])
+        return result
+
+    def add_articles(self, articles):
+        # 增量更新：新文章（或新增补剂关联的文章）写成一个新段，旧段中的同一PMID标记删除
+        if not articles:
+            return 0
+        name, path = self._new_segment_path()
+        write_segment(path, *build_postings(articles))
+        # 先登记新段再标记旧段中的删除：中断时只会留下旧版本，下次打开索引时由 _drop_shadowed 补标记，不会丢文章
+        old_segments = list(self.segments)
+        self.manifest["segments"].append(name)
+        self.segments.append(Segment(path))
+        self._save_manifest()
+        replaced = {str(a[0]).encode('utf-8') for a in articles}
+        for segment in old_segments:
+            hits = np.isin(segment.pmids, list(replaced)) & ~segment.deleted
+            if hits.any():
+                segment.deleted |= hits
+                segment.save_deleted()
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+        return len(articles)
+
+    def compact(self):
+        # 合并所有段为一个段：解码倒排表、跳过已删除文档、重新编号后写出
+        if len(self.segments) <= 1 and not any(s.deleted.any() for s in self.segments):
+            return
+        pmids, years, lengths, postings = [], [], [], {}
+        for segment in self.segments:
+            live = ~segment.deleted
+            remap = np.cumsum(live) - 1 + len(pmids)
+            pmids += list(segment.pmids[live])
+            years += list(segment.years[live])
+            lengths += list(segment.lengths[live])
+            for term_id, term in enumerate(segment.terms):
+                docs, freqs = segment.docs(term_id)
+                positions = np.split(segment.doc_positions(term_id, freqs), np.cumsum(freqs)[:-1])
+                keep = live[docs]
+                if not keep.any():
+                    continue
+                entry = postings.setdefault(str(term), ([], []))
+                entry[0].extend(remap[docs[keep]])
+                entry[1].extend(p for p, k in zip(positions, keep) if k)
+        old = list(self.manifest["segments"])
+        name, path = self._new_segment_path()
+        write_segment(path, pmids, years, lengths, postings)
+        self.manifest["segments"] = [name]
+        self._save_manifest()
+        self.segments = [Segment(path)]
+        for stale in old:
+            shutil.rmtree(os.path.join(self.directory, stale), ignore_errors=True)
+
+    def stats(self):
+        docs = sum(s.live_docs() for s in self.segments)
+        total_length = sum(int(s.lengths[~s.deleted].sum()) for s in self.segments)
+        return docs, (total_length / docs if docs else 0.0)
+
+    def search(self, query, supplement=None, since_year=None, until_year=None, top=10):
+        # BM25排序；引号内为短语（要求位置连续），其余词项为普通检索词
+        # 只含停用词或标点的短语分词后为空，直接忽略
+        phrases = [phrase for phrase in (tokenize(p) for p in PHRASE_PATTERN.findall(query)) if phrase]
+        terms = list(dict.fromkeys(t for t, _ in tokenize(PHRASE_PATTERN.sub(" ", query))))
+        terms += [t for phrase in phrases for t, _ in phrase if t not in terms]
+        if not terms:
+            return []
+        n_docs, avg_length = self.stats()
+        df = {t: sum(s.live_df(i) for s in self.segments if (i := s.term_id(t)) is not None) for t in terms}
+        idf = {t: np.log(1 + (n_docs - df[t] + 0.5) / (df[t] + 0.5)) for t in terms}
+        results = []
+        for segment in self.segments:
+            scores = np.zeros(len(segment.pmids), dtype=np.float64)
+            matched = np.zeros(len(segment.pmids), dtype=bool)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths / max(avg_length, 1e-9))
+            for term in terms:
+                term_id = segment.term_id(term)
+                if term_id is None:
+                    continue
+                docs, freqs = segment.docs(term_id)
+                scores[docs] += idf[term] * freqs * (BM25_K1 + 1) / (freqs + norm[docs])
+                matched[docs] = True
+            mask = matched & ~segment.deleted
+            for phrase in phrases:
+                mask &= self._phrase_mask(segment, phrase)
+            if supplement:
+                supplement_id = segment.term_id(SUPPLEMENT_PREFIX + supplement)
+                allowed = np.zeros(len(segment.pmids), dtype=bool)
+                if supplement_id is not None:
+                    allowed[segment.docs(supplement_id)[0]] = True
+                mask &= allowed
+            if since_year:
+                mask &= segment.years >= since_year
+            if until_year:
+                mask &= (segment.years <= until_year) & (segment.years > 0)
+            hits = np.flatnonzero(mask)
+            if len(hits) > top:
+                hits = hits[np.argpartition(-scores[hits], top - 1)[:top]]
+            results += [(float(scores[d]), segment.pmids[d].decode('utf-8'), int(segment.years[d])) for d in hits]
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return [{"pmid": pmid, "score": round(score, 4), "year": year or None}
+                for score, pmid, year in results[:top]]
+
+    def _phrase_mask(self, segment, phrase):
+        # 文档ID与 (位置 - 短语内偏移) 组成键，各词项的键集合求交即为短语出现处
+        mask = np.zeros(len(segment.pmids), dtype=bool)
+        base = phrase[0][1]
+        keys = None
+        for term, position in phrase:
+            term_id = segment.term_id(term)
+            if term_id is None:
+                return mask
+            docs, freqs = segment.docs(term_id)
+            starts = segment.doc_positions(term_id, freqs) - (position - base)
+            term_keys = np.repeat(docs, freqs) * (1 << 32) + starts
+            keys = term_keys if keys is None else np.intersect1d(keys, term_keys, assume_unique=False)
+        mask[np.unique(keys >> 32)] = True
+        return mask
+
+def collect_articles(pubmed, indexed):
+    # 按PMID合并多个补剂下的同一文章；只返回未索引过的或补剂集合有变化的文章
+    if pubmed.empty:
+        return []
+    pubmed = pubmed.dropna(subset=["pmid"])
+    grouped = pubmed.groupby("pmid", sort=True).agg(
+        title=("title", "first"), abstract=("abstract", "first"), pub_date=("pub_date", "first"),
+        supplements=("supplement", lambda s: sorted(set(s))))
+    articles = []
+    for pmid, row in grouped.iterrows():
+        supplements = set(row["supplements"]) | indexed.get(pmid, set())
+        if pmid in indexed and supplements == indexed[pmid]:
+            continue
+        text = " ".join(t for t in (row["title"], row["abstract"]) if isinstance(t, str))
+        articles.append((pmid, extract_year(row["pub_date"]), text, sorted(supplements)))
+    return articles
+
+def main(argv=None):
+    root = get_project_root()
+    parser = argparse.ArgumentParser(description="PubMed标题/摘要全文倒排索引（BM25）")
+    parser.add_argument("--index-dir", default=default_index_dir(root), help="索引目录")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("update", "增量索引新文章"), ("rebuild", "删除现有索引后全量重建")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--raw-dir", default=os.path.join(root, 'knowledge_graph', 'data', 'raw'))
+        command.add_argument("--columnar-dir", default=None, help="从分区Parquet数据集读取（见 columnar_store.py）")
+    commands.add_parser("compact", help="合并所有段")
+    search = commands.add_parser("search", help="检索")
+    search.add_argument("query", help='如 insomnia 或 "sleep quality" 失眠')
+    search.add_argument("--supplement", default=None)
+    search.add_argument("--since-year", type=int, default=None)
+    search.add_argument("--until-year", type=int, default=None)
+    search.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        shutil.rmtree(args.index_dir, ignore_errors=True)
+    index = TextIndex(args.index_dir)
+    if args.command in ("update", "rebuild"):
+        start = time.perf_counter()
+        store = ColumnarStore(args.columnar_dir) if args.columnar_dir else None
+        articles = collect_articles(load_source(args.raw_dir, "pubmed", store), index.indexed_supplements())
+        added = index.add_articles(articles)
+        docs, _ = index.stats()
+        logger.info(f"索引更新完成: 新增/更新 {added} 篇，共 {docs} 篇，{len(index.segments)} 个段，"
+                    f"{time.perf_counter() - start:.2f} 秒")
+    elif args.command == "compact":
+        index.compact()
+        logger.info(f"合并完成: {len(index.segments)} 个段")
+    else:
+        start = time.perf_counter()
+        hits = index.search(args.query, args.supplement, args.since_year, args.until_year, args.top)
+        for hit in hits:
+            print(json.dumps(hit, ensure_ascii=False))
+        logger.info(f"{len(hits)} 条结果，{(time.perf_counter() - start) * 1000:.1f} 毫秒")
+
+if __name__ == "__main__":
+    main()